@@ -0,0 +1,61 @@
+"""
+准入控制
+提交任务前估算其成本（预计占用一个后台线程的秒数），排队中的任务数或
+待处理总成本超过上限时拒绝新任务，让已接收的任务保持可预期的延迟
+"""
+import math
+import os
+
+import fitz  # PyMuPDF
+
+
+# 估算文本块数时最多抽样的页数，大文件按抽样结果外推
+SAMPLE_PAGES = 8
+
+# 成本系数（秒），按基准测试的量级粗略设定
+BASE_COST = 1.0
+TRANSLATE_PAGE_COST = 0.3
+TRANSLATE_BLOCK_COST = 0.08
+COLOR_PAGE_COST = 0.05
+SIZE_MB_COST = 0.2
+
+
+def inspect_pdf(path: str) -> dict:
+    """读取页数、文件大小，并抽样估算文本块总数"""
+    size_mb = os.path.getsize(path) / (1024 * 1024)
+    with fitz.open(path) as doc:
+        pages = doc.page_count
+        if pages == 0:
+            return {"pages": 0, "text_blocks": 0, "size_mb": size_mb}
+        step = max(1, pages // SAMPLE_PAGES)
+        sampled = list(range(0, pages, step))[:SAMPLE_PAGES]
+        blocks = sum(
+            sum(1 for b in doc[i].get_text("blocks") if b[6] == 0)
+            for i in sampled
+        )
+    return {
+        "pages": pages,
+        "text_blocks": round(blocks / len(sampled) * pages),
+        "size_mb": size_mb,
+    }
+
+
+def estimate_cost(path: str, operation: str) -> dict:
+    """
+    估算任务成本
+    返回 inspect_pdf 的结果并附带 cost（秒）
+    """
+    info = inspect_pdf(path)
+    cost = BASE_COST + info["size_mb"] * SIZE_MB_COST
+    if operation == "translate":
+        cost += info["pages"] * TRANSLATE_PAGE_COST + info["text_blocks"] * TRANSLATE_BLOCK_COST
+    else:
+        cost += info["pages"] * COLOR_PAGE_COST
+    info["size_mb"] = round(info["size_mb"], 2)
+    info["cost"] = round(cost, 1)
+    return info
+
+
+def retry_after_seconds(pending_cost: float, worker_slots: int, limit: int = 300) -> int:
+    """按待处理总成本和全部后台线程数估算客户端应等待的秒数"""
+    return min(limit, max(1, math.ceil(pending_cost / max(1, worker_slots))))
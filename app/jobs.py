@@ -0,0 +1,555 @@
+"""
+后台任务
+提交即返回任务 ID，由有界的后台线程池执行；任务状态持久化在 SQLite (WAL) 中，
+多个 gunicorn worker 共享同一个队列。执行中的任务持有租约并定期续约，
+worker 重启或崩溃后租约过期，任务会被重新排队由其他 worker 接手。
+取消请求写入任务表，执行任务的进程轮询到后通过 CancelToken 中止处理
+"""
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from pathlib import Path
+from typing import Callable, Optional
+
+from app.scheduler import FairScheduler
+from pdf_translator.cancellation import CancelToken, Cancelled, DeadlineExceeded
+
+
+# 任务状态
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+# 已结束的状态
+FINAL_STATUSES = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class QueueFull(Exception):
+    """待处理任务超过准入上限"""
+
+    def __init__(self, queued: int, running: int, pending_cost: float):
+        super().__init__("服务繁忙，请稍后重试")
+        self.queued = queued
+        self.running = running
+        self.pending_cost = pending_cost
+
+
+class JobStore:
+    """
+    任务表
+    所有状态变更都在 BEGIN IMMEDIATE 事务中完成，多进程并发领取任务不会重复
+    """
+
+    # 领取任务时参与调度的最多排队任务数
+    CLAIM_SCAN_LIMIT = 500
+
+    def __init__(self, db_path: str, max_attempts: int = 3, scheduler: FairScheduler = None):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_attempts = max_attempts
+        self.scheduler = scheduler or FairScheduler()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._conn_pid = None
+
+    def _connection(self) -> sqlite3.Connection:
+        # fork 后的子进程必须重新打开连接
+        if self._conn is None or self._conn_pid != os.getpid():
+            conn = sqlite3.connect(
+                str(self.db_path),
+                timeout=30,
+                check_same_thread=False,
+                isolation_level=None
+            )
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    operation TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    stage TEXT,
+                    progress TEXT,
+                    result TEXT,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    cost REAL NOT NULL DEFAULT 0,
+                    tenant TEXT NOT NULL DEFAULT 'default',
+                    cancel_requested INTEGER NOT NULL DEFAULT 0,
+                    last_seen REAL,
+                    lease_owner TEXT,
+                    lease_expires REAL,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    updated_at REAL NOT NULL
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+            # 旧版本创建的表缺少后来加入的列
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "progress" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN progress TEXT")
+            if "cost" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN cost REAL NOT NULL DEFAULT 0")
+            if "tenant" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN tenant TEXT NOT NULL DEFAULT 'default'")
+            if "cancel_requested" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN cancel_requested INTEGER NOT NULL DEFAULT 0")
+                conn.execute("ALTER TABLE jobs ADD COLUMN last_seen REAL")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_started ON jobs (started_at)")
+            self._conn = conn
+            self._conn_pid = os.getpid()
+        return self._conn
+
+    def _transaction(self, func: Callable[[sqlite3.Connection], object]):
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                value = func(conn)
+                conn.execute("COMMIT")
+                return value
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> dict:
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        job["progress"] = json.loads(job["progress"]) if job["progress"] else None
+        return job
+
+    @staticmethod
+    def _pending(conn: sqlite3.Connection) -> dict:
+        rows = conn.execute(
+            "SELECT status, COUNT(*) AS n, COALESCE(SUM(cost), 0) AS cost FROM jobs WHERE status IN (?, ?) GROUP BY status",
+            (QUEUED, RUNNING)
+        ).fetchall()
+        by_status = {row["status"]: row for row in rows}
+        return {
+            "queued": by_status[QUEUED]["n"] if QUEUED in by_status else 0,
+            "running": by_status[RUNNING]["n"] if RUNNING in by_status else 0,
+            "pending_cost": round(sum(row["cost"] for row in rows), 1),
+        }
+
+    def submit(
+        self,
+        operation: str,
+        params: dict,
+        cost: float = 0.0,
+        tenant: str = "default",
+        max_queued: int = None,
+        max_pending_cost: float = None,
+        job_id: str = None
+    ) -> str:
+        """
+        提交任务
+        设置了上限时，排队任务数或待处理总成本（含本任务）超限则抛出 QueueFull；
+        没有待处理任务时总是接收，避免单个大任务永远无法提交。
+        job_id 可由调用方预先生成（提交前需要先按任务登记资源时）
+        """
+        job_id = job_id or uuid.uuid4().hex
+        now = time.time()
+
+        def insert(conn):
+            pending = self._pending(conn)
+            busy = pending["queued"] + pending["running"] > 0
+            if busy and (
+                (max_queued is not None and pending["queued"] >= max_queued)
+                or (max_pending_cost is not None and pending["pending_cost"] + cost > max_pending_cost)
+            ):
+                raise QueueFull(pending["queued"], pending["running"], pending["pending_cost"])
+            conn.execute(
+                """INSERT INTO jobs (id, operation, params, status, stage, cost, tenant, created_at, updated_at, last_seen)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (job_id, operation, json.dumps(params, ensure_ascii=False), QUEUED, QUEUED, cost, tenant, now, now, now)
+            )
+
+        self._transaction(insert)
+        return job_id
+
+    def record_completed(
+        self,
+        operation: str,
+        params: dict,
+        result: dict,
+        job_id: str = None,
+        tenant: str = "default"
+    ) -> str:
+        """直接记录一个已完成的任务（如命中结果缓存），不经过队列"""
+        job_id = job_id or uuid.uuid4().hex
+        now = time.time()
+
+        def insert(conn):
+            conn.execute(
+                """INSERT INTO jobs (id, operation, params, status, stage, result, tenant,
+                       created_at, started_at, finished_at, updated_at)
+                   VALUES (?, ?, ?, ?, 'done', ?, ?, ?, ?, ?, ?)""",
+                (job_id, operation, json.dumps(params, ensure_ascii=False), SUCCEEDED,
+                 json.dumps(result, ensure_ascii=False), tenant, now, now, now, now)
+            )
+
+        self._transaction(insert)
+        return job_id
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._connection().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def claim(self, owner: str, lease_seconds: float, fast_only: bool = False) -> Optional[dict]:
+        """
+        按调度策略（见 scheduler.FairScheduler）领取一个排队任务
+        先回收租约已过期的任务：未超过重试次数的重新排队，否则标记失败；
+        fast_only 时只领取快速通道（小文件）任务
+        """
+        def claim_one(conn):
+            now = time.time()
+            # 已请求取消的任务租约过期后不再重试
+            conn.execute(
+                """UPDATE jobs SET status = ?, error = '已取消', finished_at = ?,
+                       lease_owner = NULL, updated_at = ?
+                   WHERE status = ? AND lease_expires < ? AND cancel_requested = 1""",
+                (CANCELLED, now, now, RUNNING, now)
+            )
+            conn.execute(
+                """UPDATE jobs SET status = ?, error = '执行中断次数过多', finished_at = ?,
+                       lease_owner = NULL, updated_at = ?
+                   WHERE status = ? AND lease_expires < ? AND attempts >= ?""",
+                (FAILED, now, now, RUNNING, now, self.max_attempts)
+            )
+            conn.execute(
+                """UPDATE jobs SET status = ?, stage = ?, lease_owner = NULL, updated_at = ?
+                   WHERE status = ? AND lease_expires < ?""",
+                (QUEUED, QUEUED, now, RUNNING, now)
+            )
+            queued = [
+                dict(row) for row in conn.execute(
+                    "SELECT id, tenant, cost, created_at FROM jobs WHERE status = ? ORDER BY created_at LIMIT ?",
+                    (QUEUED, self.CLAIM_SCAN_LIMIT)
+                )
+            ]
+            usage = {
+                row["tenant"]: row["cost"] for row in conn.execute(
+                    "SELECT tenant, SUM(cost) AS cost FROM jobs WHERE started_at > ? GROUP BY tenant",
+                    (now - self.scheduler.window,)
+                )
+            }
+            job_id = self.scheduler.pick(queued, usage, now, fast_only=fast_only)
+            if job_id is None:
+                return None
+            conn.execute(
+                """UPDATE jobs SET status = ?, stage = 'starting', progress = NULL, attempts = attempts + 1,
+                       lease_owner = ?, lease_expires = ?, started_at = ?, updated_at = ?
+                   WHERE id = ?""",
+                (RUNNING, owner, now + lease_seconds, now, now, job_id)
+            )
+            return self._to_dict(conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+        return self._transaction(claim_one)
+
+    def _update_owned(self, job_id: str, owner: str, sql: str, params: tuple) -> bool:
+        """只更新仍由 owner 持有的任务，租约已被回收时返回 False"""
+        def update(conn):
+            cursor = conn.execute(
+                f"UPDATE jobs SET {sql}, updated_at = ? WHERE id = ? AND status = ? AND lease_owner = ?",
+                params + (time.time(), job_id, RUNNING, owner)
+            )
+            return cursor.rowcount > 0
+
+        return self._transaction(update)
+
+    def heartbeat(self, job_id: str, owner: str, lease_seconds: float) -> bool:
+        return self._update_owned(job_id, owner, "lease_expires = ?", (time.time() + lease_seconds,))
+
+    def set_stage(self, job_id: str, owner: str, stage: str) -> bool:
+        return self._update_owned(job_id, owner, "stage = ?, progress = NULL", (stage,))
+
+    def set_progress(self, job_id: str, owner: str, progress: dict) -> bool:
+        return self._update_owned(
+            job_id, owner, "stage = ?, progress = ?",
+            (progress["stage"], json.dumps(progress, ensure_ascii=False))
+        )
+
+    def complete(self, job_id: str, owner: str, result: dict) -> bool:
+        return self._update_owned(
+            job_id, owner,
+            "status = ?, stage = 'done', result = ?, finished_at = ?, lease_owner = NULL",
+            (SUCCEEDED, json.dumps(result, ensure_ascii=False), time.time())
+        )
+
+    def fail(self, job_id: str, owner: str, error: str) -> bool:
+        return self._update_owned(
+            job_id, owner,
+            "status = ?, error = ?, finished_at = ?, lease_owner = NULL",
+            (FAILED, error, time.time())
+        )
+
+    def pending(self) -> dict:
+        """队列深度：排队和执行中的任务数及其估算总成本（秒）"""
+        with self._lock:
+            return self._pending(self._connection())
+
+    def tenant_stats(self, window: float = 3600.0) -> dict:
+        """
+        各租户的等待时间（提交到开始执行），用于验证调度策略
+        统计最近 window 秒内开始执行的任务，并给出当前排队任务的最长等待
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            started = conn.execute(
+                """SELECT tenant, cost, started_at - created_at AS wait FROM jobs
+                   WHERE started_at > ? AND started_at > created_at ORDER BY wait""",
+                (now - window,)
+            ).fetchall()
+            waiting = conn.execute(
+                "SELECT tenant, COUNT(*) AS n, MIN(created_at) AS oldest FROM jobs WHERE status = ? GROUP BY tenant",
+                (QUEUED,)
+            ).fetchall()
+
+        stats = {}
+        for row in started:
+            entry = stats.setdefault(row["tenant"], {"waits": [], "cost": 0.0})
+            entry["waits"].append(row["wait"])
+            entry["cost"] += row["cost"]
+        result = {}
+        for tenant, entry in stats.items():
+            waits = entry["waits"]
+            result[tenant] = {
+                "started": len(waits),
+                "cost": round(entry["cost"], 1),
+                "wait_avg": round(sum(waits) / len(waits), 2),
+                "wait_p95": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 2),
+                "wait_max": round(waits[-1], 2),
+            }
+        for row in waiting:
+            entry = result.setdefault(row["tenant"], {"started": 0})
+            entry["queued"] = row["n"]
+            entry["oldest_wait"] = round(now - row["oldest"], 2)
+        return result
+
+    def request_cancel(self, job_id: str) -> Optional[str]:
+        """
+        请求取消任务，返回取消后的状态
+        排队中的任务直接标记为已取消；执行中的任务只做标记，由执行进程中止
+        """
+        def cancel(conn):
+            now = time.time()
+            row = conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            if row["status"] == QUEUED:
+                conn.execute(
+                    """UPDATE jobs SET status = ?, stage = ?, error = '已取消', cancel_requested = 1,
+                           finished_at = ?, updated_at = ? WHERE id = ?""",
+                    (CANCELLED, CANCELLED, now, now, job_id)
+                )
+                return CANCELLED
+            if row["status"] == RUNNING:
+                conn.execute(
+                    "UPDATE jobs SET cancel_requested = 1, updated_at = ? WHERE id = ?",
+                    (now, job_id)
+                )
+            return row["status"]
+
+        return self._transaction(cancel)
+
+    def touch(self, job_id: str):
+        """记录客户端仍在关注该任务（查询状态或订阅进度时调用）"""
+        self._transaction(
+            lambda conn: conn.execute("UPDATE jobs SET last_seen = ? WHERE id = ?", (time.time(), job_id))
+        )
+
+    def cancel_state(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT cancel_requested, last_seen FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def cancelled(self, job_id: str, owner: str, reason: str) -> bool:
+        return self._update_owned(
+            job_id, owner,
+            "status = ?, stage = ?, error = ?, finished_at = ?, lease_owner = NULL",
+            (CANCELLED, CANCELLED, reason, time.time())
+        )
+
+    def counts(self) -> dict:
+        """各状态的任务数（队列深度）"""
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT status, COUNT(*) AS n FROM jobs GROUP BY status"
+            ).fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+
+class JobContext:
+    """传给任务处理函数，用于上报当前阶段和进度"""
+
+    # 同一阶段内两次写入进度的最小间隔（秒），避免逐批写库
+    PROGRESS_INTERVAL = 0.5
+
+    def __init__(self, store: JobStore, job: dict, owner: str, cancel_token: CancelToken = None):
+        self.store = store
+        self.job = job
+        self.owner = owner
+        # 处理函数应把它传给各处理步骤，取消或到达截止时间时抛出 Cancelled
+        self.cancel_token = cancel_token or CancelToken()
+        self._last_stage = None
+        self._last_write = 0.0
+
+    @property
+    def job_id(self) -> str:
+        return self.job["id"]
+
+    def set_stage(self, stage: str):
+        self._last_stage = stage
+        self.store.set_stage(self.job_id, self.owner, stage)
+
+    def report(self, event: dict):
+        """进度回调（见 pdf_translator.progress），阶段切换和完成时立即写入，其余按间隔节流"""
+        now = time.monotonic()
+        finished = event.get("total") and event.get("done") == event.get("total")
+        if event["stage"] == self._last_stage and not finished and now - self._last_write < self.PROGRESS_INTERVAL:
+            return
+        self._last_stage = event["stage"]
+        self._last_write = now
+        self.store.set_progress(self.job_id, self.owner, event)
+
+
+class JobRunner:
+    """
+    后台线程池
+    每个进程各自启动 workers 个线程（外加 fast_lane_workers 个只领取小文件的线程），
+    从共享的任务表中领取任务；
+    start() 可重复调用，fork 出的新进程会重新启动自己的线程
+    """
+
+    # 没有任务时的轮询间隔（秒），其他进程提交的任务靠轮询发现
+    POLL_INTERVAL = 1.0
+    # 执行中检查取消请求的间隔（秒）
+    CANCEL_POLL_INTERVAL = 1.0
+
+    def __init__(
+        self,
+        store: JobStore,
+        handler: Callable[[dict, JobContext], dict],
+        workers: int = 2,
+        lease_seconds: float = 60.0,
+        fast_lane_workers: int = 0,
+        deadline_seconds: float = None,
+        abandon_seconds: float = None,
+        on_final: Callable[[dict], None] = None
+    ):
+        self.store = store
+        self.handler = handler
+        # 任务在本进程中进入最终状态后调用，用于释放任务占用的资源
+        self.on_final = on_final
+        self.workers = max(1, workers)
+        self.fast_lane_workers = max(0, fast_lane_workers)
+        self.lease_seconds = lease_seconds
+        # 每个任务的处理时限；None 表示不限
+        self.deadline_seconds = deadline_seconds
+        # 参数带 cancel_on_disconnect 的任务超过该秒数无人查询即视为被放弃并取消
+        self.abandon_seconds = abandon_seconds
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._started_pid = None
+
+    def start(self):
+        with self._lock:
+            if self._started_pid == os.getpid():
+                return
+            self._started_pid = os.getpid()
+            self._wakeup = threading.Event()
+            for i in range(self.workers):
+                threading.Thread(target=self._loop, name=f"job-worker-{i}", daemon=True).start()
+            # 快速通道线程只领取小文件任务，大任务占满普通线程时小文件也不必排队
+            for i in range(self.fast_lane_workers):
+                threading.Thread(
+                    target=self._loop, args=(True,), name=f"job-fast-lane-{i}", daemon=True
+                ).start()
+
+    def notify(self):
+        """本进程刚提交了任务，立即唤醒空闲线程"""
+        self._wakeup.set()
+
+    def _owner(self) -> str:
+        return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+    def _loop(self, fast_only: bool = False):
+        owner = self._owner()
+        while True:
+            try:
+                job = self.store.claim(owner, self.lease_seconds, fast_only=fast_only)
+            except sqlite3.Error as e:
+                print(f"⚠️ 领取任务失败: {e}")
+                job = None
+            if job is None:
+                self._wakeup.wait(self.POLL_INTERVAL)
+                self._wakeup.clear()
+                continue
+            self._run(job, owner)
+
+    def _watch(self, job: dict, owner: str, token: CancelToken, done: threading.Event):
+        """续约，并把取消请求和客户端离开转换为令牌取消"""
+        watch_abandon = self.abandon_seconds and job["params"].get("cancel_on_disconnect")
+        next_heartbeat = time.monotonic() + self.lease_seconds / 3
+        while not done.wait(self.CANCEL_POLL_INTERVAL):
+            try:
+                state = self.store.cancel_state(job["id"])
+                if state and state["cancel_requested"]:
+                    token.cancel("已取消")
+                elif watch_abandon and state and time.time() - (state["last_seen"] or 0) > self.abandon_seconds:
+                    token.cancel("页面已关闭，任务被放弃")
+                if time.monotonic() >= next_heartbeat:
+                    next_heartbeat = time.monotonic() + self.lease_seconds / 3
+                    if not self.store.heartbeat(job["id"], owner, self.lease_seconds):
+                        # 租约已被回收，任务由其他进程接手，本进程停止处理
+                        token.cancel("租约已失效")
+                        return
+            except sqlite3.Error as e:
+                print(f"⚠️ 检查任务状态失败: {e}")
+
+    def _run(self, job: dict, owner: str):
+        done = threading.Event()
+        token = CancelToken(self.deadline_seconds)
+
+        watcher = threading.Thread(target=self._watch, args=(job, owner, token, done), daemon=True)
+        watcher.start()
+        # 租约已被回收时状态更新不会生效，任务仍由其他进程继续处理
+        finished = False
+        try:
+            result = self.handler(job, JobContext(self.store, job, owner, token))
+            finished = self.store.complete(job["id"], owner, result or {})
+        except DeadlineExceeded:
+            print(f"⏱️ 任务 {job['id']} 超过处理时限")
+            finished = self.store.fail(job["id"], owner, f"超过处理时限（{self.deadline_seconds:.0f} 秒）")
+        except Cancelled as e:
+            print(f"🛑 任务 {job['id']} 已中止: {e}")
+            finished = self.store.cancelled(job["id"], owner, str(e) or "已取消")
+        except Exception as e:
+            traceback.print_exc()
+            finished = self.store.fail(job["id"], owner, str(e))
+        finally:
+            done.set()
+            watcher.join()
+        if finished and self.on_final:
+            try:
+                self.on_final(job)
+            except Exception as e:
+                print(f"⚠️ 任务 {job['id']} 结束后的清理失败: {e}")
@@ -7,10 +7,15 @@ import os
 import sys
 from pathlib import Path
 from dotenv import load_dotenv
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, Response, render_template, request, jsonify, send_file
 from werkzeug.utils import secure_filename
+import json
 import tempfile
+from urllib.parse import unquote
 import shutil
+import time
+import uuid
+import hashlib
 
 # 加载 .env 文件
 load_dotenv()
@@ -18,20 +23,71 @@ load_dotenv()
 # 获取项目根目录
 PROJECT_ROOT = Path(__file__).parent.parent
 sys.path.insert(0, str(PROJECT_ROOT / 'scripts'))
+sys.path.insert(0, str(PROJECT_ROOT))
 
 from pdf_translator.pdf_inplace_translator import translate_pdf_inplace
 from pdf_vector_color_replacer import replace_color_with_device_rgb, analyze_pdf_colors
+from app.jobs import JobStore, JobRunner, QueueFull, SUCCEEDED, FINAL_STATUSES
+from app.admission import estimate_cost, retry_after_seconds
+from app.scheduler import FairScheduler, parse_weights
+from app.uploads import UploadStore, UploadTooLarge
+from app.result_cache import ResultCache, cache_key, canonical_params, code_version, link_or_copy
+from pdf_translator import metrics
+from pdf_translator.checkpoint import Checkpoint
+from pdf_translator.config import DEFAULT_MODEL, TRANSLATE_TIERING, TRANSLATE_FAST_MODEL
 
 app = Flask(__name__, template_folder=str(PROJECT_ROOT / 'templates'))
 
 # 配置
-UPLOAD_FOLDER = PROJECT_ROOT / 'uploads'
+UPLOAD_FOLDER = Path(os.getenv('UPLOAD_FOLDER', str(PROJECT_ROOT / 'uploads')))
 OUTPUT_FOLDER = PROJECT_ROOT / 'output'
 ALLOWED_EXTENSIONS = {'pdf'}
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
+UPLOAD_REF_TTL = float(os.getenv('UPLOAD_REF_TTL', str(24 * 3600)))  # 上传引用的保留时长（秒）
+
+# 后台任务配置
+JOBS_DB_PATH = os.getenv('JOBS_DB_PATH', str(PROJECT_ROOT / 'jobs' / 'jobs.db'))
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))  # 每个 gunicorn worker 的后台线程数
+JOB_LEASE_SECONDS = float(os.getenv('JOB_LEASE_SECONDS', '60'))  # 租约过期后任务重新排队
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+JOB_DEADLINE_SECONDS = float(os.getenv('JOB_DEADLINE_SECONDS', '0')) or None  # 单个任务的处理时限，0 表示不限
+JOB_ABANDON_SECONDS = float(os.getenv('JOB_ABANDON_SECONDS', '120'))  # 浏览器提交的任务无人查询超过该秒数即取消
+# 任务工作目录：保存翻译检查点，worker 中途退出后任务重新排队时从中断处继续
+JOB_WORKSPACE_DIR = Path(os.getenv('JOB_WORKSPACE_DIR', str(Path(JOBS_DB_PATH).parent / 'workspaces')))
+
+# 调度配置：按租户（X-Tenant 头或 X-API-Key）加权公平排队，小文件走快速通道，等待过久的任务优先
+TENANT_WEIGHTS = parse_weights(os.getenv('TENANT_WEIGHTS', ''))  # 如 "acme=3,beta=1"，默认权重 1
+JOB_FAST_LANE_WORKERS = int(os.getenv('JOB_FAST_LANE_WORKERS', '1'))  # 每个 worker 只处理小文件的线程数
+SCHED_FAST_LANE_COST = float(os.getenv('SCHED_FAST_LANE_COST', '10'))  # 估算成本不超过该值（秒）视为小文件
+SCHED_MAX_WAIT = float(os.getenv('SCHED_MAX_WAIT', '300'))  # 等待超过该秒数的任务直接优先
+SCHED_WINDOW = float(os.getenv('SCHED_WINDOW', '900'))  # 统计租户占用成本的时间窗口
+
+# 准入控制：排队任务数或待处理总成本（估算秒数）超限时返回 503，保证已接收任务的延迟
+ADMISSION_MAX_QUEUED = int(os.getenv('ADMISSION_MAX_QUEUED', '20'))
+ADMISSION_MAX_PENDING_COST = float(os.getenv('ADMISSION_MAX_PENDING_COST', '1800'))
+# 所有 gunicorn worker 的后台线程总数，用于估算 Retry-After
+ADMISSION_WORKER_SLOTS = int(os.getenv('ADMISSION_WORKER_SLOTS', str(JOB_WORKERS * 2)))
+
+# 结果缓存配置：相同文件 + 相同操作参数直接返回已有结果
+RESULT_CACHE_ENABLED = os.getenv('RESULT_CACHE_ENABLED', '1') == '1'
+RESULT_CACHE_DIR = os.getenv('RESULT_CACHE_DIR', str(PROJECT_ROOT / 'cache' / 'results'))
+RESULT_CACHE_MAX_MB = int(os.getenv('RESULT_CACHE_MAX_MB', '2048'))
+RESULT_CACHE_TTL = float(os.getenv('RESULT_CACHE_TTL', str(7 * 24 * 3600)))
+# 代码版本：默认由处理代码的源文件和影响输出的配置计算，部署时也可显式指定
+RESULT_CACHE_VERSION = os.getenv('RESULT_CACHE_VERSION') or code_version(
+    [PROJECT_ROOT / 'scripts' / 'pdf_vector_color_replacer.py',
+     *(PROJECT_ROOT / 'scripts' / 'pdf_translator').glob('*.py')],
+    {'model': DEFAULT_MODEL, 'tiering': TRANSLATE_TIERING, 'fast_model': TRANSLATE_FAST_MODEL}
+)
+
+# 进度事件流配置：超过时长后主动断开，由浏览器 EventSource 自动重连，避免长期占用同步 worker
+SSE_MAX_SECONDS = float(os.getenv('SSE_MAX_SECONDS', '60'))
+SSE_POLL_INTERVAL = float(os.getenv('SSE_POLL_INTERVAL', '0.5'))
+SSE_KEEPALIVE_SECONDS = 15
+SSE_TOUCH_INTERVAL = 5
 
 # 创建必要的目录
-UPLOAD_FOLDER.mkdir(exist_ok=True)
+UPLOAD_FOLDER.mkdir(parents=True, exist_ok=True)
 OUTPUT_FOLDER.mkdir(exist_ok=True)
 
 app.config['UPLOAD_FOLDER'] = str(UPLOAD_FOLDER)
@@ -49,32 +105,73 @@ def index():
     return render_template('index_web.html')
 
 
+upload_store = UploadStore(str(UPLOAD_FOLDER), ref_ttl=UPLOAD_REF_TTL)
+
+
+def upload_display_name(original_name):
+    """上传文件的记录名称；secure_filename 会去掉中文，去掉后为空时使用默认名称"""
+    filename = secure_filename(original_name)
+    return filename if allowed_file(filename) else 'upload.pdf'
+
+
+@app.route('/api/upload/preflight', methods=['POST'])
+def upload_preflight():
+    """
+    上传预检：浏览器先发送文件的 SHA-256
+    服务器已有相同内容时直接返回文件路径，浏览器无需再上传
+    """
+    data = request.json or {}
+    sha256 = str(data.get('sha256', '')).lower()
+    original_name = data.get('filename') or ''
+    
+    if len(sha256) != 64 or any(c not in '0123456789abcdef' for c in sha256):
+        return jsonify({'success': False, 'error': '无效的 SHA-256'}), 400
+    if not allowed_file(original_name):
+        return jsonify({'success': False, 'error': '只支持PDF文件'}), 400
+    
+    ref = upload_store.lookup(sha256, upload_display_name(original_name))
+    if ref is None:
+        return jsonify({'success': True, 'exists': False})
+    
+    return jsonify({'success': True, 'exists': True, 'deduplicated': True, **ref})
+
+
 @app.route('/api/upload', methods=['POST'])
 def upload_file():
-    """上传文件"""
-    if 'file' not in request.files:
+    """
+    上传文件，按内容哈希存储
+    支持 multipart 表单（file 字段）或原始请求体（文件名放在 X-Filename 头或 filename 参数），
+    可选 X-Content-SHA256 头校验内容
+    """
+    if 'file' in request.files:
+        file = request.files['file']
+        original_name = file.filename
+        stream = file.stream
+    elif request.mimetype == 'application/pdf' or request.mimetype == 'application/octet-stream':
+        original_name = unquote(request.headers.get('X-Filename', '')) or request.args.get('filename', '')
+        stream = request.stream
+    else:
         return jsonify({'success': False, 'error': '没有文件'}), 400
     
-    file = request.files['file']
-    if file.filename == '':
+    if original_name == '':
         return jsonify({'success': False, 'error': '文件名为空'}), 400
     
-    if not allowed_file(file.filename):
+    if not allowed_file(original_name):
         return jsonify({'success': False, 'error': '只支持PDF文件'}), 400
     
-    if file.content_length > MAX_FILE_SIZE:
-        return jsonify({'success': False, 'error': '文件过大'}), 400
-    
     try:
-        filename = secure_filename(file.filename)
-        filepath = UPLOAD_FOLDER / filename
-        file.save(str(filepath))
-        
-        return jsonify({
-            'success': True,
-            'filepath': str(filepath),
-            'filename': filename
-        })
+        ref = upload_store.save_stream(
+            stream,
+            upload_display_name(original_name),
+            max_size=MAX_FILE_SIZE,
+            expected_sha256=request.headers.get('X-Content-SHA256')
+        )
+        upload_store.maybe_collect()
+        return jsonify({'success': True, **ref})
+    except UploadTooLarge as e:
+        return jsonify({'success': False, 'error': str(e)}), 413
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -101,9 +198,191 @@ def analyze_colors():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+_last_job_sweep = 0.0
+
+
+def job_finished(job_id):
+    """任务已结束或已不存在"""
+    job = job_store.get(job_id)
+    return job is None or job['status'] in FINAL_STATUSES
+
+
+def sweep_finished_jobs(interval=600.0):
+    """
+    距上次清理超过 interval 秒时，清理已结束（失败、取消）或已不存在的任务留下的工作目录和上传引用
+    （如租约过期后被判定失败的任务，没有经过本进程的 on_final）
+    """
+    global _last_job_sweep
+    now = time.monotonic()
+    if now - _last_job_sweep < interval:
+        return
+    _last_job_sweep = now
+    if JOB_WORKSPACE_DIR.exists():
+        for workspace in JOB_WORKSPACE_DIR.iterdir():
+            if job_finished(workspace.name):
+                shutil.rmtree(workspace, ignore_errors=True)
+    # 刚取得引用的任务可能还没写入任务表，留出余量
+    for job_id in upload_store.job_ids(before=time.time() - 60):
+        if job_finished(job_id):
+            upload_store.release_job(job_id)
+
+
+def release_job_resources(job):
+    """任务进入最终状态：释放它持有的上传引用"""
+    upload_store.release_job(job['id'])
+
+
+def run_process_job(job, ctx):
+    """后台执行 PDF 处理任务，返回结果（下载地址等）"""
+    sweep_finished_jobs()
+    data = job['params']
+    operation = job['operation']
+    input_path = Path(data['input_file'])
+    output_filename = output_filename_for(data, job['id'])
+    stem = Path(output_filename).stem
+    output_path = OUTPUT_FOLDER / output_filename
+    
+    if operation == 'translate':
+        # PDF 翻译
+        target_language = data.get('target_language', "English")
+        ctx.set_stage('translating')
+        
+        # 同一任务重试时复用检查点；代码版本变化后旧检查点作废
+        checkpoint = Checkpoint(
+            JOB_WORKSPACE_DIR / job['id'],
+            {'input_file': data['input_file'], 'target_language': target_language, 'version': RESULT_CACHE_VERSION}
+        )
+        translate_pdf_inplace(
+            str(input_path),
+            output_path=str(output_path),
+            target_language=target_language,
+            on_progress=ctx.report,
+            cancel_token=ctx.cancel_token,
+            checkpoint=checkpoint
+        )
+        checkpoint.clear()
+        message = f'PDF翻译完成 ({target_language})'
+    
+    elif operation == 'color':
+        # 颜色替换
+        source_cmyk = tuple(data.get('source_cmyk', [0.7804, 0.8667, 0, 0]))
+        target_hex = data.get('target_hex', '#01beb0')
+        ctx.set_stage('recoloring')
+        
+        replace_color_with_device_rgb(
+            str(input_path),
+            str(output_path),
+            source_cmyk,
+            target_hex,
+            on_progress=ctx.report,
+            cancel_token=ctx.cancel_token
+        )
+        message = '颜色替换完成'
+    
+    elif operation == 'both':
+        # 同时进行颜色和文字替换
+        source_cmyk = tuple(data.get('source_cmyk', [0.7804, 0.8667, 0, 0]))
+        target_hex = data.get('target_hex', '#01beb0')
+        replacements = data.get('replacements', {})
+        
+        # 先进行颜色替换
+        ctx.set_stage('recoloring')
+        temp_path = OUTPUT_FOLDER / f"{stem}_temp.pdf"
+        replace_color_with_device_rgb(
+            str(input_path),
+            str(temp_path),
+            source_cmyk,
+            target_hex,
+            on_progress=ctx.report,
+            cancel_token=ctx.cancel_token
+        )
+        
+        # 再进行文字替换（如果有规则）
+        if replacements:
+            pass
+        
+        # 重命名为最终输出
+        shutil.move(str(temp_path), str(output_path))
+        message = '处理完成'
+    
+    else:
+        raise ValueError(f'未知操作: {operation}')
+    
+    if result_cache and data.get('cache_key'):
+        try:
+            evicted = result_cache.put(data['cache_key'], operation, output_path)
+            metrics.incr('result_cache.stores')
+            metrics.incr('result_cache.evictions', evicted)
+        except OSError as e:
+            print(f"⚠️ 写入结果缓存失败: {e}")
+    
+    return {
+        'message': message,
+        'download_url': f'/api/download/{output_filename}',
+        'filename': output_filename,
+        'cached': False
+    }
+
+
+def output_filename_for(data, job_id):
+    """
+    输出文件名
+    上传文件按内容哈希命名，输出使用原始文件名并带上任务 ID，避免不同用户的同名文件互相覆盖
+    """
+    stem = Path(secure_filename(data.get('filename') or '')).stem or Path(data['input_file']).stem
+    return f"{stem}_{job_id[:8]}_processed.pdf"
+
+
+job_store = JobStore(
+    JOBS_DB_PATH,
+    max_attempts=JOB_MAX_ATTEMPTS,
+    scheduler=FairScheduler(
+        TENANT_WEIGHTS,
+        fast_lane_cost=SCHED_FAST_LANE_COST,
+        max_wait=SCHED_MAX_WAIT,
+        window=SCHED_WINDOW
+    )
+)
+job_runner = JobRunner(
+    job_store,
+    run_process_job,
+    workers=JOB_WORKERS,
+    lease_seconds=JOB_LEASE_SECONDS,
+    fast_lane_workers=JOB_FAST_LANE_WORKERS,
+    deadline_seconds=JOB_DEADLINE_SECONDS,
+    abandon_seconds=JOB_ABANDON_SECONDS,
+    on_final=release_job_resources
+)
+result_cache = ResultCache(
+    RESULT_CACHE_DIR,
+    max_bytes=RESULT_CACHE_MAX_MB * 1024 * 1024,
+    ttl=RESULT_CACHE_TTL
+) if RESULT_CACHE_ENABLED else None
+
+
+def request_tenant():
+    """
+    当前请求的租户
+    优先使用 X-Tenant 头，其次按 X-API-Key 的哈希区分（不保存原始密钥），都没有时按客户端地址
+    """
+    tenant = request.headers.get('X-Tenant', '').strip()
+    if tenant:
+        return tenant[:64]
+    api_key = request.headers.get('X-API-Key', '').strip()
+    if api_key:
+        return 'key-' + hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:12]
+    return request.remote_addr or 'default'
+
+
+@app.before_request
+def ensure_job_runner():
+    """每个 worker 进程在第一次请求时启动自己的后台线程"""
+    job_runner.start()
+
+
 @app.route('/api/process', methods=['POST'])
 def process_pdf():
-    """处理PDF"""
+    """提交 PDF 处理任务，立即返回任务 ID"""
     try:
         data = request.json
         input_file = data.get('input_file')
@@ -112,47 +391,7 @@ def process_pdf():
         if not input_file or not os.path.exists(input_file):
             return jsonify({'success': False, 'error': '输入文件不存在'}), 400
         
-        input_path = Path(input_file)
-        output_filename = f"{input_path.stem}_processed.pdf"
-        output_path = OUTPUT_FOLDER / output_filename
-        
-        if operation == 'translate':
-            # PDF 翻译
-            target_language = data.get('target_language', "English")
-            
-            result = translate_pdf_inplace(
-                str(input_path),
-                output_path=str(output_path),
-                target_language=target_language
-            )
-            
-            return jsonify({
-                'success': True,
-                'message': f'PDF翻译完成 ({target_language})',
-                'download_url': f'/api/download/{output_filename}',
-                'filename': output_filename
-            })
-        
-        elif operation == 'color':
-            # 颜色替换
-            source_cmyk = tuple(data.get('source_cmyk', [0.7804, 0.8667, 0, 0]))
-            target_hex = data.get('target_hex', '#01beb0')
-            
-            replace_color_with_device_rgb(
-                str(input_path),
-                str(output_path),
-                source_cmyk,
-                target_hex
-            )
-            
-            return jsonify({
-                'success': True,
-                'message': '颜色替换完成',
-                'download_url': f'/api/download/{output_filename}',
-                'filename': output_filename
-            })
-        
-        elif operation == 'text':
+        if operation == 'text':
             # 文字替换
             replacements = data.get('replacements', {})
             if not replacements:
@@ -161,36 +400,60 @@ def process_pdf():
             # 这里需要实现文字替换逻辑
             return jsonify({'success': False, 'error': '文字替换功能开发中'}), 501
         
-        elif operation == 'both':
-            # 同时进行颜色和文字替换
-            source_cmyk = tuple(data.get('source_cmyk', [0.7804, 0.8667, 0, 0]))
-            target_hex = data.get('target_hex', '#01beb0')
-            replacements = data.get('replacements', {})
-            
-            # 先进行颜色替换
-            temp_path = OUTPUT_FOLDER / f"{input_path.stem}_temp.pdf"
-            replace_color_with_device_rgb(
-                str(input_path),
-                str(temp_path),
-                source_cmyk,
-                target_hex
+        if operation not in ('translate', 'color', 'both'):
+            return jsonify({'success': False, 'error': '未知操作'}), 400
+        
+        tenant = request_tenant()
+        if result_cache:
+            data['cache_key'] = cache_key(
+                upload_store.sha256_of(input_file),
+                operation,
+                canonical_params(operation, data),
+                RESULT_CACHE_VERSION
             )
-            
-            # 再进行文字替换（如果有规则）
-            if replacements:
-                pass
-            
-            # 重命名为最终输出
-            shutil.move(str(temp_path), str(output_path))
-            
-            return jsonify({
-                'success': True,
-                'message': '处理完成',
-                'download_url': f'/api/download/{output_filename}'
+            cached_path = result_cache.get(data['cache_key'])
+            response = cached_result_response(operation, data, cached_path, tenant) if cached_path else None
+            if response is not None:
+                metrics.incr('result_cache.hits')
+                return response
+            metrics.incr('result_cache.misses')
+        
+        estimate = estimate_cost(input_file, operation)
+        # 任务持有上传文件的引用直到结束，排队再久文件也不会被回收
+        job_id = uuid.uuid4().hex
+        upload_store.acquire_for_job(input_file, job_id)
+        try:
+            job_store.submit(
+                operation,
+                data,
+                cost=estimate['cost'],
+                tenant=tenant,
+                max_queued=ADMISSION_MAX_QUEUED,
+                max_pending_cost=ADMISSION_MAX_PENDING_COST,
+                job_id=job_id
+            )
+        except QueueFull as e:
+            upload_store.release_job(job_id)
+            metrics.incr('admission.rejected')
+            retry_after = retry_after_seconds(e.pending_cost, ADMISSION_WORKER_SLOTS)
+            response = jsonify({
+                'success': False,
+                'error': str(e),
+                'retry_after': retry_after,
+                'queue': {'queued': e.queued, 'running': e.running, 'pending_cost': e.pending_cost}
             })
+            response.headers['Retry-After'] = str(retry_after)
+            return response, 503
+        metrics.incr('admission.accepted')
+        job_runner.notify()
         
-        else:
-            return jsonify({'success': False, 'error': '未知操作'}), 400
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'status_url': f'/api/jobs/{job_id}',
+            'cached': False,
+            'estimate': estimate
+        }), 202
     
     except Exception as e:
         import traceback
@@ -198,6 +461,129 @@ def process_pdf():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+def cached_result_response(operation, data, cached_path, tenant):
+    """
+    命中结果缓存：把缓存文件链接到输出目录，记录为已完成的任务并直接返回
+    缓存文件在查到之后、链接之前被淘汰时返回 None，按未命中正常处理
+    """
+    job_id = uuid.uuid4().hex
+    output_filename = output_filename_for(data, job_id)
+    try:
+        link_or_copy(cached_path, OUTPUT_FOLDER / output_filename)
+    except FileNotFoundError:
+        return None
+    result = {
+        'message': '已返回缓存结果',
+        'download_url': f'/api/download/{output_filename}',
+        'filename': output_filename,
+        'cached': True
+    }
+    job_id = job_store.record_completed(operation, data, result, job_id=job_id, tenant=tenant)
+    job = job_store.get(job_id)
+    
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'status_url': f'/api/jobs/{job_id}',
+        'cached': True,
+        'job': job_payload(job)
+    })
+
+
+def job_payload(job):
+    """任务状态的对外表示"""
+    result = job['result'] or {}
+    return {
+        'id': job['id'],
+        'operation': job['operation'],
+        'status': job['status'],
+        'stage': job['stage'],
+        'progress': job['progress'],
+        'attempts': job['attempts'],
+        'created_at': job['created_at'],
+        'started_at': job['started_at'],
+        'finished_at': job['finished_at'],
+        'error': job['error'],
+        'message': result.get('message'),
+        'result_url': result.get('download_url') if job['status'] == SUCCEEDED else None,
+        'filename': result.get('filename'),
+        'cached': bool(result.get('cached'))
+    }
+
+
+@app.route('/api/jobs/<job_id>')
+def get_job(job_id):
+    """查询任务状态"""
+    job = job_store.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': '任务不存在'}), 404
+    
+    if job['status'] not in FINAL_STATUSES:
+        job_store.touch(job_id)
+    return jsonify({'success': True, 'job': job_payload(job)})
+
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """
+    取消任务
+    排队中的任务立即取消，执行中的任务在下一个检查点中止（在途的 API 请求会被断开）
+    """
+    status = job_store.request_cancel(job_id)
+    if status is None:
+        return jsonify({'success': False, 'error': '任务不存在'}), 404
+    if status in FINAL_STATUSES:
+        # 排队中的任务已直接取消，不会再经过执行线程
+        upload_store.release_job(job_id)
+    
+    return jsonify({'success': True, 'job': job_payload(job_store.get(job_id))})
+
+
+@app.route('/api/jobs/<job_id>/events')
+def job_events(job_id):
+    """
+    任务进度事件流 (Server-Sent Events)
+    状态变化时推送一条 data: <任务 JSON>，任务结束后推送最终状态并关闭
+    """
+    if job_store.get(job_id) is None:
+        return jsonify({'success': False, 'error': '任务不存在'}), 404
+    
+    def stream():
+        started = time.monotonic()
+        last_sent = started
+        last_touch = 0.0
+        last_payload = None
+        yield 'retry: 2000\n\n'
+        
+        while True:
+            job = job_store.get(job_id)
+            payload = job_payload(job)
+            if payload != last_payload:
+                last_payload = payload
+                last_sent = time.monotonic()
+                yield f'data: {json.dumps(payload, ensure_ascii=False)}\n\n'
+            if job['status'] in FINAL_STATUSES:
+                return
+            
+            now = time.monotonic()
+            # 连接保持期间定期记录客户端仍在关注，断开后任务可被判定为放弃
+            if now - last_touch > SSE_TOUCH_INTERVAL:
+                last_touch = now
+                job_store.touch(job_id)
+            if now - started > SSE_MAX_SECONDS:
+                return
+            if now - last_sent > SSE_KEEPALIVE_SECONDS:
+                last_sent = now
+                yield ': keepalive\n\n'
+            time.sleep(SSE_POLL_INTERVAL)
+    
+    return Response(
+        stream(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
 @app.route('/api/download/<filename>')
 def download_file(filename):
     """下载文件"""
@@ -216,6 +602,33 @@ def download_file(filename):
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+def queue_status():
+    pending = job_store.pending()
+    pending['max_queued'] = ADMISSION_MAX_QUEUED
+    pending['max_pending_cost'] = ADMISSION_MAX_PENDING_COST
+    pending['tenants'] = job_store.tenant_stats()
+    return pending
+
+
+@app.route('/api/queue')
+def get_queue():
+    """队列深度"""
+    return jsonify({'success': True, 'queue': queue_status()})
+
+
+@app.route('/api/metrics')
+def get_metrics():
+    """运行指标：本进程计数器、任务队列、上传存储和结果缓存"""
+    return jsonify({
+        'success': True,
+        'counters': metrics.snapshot(),
+        'jobs': job_store.counts(),
+        'queue': queue_status(),
+        'uploads': upload_store.stats(),
+        'result_cache': result_cache.stats() if result_cache else None
+    })
+
+
 @app.route('/health')
 def health():
     """健康检查"""
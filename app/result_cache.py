@@ -0,0 +1,202 @@
+"""
+处理结果缓存
+同一文件、同一操作、同样参数、同一代码版本的处理结果只计算一次。
+缓存键由输入内容哈希、操作名、规范化后的参数和代码版本共同决定；
+结果文件保存在磁盘上，索引在 SQLite (WAL) 中，按 TTL 过期、按总大小 LRU 淘汰
+"""
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+
+
+def code_version(paths: Iterable[Path], settings: dict = None) -> str:
+    """
+    根据处理代码的源文件内容和影响输出的配置计算版本号
+    代码或配置变化后旧结果自然失效
+    """
+    digest = hashlib.sha256()
+    for path in sorted(Path(p) for p in paths):
+        digest.update(path.name.encode("utf-8"))
+        digest.update(path.read_bytes())
+    digest.update(json.dumps(settings or {}, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def canonical_params(operation: str, data: dict) -> dict:
+    """只保留影响输出的参数，并统一格式（颜色小写、CMYK 取 4 位小数）"""
+    if operation == "translate":
+        return {"target_language": str(data.get("target_language", "English")).strip()}
+
+    params = {
+        "source_cmyk": [round(float(v), 4) for v in data.get("source_cmyk", [0.7804, 0.8667, 0, 0])],
+        "target_hex": str(data.get("target_hex", "#01beb0")).strip().lower(),
+    }
+    if operation == "both":
+        params["replacements"] = dict(sorted((data.get("replacements") or {}).items()))
+    return params
+
+
+def cache_key(input_sha256: str, operation: str, params: dict, version: str) -> str:
+    payload = {
+        "input": input_sha256,
+        "operation": operation,
+        "params": params,
+        "version": version,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def link_or_copy(src: Path, dst: Path):
+    """同一文件系统上用硬链接，否则复制"""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+class ResultCache:
+    """
+    结果文件缓存
+    max_bytes 为缓存总大小上限，ttl 为条目最长保留时间（秒）
+    """
+
+    def __init__(self, root: str, max_bytes: int, ttl: float):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.root / "index.db"
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = None
+        self._conn_pid = None
+
+    def _connection(self) -> sqlite3.Connection:
+        # fork 后的子进程必须重新打开连接
+        if self._conn is None or self._conn_pid != os.getpid():
+            conn = sqlite3.connect(
+                str(self.db_path),
+                timeout=30,
+                check_same_thread=False,
+                isolation_level=None
+            )
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS results (
+                    key TEXT PRIMARY KEY,
+                    operation TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    last_used_at REAL NOT NULL
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS results_lru ON results (last_used_at)")
+            self._conn = conn
+            self._conn_pid = os.getpid()
+        return self._conn
+
+    def _transaction(self, func: Callable[[sqlite3.Connection], object]):
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                value = func(conn)
+                conn.execute("COMMIT")
+                return value
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def path_for(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.pdf"
+
+    def _remove(self, conn: sqlite3.Connection, key: str):
+        conn.execute("DELETE FROM results WHERE key = ?", (key,))
+        self.path_for(key).unlink(missing_ok=True)
+
+    def get(self, key: str) -> Optional[Path]:
+        """命中时返回缓存文件路径并刷新 LRU 时间，未命中或已过期返回 None"""
+        def lookup(conn):
+            now = time.time()
+            row = conn.execute("SELECT created_at FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            path = self.path_for(key)
+            if row["created_at"] < now - self.ttl or not path.exists():
+                self._remove(conn, key)
+                return None
+            conn.execute(
+                "UPDATE results SET hits = hits + 1, last_used_at = ? WHERE key = ?",
+                (now, key)
+            )
+            return path
+
+        return self._transaction(lookup)
+
+    def put(self, key: str, operation: str, source: Path) -> int:
+        """存入结果文件，返回因超出配额被淘汰的条目数"""
+        source = Path(source)
+        size = source.stat().st_size
+        if size > self.max_bytes:
+            return 0
+        target = self.path_for(key)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = target.with_name(f"{target.name}.{os.getpid()}.part")
+        link_or_copy(source, tmp_path)
+
+        def store(conn):
+            now = time.time()
+            os.replace(tmp_path, target)
+            conn.execute(
+                """INSERT INTO results (key, operation, size, created_at, last_used_at)
+                   VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT(key) DO UPDATE SET size = excluded.size,
+                       created_at = excluded.created_at, last_used_at = excluded.last_used_at""",
+                (key, operation, size, now, now)
+            )
+            return self._evict(conn)
+
+        try:
+            return self._transaction(store)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+    def _evict(self, conn: sqlite3.Connection) -> int:
+        """删除过期条目，再按最近使用时间从旧到新淘汰直到总大小不超过上限"""
+        evicted = 0
+        expired = conn.execute(
+            "SELECT key FROM results WHERE created_at < ?", (time.time() - self.ttl,)
+        ).fetchall()
+        for row in expired:
+            self._remove(conn, row["key"])
+            evicted += 1
+
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) AS total FROM results").fetchone()["total"]
+        if total <= self.max_bytes:
+            return evicted
+        for row in conn.execute("SELECT key, size FROM results ORDER BY last_used_at").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._remove(conn, row["key"])
+            total -= row["size"]
+            evicted += 1
+        return evicted
+
+    def stats(self) -> dict:
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT COUNT(*) AS entries, COALESCE(SUM(size), 0) AS bytes, COALESCE(SUM(hits), 0) AS hits FROM results"
+            ).fetchone()
+        stats = dict(row)
+        stats["max_bytes"] = self.max_bytes
+        stats["ttl"] = self.ttl
+        return stats
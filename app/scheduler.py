@@ -0,0 +1,70 @@
+"""
+后台任务调度策略
+按租户加权公平排队：每个租户最近一段时间占用的任务成本加上候选任务成本再除以权重，
+结果最小者优先，小文件因此天然靠前；同一租户内小文件（快速通道）优先，
+另有只领取小文件的专用线程；等待超过 max_wait 的任务直接优先（老化），避免大文件饿死
+"""
+import time
+from typing import Optional
+
+
+def parse_weights(spec: str) -> dict:
+    """解析 "acme=3,beta=1" 形式的租户权重"""
+    weights = {}
+    for item in spec.split(","):
+        name, _, value = item.strip().partition("=")
+        if name and value:
+            weights[name.strip()] = max(0.1, float(value))
+    return weights
+
+
+class FairScheduler:
+    """
+    从排队任务中选出下一个要执行的任务
+    queued: [{"id", "tenant", "cost", "created_at"}, ...]（按提交时间排序）
+    usage: {tenant: 最近 window 秒内开始执行的任务成本之和}
+    """
+
+    def __init__(
+        self,
+        weights: dict = None,
+        fast_lane_cost: float = 10.0,
+        max_wait: float = 300.0,
+        window: float = 900.0
+    ):
+        self.weights = weights or {}
+        self.fast_lane_cost = fast_lane_cost
+        self.max_wait = max_wait
+        self.window = window
+
+    def weight(self, tenant: str) -> float:
+        return self.weights.get(tenant, 1.0)
+
+    def is_fast(self, job: dict) -> bool:
+        return job["cost"] <= self.fast_lane_cost
+
+    def pick(self, queued: list, usage: dict, now: float = None, fast_only: bool = False) -> Optional[str]:
+        now = time.time() if now is None else now
+        if fast_only:
+            queued = [job for job in queued if self.is_fast(job)]
+        if not queued:
+            return None
+
+        # 老化：等待过久的任务按提交顺序优先
+        oldest = queued[0]
+        if now - oldest["created_at"] >= self.max_wait:
+            return oldest["id"]
+
+        # 每个租户的候选：快速通道中最早的任务，没有则取最早的任务
+        candidates = {}
+        for job in queued:
+            current = candidates.get(job["tenant"])
+            if current is None or (self.is_fast(job) and not self.is_fast(current)):
+                candidates[job["tenant"]] = job
+
+        # 加权公平：(已占用成本 + 本任务成本) / 权重 最小者优先
+        def finish_tag(job):
+            tenant = job["tenant"]
+            return ((usage.get(tenant, 0.0) + job["cost"]) / self.weight(tenant), job["created_at"])
+
+        return min(candidates.values(), key=finish_tag)["id"]
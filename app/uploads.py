@@ -0,0 +1,283 @@
+"""
+按内容寻址的上传存储
+文件按 SHA-256 保存为 objects/<前两位>/<sha256>.pdf，相同内容只存一份；
+每次上传（或预检命中）生成一条引用，引用释放或过期后计数减一，归零时删除文件。
+提交的任务另持有一条属于该任务的引用，不按 TTL 过期，任务结束时释放
+"""
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import BinaryIO, Callable, Optional
+
+
+# 流式写盘的块大小
+CHUNK_SIZE = 1024 * 1024
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+class UploadStore:
+    """
+    上传文件存储
+    引用计数保存在 SQLite (WAL) 中，多个 gunicorn worker 共享
+    """
+
+    def __init__(self, root: str, ref_ttl: float = 24 * 3600):
+        self.root = Path(root)
+        self.objects_dir = self.root / "objects"
+        self.tmp_dir = self.root / "tmp"
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.root / "uploads.db"
+        self.ref_ttl = ref_ttl
+        self._lock = threading.Lock()
+        self._conn = None
+        self._conn_pid = None
+        self._last_collect = 0.0
+
+    def _connection(self) -> sqlite3.Connection:
+        # fork 后的子进程必须重新打开连接
+        if self._conn is None or self._conn_pid != os.getpid():
+            conn = sqlite3.connect(
+                str(self.db_path),
+                timeout=30,
+                check_same_thread=False,
+                isolation_level=None
+            )
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS blobs (
+                    sha256 TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    refcount INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used_at REAL NOT NULL
+                )"""
+            )
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS refs (
+                    id TEXT PRIMARY KEY,
+                    sha256 TEXT NOT NULL,
+                    filename TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    job_id TEXT
+                )"""
+            )
+            # 旧版本创建的表缺少后来加入的列
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(refs)")}
+            if "job_id" not in columns:
+                conn.execute("ALTER TABLE refs ADD COLUMN job_id TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS refs_created ON refs (created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS refs_job ON refs (job_id)")
+            self._conn = conn
+            self._conn_pid = os.getpid()
+        return self._conn
+
+    def _transaction(self, func: Callable[[sqlite3.Connection], object]):
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                value = func(conn)
+                conn.execute("COMMIT")
+                return value
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def path_for(self, sha256: str) -> Path:
+        return self.objects_dir / sha256[:2] / f"{sha256}.pdf"
+
+    def _add_ref(self, conn: sqlite3.Connection, sha256: str, filename: str, job_id: str = None) -> dict:
+        now = time.time()
+        ref_id = uuid.uuid4().hex
+        conn.execute(
+            "UPDATE blobs SET refcount = refcount + 1, last_used_at = ? WHERE sha256 = ?",
+            (now, sha256)
+        )
+        conn.execute(
+            "INSERT INTO refs (id, sha256, filename, created_at, job_id) VALUES (?, ?, ?, ?, ?)",
+            (ref_id, sha256, filename, now, job_id)
+        )
+        size = conn.execute("SELECT size FROM blobs WHERE sha256 = ?", (sha256,)).fetchone()["size"]
+        return {
+            "upload_id": ref_id,
+            "sha256": sha256,
+            "filename": filename,
+            "filepath": str(self.path_for(sha256)),
+            "size": size,
+        }
+
+    def _release(self, conn: sqlite3.Connection, ref_id: str) -> bool:
+        row = conn.execute("SELECT sha256 FROM refs WHERE id = ?", (ref_id,)).fetchone()
+        if row is None:
+            return False
+        conn.execute("DELETE FROM refs WHERE id = ?", (ref_id,))
+        conn.execute("UPDATE blobs SET refcount = refcount - 1 WHERE sha256 = ?", (row["sha256"],))
+        blob = conn.execute("SELECT refcount FROM blobs WHERE sha256 = ?", (row["sha256"],)).fetchone()
+        if blob and blob["refcount"] <= 0:
+            conn.execute("DELETE FROM blobs WHERE sha256 = ?", (row["sha256"],))
+            self.path_for(row["sha256"]).unlink(missing_ok=True)
+        return True
+
+    def lookup(self, sha256: str, filename: str) -> Optional[dict]:
+        """预检：已有该内容时直接增加一条引用并返回，否则返回 None"""
+        sha256 = sha256.lower()
+
+        def add_if_exists(conn):
+            row = conn.execute("SELECT 1 FROM blobs WHERE sha256 = ?", (sha256,)).fetchone()
+            if row is None or not self.path_for(sha256).exists():
+                return None
+            return self._add_ref(conn, sha256, filename)
+
+        return self._transaction(add_if_exists)
+
+    def save_stream(
+        self,
+        stream: BinaryIO,
+        filename: str,
+        max_size: int,
+        expected_sha256: str = None
+    ) -> dict:
+        """
+        分块写入临时文件并同时计算哈希，完成后移入对象目录
+        内容已存在时丢弃临时文件，只增加引用（返回值 deduplicated=True）
+        """
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_name = tempfile.mkstemp(dir=self.tmp_dir, suffix=".part")
+        tmp_path = Path(tmp_name)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > max_size:
+                        raise UploadTooLarge("文件过大")
+                    digest.update(chunk)
+                    f.write(chunk)
+            sha256 = digest.hexdigest()
+            if expected_sha256 and expected_sha256.lower() != sha256:
+                raise ValueError("文件校验失败（SHA-256 不一致）")
+
+            def store(conn):
+                now = time.time()
+                target = self.path_for(sha256)
+                row = conn.execute("SELECT 1 FROM blobs WHERE sha256 = ?", (sha256,)).fetchone()
+                deduplicated = row is not None and target.exists()
+                if not deduplicated:
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    os.replace(tmp_path, target)
+                    conn.execute(
+                        """INSERT INTO blobs (sha256, size, refcount, created_at, last_used_at)
+                           VALUES (?, ?, 0, ?, ?)
+                           ON CONFLICT(sha256) DO UPDATE SET size = excluded.size""",
+                        (sha256, size, now, now)
+                    )
+                ref = self._add_ref(conn, sha256, filename)
+                ref["deduplicated"] = deduplicated
+                return ref
+
+            return self._transaction(store)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+    def sha256_of(self, path: str) -> str:
+        """文件的 SHA-256；存储中的文件直接取文件名，其他路径读取计算"""
+        path = Path(path).resolve()
+        if path.parent.parent == self.objects_dir.resolve() and len(path.stem) == 64:
+            return path.stem
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def get_ref(self, ref_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._connection().execute("SELECT * FROM refs WHERE id = ?", (ref_id,)).fetchone()
+        return dict(row) if row else None
+
+    def release(self, ref_id: str) -> bool:
+        return self._transaction(lambda conn: self._release(conn, ref_id))
+
+    def acquire_for_job(self, path: str, job_id: str) -> Optional[str]:
+        """
+        为任务增加一条引用，保证任务排队期间文件不会被回收
+        path 不是存储中的文件（或文件已被回收）时返回 None
+        """
+        path = Path(path).resolve()
+        if path.parent.parent != self.objects_dir.resolve() or len(path.stem) != 64:
+            return None
+        sha256 = path.stem
+
+        def add_if_exists(conn):
+            row = conn.execute("SELECT 1 FROM blobs WHERE sha256 = ?", (sha256,)).fetchone()
+            if row is None or not path.exists():
+                return None
+            return self._add_ref(conn, sha256, path.name, job_id=job_id)["upload_id"]
+
+        return self._transaction(add_if_exists)
+
+    def release_job(self, job_id: str) -> int:
+        """释放任务持有的引用，返回释放数量"""
+        def release(conn):
+            rows = conn.execute("SELECT id FROM refs WHERE job_id = ?", (job_id,)).fetchall()
+            for row in rows:
+                self._release(conn, row["id"])
+            return len(rows)
+
+        return self._transaction(release)
+
+    def job_ids(self, before: float = None) -> list[str]:
+        """持有引用的任务；before 为时间戳时只返回在此之前取得的引用"""
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT DISTINCT job_id FROM refs WHERE job_id IS NOT NULL AND created_at < ?",
+                (time.time() if before is None else before,)
+            ).fetchall()
+        return [row["job_id"] for row in rows]
+
+    def collect_expired(self) -> int:
+        """释放超过 ref_ttl 的引用（任务持有的引用除外），返回释放数量"""
+        cutoff = time.time() - self.ref_ttl
+
+        def collect(conn):
+            rows = conn.execute(
+                "SELECT id FROM refs WHERE created_at < ? AND job_id IS NULL", (cutoff,)
+            ).fetchall()
+            for row in rows:
+                self._release(conn, row["id"])
+            return len(rows)
+
+        return self._transaction(collect)
+
+    def maybe_collect(self, interval: float = 600.0) -> int:
+        """距上次回收超过 interval 秒时回收过期引用，在上传请求中顺带调用"""
+        now = time.monotonic()
+        if now - self._last_collect < interval:
+            return 0
+        self._last_collect = now
+        released = self.collect_expired()
+        if released:
+            print(f"🧹 已释放 {released} 个过期上传引用")
+        return released
+
+    def stats(self) -> dict:
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT COUNT(*) AS blobs, COALESCE(SUM(size), 0) AS bytes, COALESCE(SUM(refcount), 0) AS refs FROM blobs"
+            ).fetchone()
+        return dict(row)
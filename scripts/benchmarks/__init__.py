@@ -0,0 +1,2 @@
+# Benchmarks
+# 离线性能测试工具：模拟 OpenRouter 服务、合成 PDF、基准计时
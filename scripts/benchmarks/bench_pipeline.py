@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+端到端基准测试
+生成合成中文 PDF，分别计时各处理阶段，输出 JSON 结果并与保存的基线比较
+
+阶段:
+  extract_text_blocks       pdf_extractor.extract_text_blocks
+  pdf_to_images             pdf_extractor.pdf_to_images
+  extract_embedded_images   pdf_extractor.extract_embedded_images
+  inplace_replace           PDFInplaceTranslator.translate_pdf（AI 调用走本地模拟服务，零延迟）
+  replace_color             pdf_vector_color_replacer.replace_color_with_device_rgb
+  render_datasheet_pdf      pdf_renderer.render_datasheet_pdf
+  render_manual_pdf         pdf_renderer.render_manual_pdf
+缺少依赖的阶段记为 skipped，不影响其他阶段
+
+用法:
+  python -m scripts.benchmarks.bench_pipeline --scenario medium
+  python -m scripts.benchmarks.bench_pipeline --scenario medium --save-baseline
+  python -m scripts.benchmarks.bench_pipeline --pages 20 --images 4 --repeat 5 --output result.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from scripts.benchmarks.mock_openrouter import MockOpenRouter, MockOptions
+from scripts.benchmarks.synthetic_pdf import SOURCE_CMYK, generate_pdf
+
+
+PRESETS = {
+    "small": {"pages": 2, "text_blocks": 20, "tables": 1, "images": 1, "cmyk_shapes": 10},
+    "medium": {"pages": 10, "text_blocks": 40, "tables": 2, "images": 2, "cmyk_shapes": 40},
+    "large": {"pages": 40, "text_blocks": 60, "tables": 2, "images": 3, "cmyk_shapes": 80},
+}
+
+DEFAULT_BASELINE = Path(__file__).parent / "baseline.json"
+DEFAULT_OUTPUT_DIR = PROJECT_ROOT / "output" / "benchmarks"
+
+# 低于该差值（秒）的变化视为噪声，不判定为退化
+NOISE_FLOOR = 0.005
+
+
+def _synthetic_markdown(pages: int) -> str:
+    """与页数成比例的 Datasheet/Manual Markdown"""
+    sections = []
+    for i in range(max(pages, 1)):
+        rows = "\n".join(f"| Parameter {i}-{j} | {j * 10} | V |" for j in range(8))
+        sections.append(
+            f"## Section {i + 1}\n\n"
+            "The sensor provides reliable detection for industrial automation lines. "
+            "Install the emitter and receiver on the same horizontal plane.\n\n"
+            f"| Name | Value | Unit |\n|---|---|---|\n{rows}\n\n"
+            "- Self-diagnostics\n- Anti-interference design\n- IP65 housing\n"
+        )
+    return "# Photoelectric Sensor\n\n" + "\n".join(sections)
+
+
+class StageContext:
+    """各阶段共享的输入文件和工作目录"""
+
+    def __init__(self, pdf_path: str, workdir: Path, params: dict):
+        self.pdf_path = pdf_path
+        self.workdir = workdir
+        self.params = params
+        self.markdown = _synthetic_markdown(params["pages"])
+
+
+def _stage_extract_text_blocks(ctx: StageContext):
+    from scripts.pdf_translator.pdf_extractor import extract_text_blocks
+    return lambda: extract_text_blocks(ctx.pdf_path)
+
+
+def _stage_pdf_to_images(ctx: StageContext):
+    from scripts.pdf_translator.pdf_extractor import pdf_to_images
+    # pdf_to_images 返回惰性来源，遍历一遍才真正渲染
+    return lambda: list(pdf_to_images(ctx.pdf_path))
+
+
+def _stage_extract_embedded_images(ctx: StageContext):
+    from scripts.pdf_translator.pdf_extractor import extract_embedded_images
+    return lambda: extract_embedded_images(ctx.pdf_path)
+
+
+def _stage_inplace_replace(ctx: StageContext):
+    from scripts.pdf_translator.pdf_inplace_translator import PDFInplaceTranslator
+    translator = PDFInplaceTranslator(use_memory=False)
+    output = str(ctx.workdir / "inplace.pdf")
+    return lambda: translator.translate_pdf(ctx.pdf_path, output)
+
+
+def _stage_replace_color(ctx: StageContext):
+    from scripts.pdf_vector_color_replacer import replace_color_with_device_rgb
+    output = str(ctx.workdir / "colored.pdf")
+    return lambda: replace_color_with_device_rgb(ctx.pdf_path, output, SOURCE_CMYK, "#01beb0")
+
+
+def _stage_render_datasheet_pdf(ctx: StageContext):
+    from scripts.pdf_translator.pdf_renderer import render_datasheet_pdf
+    output = str(ctx.workdir / "datasheet.pdf")
+    return lambda: render_datasheet_pdf(ctx.markdown, output, product_name="Benchmark")
+
+
+def _stage_render_manual_pdf(ctx: StageContext):
+    from scripts.pdf_translator.pdf_renderer import render_manual_pdf
+    output = str(ctx.workdir / "manual.pdf")
+    return lambda: render_manual_pdf(ctx.markdown, output, product_name="Benchmark")
+
+
+STAGES = {
+    "extract_text_blocks": _stage_extract_text_blocks,
+    "pdf_to_images": _stage_pdf_to_images,
+    "extract_embedded_images": _stage_extract_embedded_images,
+    "inplace_replace": _stage_inplace_replace,
+    "replace_color": _stage_replace_color,
+    "render_datasheet_pdf": _stage_render_datasheet_pdf,
+    "render_manual_pdf": _stage_render_manual_pdf,
+}
+
+
+def run_stage(name: str, ctx: StageContext, repeat: int) -> dict:
+    """执行一个阶段 repeat 次（外加一次预热），返回耗时统计"""
+    try:
+        func = STAGES[name](ctx)
+    except ImportError as e:
+        return {"status": "skipped", "reason": f"缺少依赖: {e.name or e}"}
+
+    timings = []
+    try:
+        # 阶段内部的进度输出不计入，也不刷屏
+        with contextlib.redirect_stdout(io.StringIO()):
+            func()
+            for _ in range(repeat):
+                start = time.perf_counter()
+                func()
+                timings.append(time.perf_counter() - start)
+    except Exception as e:
+        return {"status": "error", "reason": f"{type(e).__name__}: {e}"}
+
+    return {
+        "status": "ok",
+        "runs": len(timings),
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "mean": statistics.fmean(timings),
+        "max": max(timings),
+        "timings": timings,
+    }
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=PROJECT_ROOT, capture_output=True, text=True, timeout=10
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _environment() -> dict:
+    try:
+        import fitz
+        pymupdf_version = fitz.VersionBind
+    except ImportError:
+        pymupdf_version = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "pymupdf": pymupdf_version,
+        "git_commit": _git_commit(),
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> dict:
+    """
+    按阶段比较中位数耗时
+    慢于基线 (1 + tolerance) 倍且差值超过噪声阈值的阶段判定为退化
+    """
+    comparison = {}
+    base_stages = baseline.get("stages", {})
+    for name, stage in results["stages"].items():
+        base = base_stages.get(name)
+        if stage.get("status") != "ok" or not base or base.get("status") != "ok":
+            comparison[name] = {"status": "not_compared"}
+            continue
+        ratio = stage["median"] / base["median"] if base["median"] > 0 else None
+        regressed = (
+            ratio is not None
+            and ratio > 1 + tolerance
+            and stage["median"] - base["median"] > NOISE_FLOOR
+        )
+        comparison[name] = {
+            "status": "regressed" if regressed else "ok",
+            "baseline_median": base["median"],
+            "median": stage["median"],
+            "ratio": ratio,
+        }
+    return comparison
+
+
+def print_summary(results: dict):
+    print(f"\n📊 基准结果: {results['scenario']} {results['params']}")
+    comparison = results.get("comparison") or {}
+    for name, stage in results["stages"].items():
+        if stage["status"] != "ok":
+            print(f"   {name:<26} {stage['status']}: {stage['reason']}")
+            continue
+        line = f"   {name:<26} 中位数 {stage['median'] * 1000:9.1f} ms  (min {stage['min'] * 1000:.1f} ms)"
+        diff = comparison.get(name, {})
+        if diff.get("ratio"):
+            mark = "❌ 退化" if diff["status"] == "regressed" else "✓"
+            line += f"  基线 {diff['baseline_median'] * 1000:.1f} ms, x{diff['ratio']:.2f} {mark}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="PDF 处理各阶段的端到端基准测试",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=f"预设场景: {', '.join(f'{k}={v}' for k, v in PRESETS.items())}"
+    )
+    parser.add_argument("--scenario", default="medium", help="预设场景名称，或自定义参数时的结果名称 (默认: medium)")
+    parser.add_argument("--pages", type=int, help="页数")
+    parser.add_argument("--text-blocks", type=int, help="每页文本行数")
+    parser.add_argument("--tables", type=int, help="每页表格数")
+    parser.add_argument("--images", type=int, help="每页嵌入图片数")
+    parser.add_argument("--cmyk-shapes", type=int, help="每页 CMYK 矢量图形数")
+    parser.add_argument("--seed", type=int, default=0, help="合成文档的随机种子")
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES), help="只运行指定阶段")
+    parser.add_argument("--repeat", type=int, default=3, help="每个阶段计时次数 (默认: 3)")
+    parser.add_argument("--output", "-o", help="结果 JSON 路径 (默认: output/benchmarks/<scenario>.json)")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE), help="基线文件路径")
+    parser.add_argument("--save-baseline", action="store_true", help="把本次结果保存为该场景的基线")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="允许的变慢比例 (默认: 0.25)")
+    parser.add_argument("--no-fail", action="store_true", help="检测到退化时也返回 0")
+    args = parser.parse_args()
+
+    params = dict(PRESETS.get(args.scenario, PRESETS["medium"]))
+    for key in ("pages", "text_blocks", "tables", "images", "cmyk_shapes"):
+        value = getattr(args, key)
+        if value is not None:
+            params[key] = value
+    params["seed"] = args.seed
+
+    workdir = Path(tempfile.mkdtemp(prefix="pdf_bench_"))
+    pdf_path = generate_pdf(str(workdir / f"bench_{args.scenario}.pdf"), **params)
+    print(f"🧪 合成文档: {pdf_path} ({Path(pdf_path).stat().st_size / 1024:.0f} KB)")
+
+    # AI 调用指向本地零延迟模拟服务，只测本地处理开销；
+    # 必须在导入 pdf_translator 之前设置，配置在导入时读取
+    mock = MockOpenRouter(MockOptions(latency="fixed:0", token_rate=0)).start()
+    os.environ["OPENROUTER_BASE_URL"] = mock.base_url
+    os.environ.setdefault("OPENROUTER_API_KEY", "mock")
+
+    ctx = StageContext(pdf_path, workdir, params)
+    results = {
+        "scenario": args.scenario,
+        "params": params,
+        "repeat": args.repeat,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "environment": _environment(),
+        "stages": {},
+    }
+    try:
+        for name in args.stages:
+            print(f"   ⏱  {name}...")
+            results["stages"][name] = run_stage(name, ctx, args.repeat)
+    finally:
+        mock.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+        # pdf_to_images / extract_embedded_images 会写入 temp/<文件名>
+        shutil.rmtree(PROJECT_ROOT / "temp" / Path(pdf_path).stem, ignore_errors=True)
+
+    baseline_path = Path(args.baseline)
+    baselines = {}
+    if baseline_path.exists():
+        baselines = json.loads(baseline_path.read_text(encoding="utf-8"))
+    baseline = baselines.get(args.scenario)
+    if baseline:
+        if baseline.get("params") != params:
+            print(f"⚠️ 基线参数与本次不同: {baseline.get('params')}")
+        results["comparison"] = compare(results, baseline, args.tolerance)
+    else:
+        results["comparison"] = None
+
+    print_summary(results)
+
+    output_path = Path(args.output) if args.output else DEFAULT_OUTPUT_DIR / f"{args.scenario}.json"
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    output_path.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"\n📝 结果已保存: {output_path}")
+
+    if args.save_baseline:
+        baselines[args.scenario] = {
+            "params": params,
+            "created_at": results["created_at"],
+            "environment": results["environment"],
+            "stages": {
+                name: {k: v for k, v in stage.items() if k != "timings"}
+                for name, stage in results["stages"].items()
+            },
+        }
+        baseline_path.write_text(json.dumps(baselines, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"📌 基线已更新: {baseline_path} [{args.scenario}]")
+    elif baseline is None:
+        print("   没有该场景的基线，使用 --save-baseline 保存")
+
+    regressed = [
+        name for name, diff in (results["comparison"] or {}).items()
+        if diff["status"] == "regressed"
+    ]
+    if regressed:
+        print(f"❌ 性能退化: {', '.join(regressed)}")
+        if not args.no_fail:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
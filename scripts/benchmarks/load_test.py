@@ -0,0 +1,520 @@
+#!/usr/bin/env python3
+"""
+Web 服务压力测试
+按真实的操作组合和文件大小驱动 app.main 的上传 / 颜色分析 / 处理 / 下载接口，
+AI 调用指向进程内的 OpenRouter 模拟服务，逐级提高并发，报告：
+- 吞吐 (req/s、会话/s) 与各接口及任务完成的 p50/p90/p99 延迟
+- 错误率、超时率
+- gunicorn worker 内存（读取 /proc）
+会话序列由随机种子决定，同一参数多次运行的负载完全相同，可用作服务端改动的门禁
+
+用法:
+  # 启动与线上相同配置的 gunicorn（2 worker, 180s 超时）并压测
+  python -m scripts.benchmarks.load_test --concurrency 1 2 4 8 --sessions 20
+
+  # 压测已在运行的服务（需自行把其 OPENROUTER_BASE_URL 指向 --mock-port）
+  python -m scripts.benchmarks.load_test --url http://127.0.0.1:8080 --mock-port 8765 --server-pid 1234
+"""
+import argparse
+import json
+import math
+import os
+import random
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import httpx
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from scripts.benchmarks.bench_pipeline import PRESETS
+from scripts.benchmarks.mock_openrouter import MockOpenRouter, MockOptions
+from scripts.benchmarks.synthetic_pdf import SOURCE_CMYK, generate_pdf
+
+
+DEFAULT_BASELINE = Path(__file__).parent / "load_baseline.json"
+DEFAULT_OUTPUT_DIR = PROJECT_ROOT / "output" / "benchmarks"
+
+# 会话类型：一次完整的用户操作流程
+SESSION_STEPS = {
+    "translate": ("upload", "process", "job_status", "download"),
+    "color": ("upload", "analyze_colors", "process", "job_status", "download"),
+}
+
+
+def _parse_weights(spec: str, allowed) -> dict[str, float]:
+    """解析 "a=0.7,b=0.3" 形式的权重"""
+    weights = {}
+    for item in spec.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in allowed:
+            raise ValueError(f"未知项: {name}（可选: {', '.join(allowed)}）")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+def percentile(values: list[float], q: float):
+    """最近秩分位数（0~1）"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def _read_rss(pid: int):
+    """读取进程常驻内存 (KB)，进程已退出时返回 None"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def _child_pids(pid: int) -> list[int]:
+    children = []
+    for entry in Path("/proc").iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            stat = (entry / "stat").read_text()
+        except OSError:
+            continue
+        # stat 第 2 列是带括号的进程名，可能含空格，从最后一个 ')' 之后解析
+        fields = stat.rsplit(")", 1)[-1].split()
+        if len(fields) > 1 and int(fields[1]) == pid:
+            children.append(int(entry.name))
+    return children
+
+
+class MemorySampler:
+    """后台定期采样 gunicorn worker 的 RSS，记录每个 worker 的峰值"""
+
+    def __init__(self, server_pid: int, interval: float = 0.5):
+        self.server_pid = server_pid
+        self.interval = interval
+        self.peak_kb: dict[int, int] = {}
+        self.last_kb: dict[int, int] = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        pids = _child_pids(self.server_pid) or [self.server_pid]
+        current = {}
+        for pid in pids:
+            rss = _read_rss(pid)
+            if rss is not None:
+                current[pid] = rss
+                self.peak_kb[pid] = max(self.peak_kb.get(pid, 0), rss)
+        self.last_kb = current
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self) -> "MemorySampler":
+        self._sample()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> dict:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self._sample()
+        return {
+            "workers": len(self.last_kb),
+            "peak_worker_mb": round(max(self.peak_kb.values(), default=0) / 1024, 1),
+            "peak_total_mb": round(sum(self.peak_kb.values()) / 1024, 1),
+            "end_total_mb": round(sum(self.last_kb.values()) / 1024, 1),
+        }
+
+
+class LoadClient:
+    """
+    执行会话并记录每个请求的结果
+    /api/process 只提交任务，另记一条 job 记录表示从提交到完成的总耗时
+    """
+
+    # 任务状态轮询间隔（秒）
+    POLL_INTERVAL = 0.5
+
+    def __init__(self, base_url: str, timeout: float):
+        self.client = httpx.Client(base_url=base_url, timeout=timeout)
+        self.records: list[dict] = []
+        self._lock = threading.Lock()
+
+    def close(self):
+        self.client.close()
+
+    def _record(self, endpoint: str, latency: float, error: str = None, status: int = None):
+        with self._lock:
+            self.records.append({"endpoint": endpoint, "status": status, "error": error, "latency": latency})
+
+    def _request(self, endpoint: str, method: str, url: str, **kwargs):
+        start = time.perf_counter()
+        status = None
+        error = None
+        response = None
+        try:
+            response = self.client.request(method, url, **kwargs)
+            status = response.status_code
+            if status >= 400:
+                error = f"http_{status}"
+        except httpx.TimeoutException:
+            error = "timeout"
+        except httpx.TransportError as e:
+            error = type(e).__name__
+        self._record(endpoint, time.perf_counter() - start, error, status)
+        return response if error is None else None
+
+    def run_session(self, session: dict):
+        """按顺序执行一个会话的各步骤，某步失败则放弃后续步骤"""
+        pdf_path = session["pdf_path"]
+        with open(pdf_path, "rb") as f:
+            content = f.read()
+
+        response = self._request(
+            "upload", "POST", "/api/upload",
+            files={"file": (session["filename"], content, "application/pdf")}
+        )
+        if response is None:
+            return
+        filepath = response.json()["filepath"]
+        filename = response.json()["filename"]
+
+        if session["kind"] == "color":
+            if self._request("analyze_colors", "POST", "/api/analyze_colors", json={"filepath": filepath}) is None:
+                return
+            body = {
+                "input_file": filepath,
+                "filename": filename,
+                "operation": "color",
+                "source_cmyk": list(SOURCE_CMYK),
+                "target_hex": "#01beb0",
+            }
+        else:
+            body = {
+                "input_file": filepath,
+                "filename": filename,
+                "operation": "translate",
+                "target_language": "English",
+            }
+
+        start = time.perf_counter()
+        response = self._request("process", "POST", "/api/process", json=body)
+        if response is None:
+            return
+        job = self._wait_for_job(response.json()["status_url"])
+        # 从提交到任务完成的总耗时
+        self._record("job", time.perf_counter() - start, None if job and job["status"] == "succeeded" else "job_failed")
+        if job and job["status"] == "succeeded":
+            self._request("download", "GET", job["result_url"])
+
+    def _wait_for_job(self, status_url: str):
+        deadline = time.monotonic() + self.client.timeout.read
+        while time.monotonic() < deadline:
+            response = self._request("job_status", "GET", status_url)
+            if response is not None:
+                job = response.json()["job"]
+                if job["status"] in ("succeeded", "failed"):
+                    return job
+            time.sleep(self.POLL_INTERVAL)
+        return None
+
+
+def build_sessions(count: int, mix: dict, sizes: dict, files: dict, seed: int, tag: str) -> list[dict]:
+    """按权重生成确定性的会话序列，每个会话使用不同的上传文件名"""
+    rng = random.Random(seed)
+    kinds, kind_weights = zip(*mix.items())
+    size_names, size_weights = zip(*sizes.items())
+    sessions = []
+    for i in range(count):
+        kind = rng.choices(kinds, kind_weights)[0]
+        size = rng.choices(size_names, size_weights)[0]
+        sessions.append({
+            "kind": kind,
+            "size": size,
+            "pdf_path": files[size],
+            "filename": f"loadtest_{tag}_{i}_{size}.pdf",
+        })
+    return sessions
+
+
+def summarize(records: list[dict], elapsed: float) -> dict:
+    """
+    汇总一级并发的结果
+    吞吐、总体分位数和错误率只统计真实 HTTP 请求，job 记录单独列在 endpoints 中
+    """
+    latencies = {}
+    for record in records:
+        latencies.setdefault(record["endpoint"], []).append(record["latency"])
+    requests = [r for r in records if r["endpoint"] != "job"]
+    errors = [r for r in requests if r["error"]]
+    timeouts = [r for r in errors if r["error"] == "timeout"]
+    all_latencies = [r["latency"] for r in requests]
+    error_kinds = {}
+    for record in errors:
+        error_kinds[record["error"]] = error_kinds.get(record["error"], 0) + 1
+    jobs = [r for r in records if r["endpoint"] == "job"]
+    return {
+        "requests": len(requests),
+        "elapsed": elapsed,
+        "requests_per_s": len(requests) / elapsed if elapsed > 0 else 0.0,
+        "error_rate": len(errors) / len(requests) if requests else 0.0,
+        "timeout_rate": len(timeouts) / len(requests) if requests else 0.0,
+        "job_failure_rate": sum(1 for r in jobs if r["error"]) / len(jobs) if jobs else 0.0,
+        "errors": error_kinds,
+        "p50": percentile(all_latencies, 0.5),
+        "p99": percentile(all_latencies, 0.99),
+        "endpoints": {
+            endpoint: {
+                "count": len(values),
+                "p50": percentile(values, 0.5),
+                "p90": percentile(values, 0.9),
+                "p99": percentile(values, 0.99),
+            }
+            for endpoint, values in latencies.items()
+        },
+    }
+
+
+def run_step(base_url: str, concurrency: int, sessions: list[dict], timeout: float, server_pid) -> dict:
+    client = LoadClient(base_url, timeout)
+    sampler = MemorySampler(server_pid).start() if server_pid else None
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(client.run_session, sessions))
+    finally:
+        elapsed = time.perf_counter() - start
+        client.close()
+    result = summarize(client.records, elapsed)
+    result["concurrency"] = concurrency
+    result["sessions"] = len(sessions)
+    result["sessions_per_s"] = len(sessions) / elapsed if elapsed > 0 else 0.0
+    result["memory"] = sampler.stop() if sampler else None
+    return result
+
+
+def start_gunicorn(port: int, workers: int, timeout: int, env: dict) -> subprocess.Popen:
+    """按 Dockerfile 中的参数启动 gunicorn"""
+    command = [
+        sys.executable, "-m", "gunicorn", "app.main:app",
+        "-b", f"127.0.0.1:{port}",
+        "--timeout", str(timeout),
+        "--workers", str(workers),
+    ]
+    return subprocess.Popen(
+        command, cwd=PROJECT_ROOT, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+
+def wait_for_health(base_url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/health", timeout=2).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"服务未就绪: {base_url}")
+
+
+def _free_port() -> int:
+    import socket
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    按并发级别比较会话吞吐、任务完成 p99 和错误率，返回退化项
+    （状态轮询次数随耗时变化，不用 req/s 判定）
+    """
+    regressions = []
+    base_steps = {step["concurrency"]: step for step in baseline.get("steps", [])}
+    for step in results["steps"]:
+        base = base_steps.get(step["concurrency"])
+        if not base:
+            continue
+        label = f"c={step['concurrency']}"
+        if step["sessions_per_s"] < base["sessions_per_s"] * (1 - tolerance):
+            regressions.append(
+                f"{label} 会话吞吐 {step['sessions_per_s']:.2f}/s < 基线 {base['sessions_per_s']:.2f}/s"
+            )
+        job_p99 = step["endpoints"].get("job", {}).get("p99")
+        base_p99 = base["endpoints"].get("job", {}).get("p99")
+        if base_p99 and job_p99 and job_p99 > base_p99 * (1 + tolerance):
+            regressions.append(f"{label} 任务 p99 {job_p99:.2f}s > 基线 {base_p99:.2f}s")
+        if step["error_rate"] > base["error_rate"] + 0.01:
+            regressions.append(f"{label} 错误率 {step['error_rate']:.1%} > 基线 {base['error_rate']:.1%}")
+        if step["job_failure_rate"] > base.get("job_failure_rate", 0.0) + 0.01:
+            regressions.append(f"{label} 任务失败率 {step['job_failure_rate']:.1%}")
+    return regressions
+
+
+def print_step(step: dict):
+    memory = step["memory"]
+    memory_text = f", 内存峰值 {memory['peak_total_mb']} MB ({memory['workers']} 进程)" if memory else ""
+    print(
+        f"   并发 {step['concurrency']:>3}: {step['requests_per_s']:.2f} req/s, "
+        f"p50 {step['p50'] or 0:.2f}s, p99 {step['p99'] or 0:.2f}s, "
+        f"会话 {step['sessions_per_s']:.2f}/s, 错误 {step['error_rate']:.1%}, "
+        f"超时 {step['timeout_rate']:.1%}, 任务失败 {step['job_failure_rate']:.1%}{memory_text}"
+    )
+    for endpoint, stats in step["endpoints"].items():
+        print(f"      {endpoint:<15} n={stats['count']:<4} p50 {stats['p50']:.3f}s  p99 {stats['p99']:.3f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Web 服务压力测试（AI 调用使用本地模拟服务）",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--url", help="已运行的服务地址；不指定时自动启动 gunicorn")
+    parser.add_argument("--server-pid", type=int, help="--url 模式下用于采样内存的 gunicorn master PID")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn worker 数 (默认: 2)")
+    parser.add_argument("--server-timeout", type=int, default=180, help="gunicorn 超时秒数 (默认: 180)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8], help="逐级并发数")
+    parser.add_argument("--sessions", type=int, default=20, help="每级并发执行的会话数 (默认: 20)")
+    parser.add_argument("--mix", default="translate=0.6,color=0.4", help="会话类型权重")
+    parser.add_argument("--sizes", default="small=0.6,medium=0.3,large=0.1", help="文件大小权重（bench_pipeline 预设）")
+    parser.add_argument("--timeout", type=float, default=200.0, help="客户端单请求超时秒数 (默认: 200)")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--mock-port", type=int, default=0, help="模拟服务端口 (默认: 随机)")
+    parser.add_argument("--llm-latency", default="lognormal:0.8:0.5", help="模拟服务首字节延迟分布")
+    parser.add_argument("--llm-token-rate", type=float, default=200.0, help="模拟服务生成速度 token/s")
+    parser.add_argument("--llm-rate-429", type=float, default=0.0, help="模拟服务 429 概率")
+    parser.add_argument("--llm-rate-5xx", type=float, default=0.0, help="模拟服务 5xx 概率")
+    parser.add_argument("--output", "-o", help="结果 JSON 路径 (默认: output/benchmarks/load_test.json)")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE), help="基线文件路径")
+    parser.add_argument("--save-baseline", action="store_true", help="把本次结果保存为基线")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允许的退化比例 (默认: 0.2)")
+    parser.add_argument("--no-fail", action="store_true", help="检测到退化时也返回 0")
+    args = parser.parse_args()
+
+    mix = _parse_weights(args.mix, SESSION_STEPS)
+    sizes = _parse_weights(args.sizes, PRESETS)
+
+    workdir = Path(tempfile.mkdtemp(prefix="pdf_load_"))
+    files = {
+        size: generate_pdf(str(workdir / f"{size}.pdf"), seed=args.seed, **PRESETS[size])
+        for size in sizes
+    }
+
+    mock = MockOpenRouter(
+        MockOptions(
+            latency=args.llm_latency,
+            token_rate=args.llm_token_rate,
+            rate_429=args.llm_rate_429,
+            rate_5xx=args.llm_rate_5xx,
+            seed=args.seed
+        ),
+        port=args.mock_port
+    ).start()
+    print(f"🧪 模拟服务: {mock.base_url}")
+
+    server = None
+    server_pid = args.server_pid
+    base_url = args.url
+    try:
+        if not base_url:
+            port = _free_port()
+            env = dict(os.environ)
+            env.update({
+                "OPENROUTER_BASE_URL": mock.base_url,
+                "OPENROUTER_API_KEY": "mock",
+                # 每次运行使用空的翻译记忆和任务队列，保证结果可重复
+                "TM_DB_PATH": str(workdir / "translation_memory.db"),
+                "JOBS_DB_PATH": str(workdir / "jobs.db"),
+                "UPLOAD_FOLDER": str(workdir / "uploads"),
+            })
+            server = start_gunicorn(port, args.workers, args.server_timeout, env)
+            server_pid = server.pid
+            base_url = f"http://127.0.0.1:{port}"
+            print(f"🚀 gunicorn: {base_url} ({args.workers} workers, PID {server_pid})")
+        wait_for_health(base_url)
+
+        results = {
+            "params": {
+                "workers": args.workers if server else None,
+                "sessions": args.sessions,
+                "mix": mix,
+                "sizes": sizes,
+                "seed": args.seed,
+                "llm_latency": args.llm_latency,
+                "llm_token_rate": args.llm_token_rate,
+                "llm_rate_429": args.llm_rate_429,
+                "llm_rate_5xx": args.llm_rate_5xx,
+            },
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "steps": [],
+        }
+        for concurrency in args.concurrency:
+            # 模拟服务按请求体和到达次数决定延迟与故障，每级重置后负载一致
+            mock.state.reset()
+            sessions = build_sessions(args.sessions, mix, sizes, files, args.seed, f"c{concurrency}")
+            step = run_step(base_url, concurrency, sessions, args.timeout, server_pid)
+            step["llm"] = mock.state.stats()
+            results["steps"].append(step)
+            print_step(step)
+    finally:
+        if server:
+            server.send_signal(signal.SIGTERM)
+            try:
+                server.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                server.kill()
+        mock.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+        # 清理压测在 output/ 留下的文件（上传文件在 workdir 中）
+        for path in (PROJECT_ROOT / "output").glob("loadtest_*"):
+            path.unlink(missing_ok=True)
+
+    output_path = Path(args.output) if args.output else DEFAULT_OUTPUT_DIR / "load_test.json"
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    output_path.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"\n📝 结果已保存: {output_path}")
+
+    baseline_path = Path(args.baseline)
+    if args.save_baseline:
+        baseline_path.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"📌 基线已更新: {baseline_path}")
+        return
+    if not baseline_path.exists():
+        print("   没有基线，使用 --save-baseline 保存")
+        return
+
+    baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+    if baseline.get("params") != results["params"]:
+        print(f"⚠️ 基线参数与本次不同: {baseline.get('params')}")
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print("❌ 性能退化:")
+        for item in regressions:
+            print(f"   {item}")
+        if not args.no_fail:
+            sys.exit(1)
+    else:
+        print("✓ 与基线相比无退化")
+
+
+if __name__ == "__main__":
+    main()
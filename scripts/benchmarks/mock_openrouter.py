@@ -0,0 +1,579 @@
+#!/usr/bin/env python3
+"""
+本地 OpenRouter 模拟服务
+实现 /chat/completions 接口，按提示词类型返回格式正确的确定性响应：
+- 批量翻译: NUMBER|||TRANSLATION 行
+- Vision 页面识别: 带 bbox 的 JSON 数组
+- 文档分析 / 图片标注: JSON 对象
+- 其他生成任务: Markdown 文本
+支持延迟分布、429/5xx 注入、截断 (finish_reason=length)、流式输出与中途断流，
+用于离线、可重复地测量吞吐和并发行为，不消耗 API 费用
+
+用法:
+  python -m scripts.benchmarks.mock_openrouter --port 8765 --latency lognormal:0.8:0.5
+  OPENROUTER_BASE_URL=http://127.0.0.1:8765/api/v1 OPENROUTER_API_KEY=mock python ...
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+
+# 与 AIProcessor 的估算保持一致：每张图片约 1000 token
+IMAGE_TOKENS = 1000
+
+_ITEM_RE = re.compile(r'^(\d+)\|\|\|(.*?)\|\|\|MAX:(\d+)\s*$', re.MULTILINE)
+_PAGE_SIZE_RE = re.compile(r'PAGE SIZE:\s*([\d.]+)\s*x\s*([\d.]+)')
+
+_WORDS = (
+    "sensor", "output", "signal", "voltage", "current", "power", "supply", "range",
+    "detection", "distance", "response", "time", "operating", "temperature", "housing",
+    "material", "cable", "connection", "protection", "class", "safety", "warning",
+    "install", "device", "light", "beam", "receiver", "emitter", "indicator", "mode",
+    "setting", "relay", "load", "wiring", "terminal", "mounting", "bracket", "accuracy",
+)
+
+
+class LatencyDistribution:
+    """
+    延迟分布，格式 "类型:参数"
+    - fixed:0.5
+    - uniform:0.2:1.5
+    - normal:0.8:0.2
+    - lognormal:0.8:0.5      (中位数, sigma)
+    - pareto:0.5:2.5         (最小值, alpha；长尾)
+    """
+
+    def __init__(self, spec: str):
+        self.spec = spec
+        kind, *params = spec.split(":")
+        self.kind = kind
+        self.params = [float(p) for p in params]
+        expected = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2, "pareto": 2}
+        if kind not in expected or len(self.params) != expected[kind]:
+            raise ValueError(f"无法解析延迟分布: {spec}")
+
+    def sample(self, rng: random.Random) -> float:
+        p = self.params
+        if self.kind == "fixed":
+            value = p[0]
+        elif self.kind == "uniform":
+            value = rng.uniform(p[0], p[1])
+        elif self.kind == "normal":
+            value = rng.gauss(p[0], p[1])
+        elif self.kind == "lognormal":
+            value = rng.lognormvariate(math.log(max(p[0], 1e-6)), p[1])
+        else:
+            value = p[0] * rng.paretovariate(p[1])
+        return max(0.0, value)
+
+
+class MockOptions:
+    """模拟服务的行为参数"""
+
+    def __init__(
+        self,
+        latency: str = "lognormal:0.8:0.5",
+        model_latency: dict = None,
+        token_rate: float = 200.0,
+        chunk_chars: int = 40,
+        rate_429: float = 0.0,
+        rate_5xx: float = 0.0,
+        retry_after: Optional[float] = 1.0,
+        truncate_rate: float = 0.0,
+        break_rate: float = 0.0,
+        seed: int = 0
+    ):
+        self.latency = LatencyDistribution(latency)
+        self.model_latency = {
+            model: LatencyDistribution(spec)
+            for model, spec in (model_latency or {}).items()
+        }
+        self.token_rate = token_rate
+        self.chunk_chars = max(1, chunk_chars)
+        self.rate_429 = rate_429
+        self.rate_5xx = rate_5xx
+        self.retry_after = retry_after
+        self.truncate_rate = truncate_rate
+        self.break_rate = break_rate
+        self.seed = seed
+
+    def latency_for(self, model: str) -> LatencyDistribution:
+        return self.model_latency.get(model, self.latency)
+
+
+def _text_parts(messages: list) -> tuple[str, int]:
+    """拼接所有文本内容，并统计图片数量"""
+    texts = []
+    images = 0
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            texts.append(content)
+            continue
+        for part in content or []:
+            if part.get("type") == "text":
+                texts.append(part.get("text", ""))
+            elif part.get("type") == "image_url":
+                images += 1
+    return "\n".join(texts), images
+
+
+def _digest(*parts: str) -> str:
+    return hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()
+
+
+def _fake_translation(source: str, max_chars: int) -> str:
+    """同一原文总是得到同一译文，长度与原文成比例且不超过 MAX"""
+    rng = random.Random(_digest("translation", source))
+    count = max(1, len(source) // 2)
+    words = [rng.choice(_WORDS) for _ in range(count)]
+    words[0] = words[0].capitalize()
+    text = " ".join(words)
+    if max_chars > 0 and len(text) > max_chars:
+        text = text[:max_chars].rsplit(" ", 1)[0] or text[:max_chars]
+    return text
+
+
+def _translation_reply(prompt: str) -> str:
+    lines = []
+    for number, source, max_chars in _ITEM_RE.findall(prompt):
+        lines.append(f"{number}|||{_fake_translation(source, int(max_chars))}")
+    return "\n".join(lines)
+
+
+def _vision_reply(prompt: str, seed_text: str) -> str:
+    match = _PAGE_SIZE_RE.search(prompt)
+    width, height = (float(match.group(1)), float(match.group(2))) if match else (595.0, 842.0)
+    rng = random.Random(_digest("vision", seed_text))
+    count = rng.randint(3, 8)
+    row = height / (count + 1)
+    blocks = []
+    for i in range(count):
+        x0 = round(rng.uniform(0.05, 0.3) * width, 1)
+        x1 = round(min(width * 0.95, x0 + rng.uniform(0.2, 0.6) * width), 1)
+        y0 = round(row * (i + 0.5), 1)
+        y1 = round(y0 + min(row * 0.8, rng.uniform(10, 40)), 1)
+        blocks.append({
+            "chinese": f"示例文本{i + 1}",
+            "english": _fake_translation(f"示例文本{i + 1}{seed_text[:8]}", 60),
+            "bbox": [x0, y0, x1, y1]
+        })
+    return "```json\n" + json.dumps(blocks, ensure_ascii=False, indent=2) + "\n```"
+
+
+def _analysis_reply(images: int) -> str:
+    info = {
+        "product_name": "Photoelectric Safety Light Curtain",
+        "model": "MOCK-100",
+        "brand": "Mock",
+        "specifications": [
+            {"name": "Supply voltage", "value": "24", "unit": "V DC"},
+            {"name": "Response time", "value": "15", "unit": "ms"},
+            {"name": "Operating temperature", "value": "-10 ~ 55", "unit": "°C"},
+        ],
+        "features": ["Self-diagnostics", "Anti-interference design"],
+        "wiring": {
+            "description": "PNP output wiring",
+            "pins": [{"color": "Brown", "function": "+24V"}, {"color": "Blue", "function": "0V"}]
+        },
+        "installation": ["Align emitter and receiver", "Fix brackets"],
+        "operation": ["Power on and check indicators"],
+        "safety_warnings": ["Do not disassemble while powered"],
+        "images": [
+            {"type": "other", "description": f"Page {i + 1} figure", "page": i + 1}
+            for i in range(images)
+        ]
+    }
+    return "```json\n" + json.dumps(info, ensure_ascii=False, indent=2) + "\n```"
+
+
+def _annotation_reply() -> str:
+    info = {
+        "annotations": [
+            {"chinese": "电源", "english": "Power", "position": "top left"},
+            {"chinese": "输出", "english": "Output", "position": "bottom right"},
+        ],
+        "legend": [{"item": "Brown", "description": "+24V supply"}],
+        "figure_caption": "Figure 1. Wiring diagram"
+    }
+    return "```json\n" + json.dumps(info, ensure_ascii=False, indent=2) + "\n```"
+
+
+def _document_reply(prompt: str) -> str:
+    rng = random.Random(_digest("document", prompt))
+    sections = []
+    for i in range(6):
+        words = " ".join(rng.choice(_WORDS) for _ in range(40))
+        sections.append(f"## Section {i + 1}\n\n{words.capitalize()}.")
+    return "# Mock Document\n\n" + "\n\n".join(sections)
+
+
+def build_reply(messages: list) -> str:
+    """按提示词类型生成响应内容"""
+    prompt, images = _text_parts(messages)
+    if _ITEM_RE.search(prompt):
+        return _translation_reply(prompt)
+    if "PAGE SIZE:" in prompt and "bbox" in prompt:
+        image_urls = [
+            part["image_url"].get("url", "")[-64:]
+            for message in messages if isinstance(message.get("content"), list)
+            for part in message["content"] if part.get("type") == "image_url"
+        ]
+        return _vision_reply(prompt, _digest(prompt, *image_urls))
+    if '"product_name"' in prompt:
+        return _analysis_reply(images)
+    if '"annotations"' in prompt:
+        return _annotation_reply()
+    return _document_reply(prompt)
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class MockState:
+    """
+    服务端共享状态
+    同一请求体第 N 次到达时使用固定的随机种子，故障注入与延迟不受并发顺序影响，结果可复现
+    """
+
+    def __init__(self, options: MockOptions):
+        self.options = options
+        self._attempts: dict[str, int] = {}
+        self._counters: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def rng_for(self, body: bytes) -> random.Random:
+        digest = hashlib.sha256(body).hexdigest()
+        with self._lock:
+            attempt = self._attempts.get(digest, 0)
+            self._attempts[digest] = attempt + 1
+        return random.Random(f"{self.options.seed}:{digest}:{attempt}")
+
+    def incr(self, name: str, value: int = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._counters)
+
+    def reset(self):
+        with self._lock:
+            self._attempts.clear()
+            self._counters.clear()
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """单个连接的请求处理（HTTP/1.1 keep-alive，流式响应使用 chunked 编码）"""
+
+    protocol_version = "HTTP/1.1"
+    server_version = "MockOpenRouter/1.0"
+
+    @property
+    def state(self) -> MockState:
+        return self.server.state
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def handle(self):
+        # 客户端取消请求时会提前断开连接，不打印异常栈
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _send_json(self, status: int, body: dict, headers: dict = None):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_error(self, status: int, message: str, headers: dict = None):
+        self._send_json(status, {"error": {"code": status, "message": message}}, headers)
+
+    def do_GET(self):
+        path = self.path.split("?")[0].rstrip("/")
+        if path.endswith("/health") or path == "":
+            self._send_json(200, {"status": "ok"})
+        elif path.endswith("/stats"):
+            self._send_json(200, self.state.stats())
+        else:
+            self._send_error(404, "not found")
+
+    def do_DELETE(self):
+        if self.path.split("?")[0].rstrip("/").endswith("/stats"):
+            self.state.reset()
+            self._send_json(200, {"status": "reset"})
+        else:
+            self._send_error(404, "not found")
+
+    def do_POST(self):
+        if not self.path.split("?")[0].rstrip("/").endswith("/chat/completions"):
+            self._send_error(404, "not found")
+            return
+
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length)
+        try:
+            payload = json.loads(body)
+            messages = payload["messages"]
+        except (ValueError, KeyError, TypeError):
+            self._send_error(400, "invalid request body")
+            return
+        if not self.headers.get("Authorization", "").startswith("Bearer "):
+            self._send_error(401, "missing API key")
+            return
+
+        options = self.state.options
+        rng = self.state.rng_for(body)
+        model = payload.get("model", "mock")
+        self.state.incr("requests")
+        self.state.incr(f"model.{model}")
+
+        # 首字节延迟
+        ttft = options.latency_for(model).sample(rng)
+
+        if rng.random() < options.rate_429:
+            time.sleep(min(ttft, 0.1))
+            self.state.incr("injected_429")
+            headers = {}
+            if options.retry_after is not None:
+                headers["Retry-After"] = f"{options.retry_after:g}"
+            self._send_error(429, "Rate limit exceeded (mock)", headers)
+            return
+        if rng.random() < options.rate_5xx:
+            time.sleep(ttft)
+            self.state.incr("injected_5xx")
+            self._send_error(rng.choice((500, 502, 503)), "Upstream error (mock)")
+            return
+
+        content = build_reply(messages)
+        finish_reason = "stop"
+        max_tokens = payload.get("max_tokens")
+        if max_tokens and estimate_tokens(content) > max_tokens:
+            content = content[:max_tokens * 4]
+            finish_reason = "length"
+        elif content and rng.random() < options.truncate_rate:
+            content = content[:int(len(content) * rng.uniform(0.3, 0.8))]
+            finish_reason = "length"
+        if finish_reason == "length":
+            self.state.incr("truncated")
+
+        prompt_text, images = _text_parts(messages)
+        usage = {
+            "prompt_tokens": len(prompt_text) // 2 + images * IMAGE_TOKENS,
+            "completion_tokens": estimate_tokens(content),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        self.state.incr("prompt_tokens", usage["prompt_tokens"])
+        self.state.incr("completion_tokens", usage["completion_tokens"])
+
+        completion_id = f"gen-mock-{_digest(body.decode('utf-8', 'replace'))[:16]}"
+        if payload.get("stream"):
+            self._stream(completion_id, model, content, finish_reason, usage, ttft, rng)
+            return
+
+        generation = usage["completion_tokens"] / options.token_rate if options.token_rate > 0 else 0.0
+        time.sleep(ttft + generation)
+        self._send_json(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": finish_reason
+            }],
+            "usage": usage
+        })
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _write_event(self, event):
+        data = event if isinstance(event, str) else json.dumps(event, ensure_ascii=False)
+        self._write_chunk(f"data: {data}\n\n".encode("utf-8"))
+
+    def _stream(
+        self,
+        completion_id: str,
+        model: str,
+        content: str,
+        finish_reason: str,
+        usage: dict,
+        ttft: float,
+        rng: random.Random
+    ):
+        options = self.state.options
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        # OpenRouter 在生成前发送注释行保活
+        self._write_chunk(b": OPENROUTER PROCESSING\n\n")
+        time.sleep(ttft)
+
+        pieces = [
+            content[i:i + options.chunk_chars]
+            for i in range(0, len(content), options.chunk_chars)
+        ]
+        break_at = None
+        if len(pieces) > 1 and rng.random() < options.break_rate:
+            break_at = rng.randint(1, len(pieces) - 1)
+
+        created = int(time.time())
+        for index, piece in enumerate(pieces):
+            if index == break_at:
+                # 不发送结束块直接断开，客户端会收到不完整的 chunked 响应
+                self.state.incr("injected_breaks")
+                self.close_connection = True
+                return
+            if options.token_rate > 0:
+                time.sleep(estimate_tokens(piece) / options.token_rate)
+            self._write_event({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]
+            })
+
+        self._write_event({
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}],
+            "usage": usage
+        })
+        self._write_event("[DONE]")
+        self._write_chunk(b"")
+
+
+class MockOpenRouter:
+    """
+    可在进程内启动的模拟服务（供基准脚本使用）
+
+    with MockOpenRouter(MockOptions(rate_429=0.05)) as server:
+        os.environ["OPENROUTER_BASE_URL"] = server.base_url
+    """
+
+    def __init__(self, options: MockOptions = None, host: str = "127.0.0.1", port: int = 0, verbose: bool = False):
+        self.options = options or MockOptions()
+        self.httpd = ThreadingHTTPServer((host, port), MockHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.state = MockState(self.options)
+        self.httpd.verbose = verbose
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/api/v1"
+
+    @property
+    def state(self) -> MockState:
+        return self.httpd.state
+
+    def start(self) -> "MockOpenRouter":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self) -> "MockOpenRouter":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="本地 OpenRouter 模拟服务（基准测试用）",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+示例:
+  # 中位数 0.8s 的对数正态延迟，5% 限流，2% 服务端错误
+  python -m scripts.benchmarks.mock_openrouter --rate-429 0.05 --rate-5xx 0.02
+
+  # 指定模型使用不同延迟（分级/故障转移测试）
+  python -m scripts.benchmarks.mock_openrouter --model-latency google/gemini-2.5-flash-lite=fixed:0.2
+
+  # 长尾延迟 + 流式断流（对冲/截断处理测试）
+  python -m scripts.benchmarks.mock_openrouter --latency pareto:0.3:1.5 --break-rate 0.1
+        """
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", default="lognormal:0.8:0.5", help="首字节延迟分布 (默认: lognormal:0.8:0.5)")
+    parser.add_argument(
+        "--model-latency", action="append", default=[], metavar="MODEL=SPEC",
+        help="为指定模型单独设置延迟分布，可重复"
+    )
+    parser.add_argument("--token-rate", type=float, default=200.0, help="生成速度 token/s，0 表示立即返回 (默认: 200)")
+    parser.add_argument("--chunk-chars", type=int, default=40, help="流式输出每块字符数 (默认: 40)")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="返回 429 的概率")
+    parser.add_argument("--rate-5xx", type=float, default=0.0, help="返回 5xx 的概率")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="429 响应的 Retry-After 秒数，负数表示不发送")
+    parser.add_argument("--truncate-rate", type=float, default=0.0, help="随机截断 (finish_reason=length) 的概率")
+    parser.add_argument("--break-rate", type=float, default=0.0, help="流式响应中途断开的概率")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--verbose", "-v", action="store_true", help="打印访问日志")
+    args = parser.parse_args()
+
+    model_latency = {}
+    for item in args.model_latency:
+        model, _, spec = item.partition("=")
+        if not spec:
+            parser.error(f"--model-latency 格式应为 MODEL=SPEC: {item}")
+        model_latency[model] = spec
+
+    options = MockOptions(
+        latency=args.latency,
+        model_latency=model_latency,
+        token_rate=args.token_rate,
+        chunk_chars=args.chunk_chars,
+        rate_429=args.rate_429,
+        rate_5xx=args.rate_5xx,
+        retry_after=args.retry_after if args.retry_after >= 0 else None,
+        truncate_rate=args.truncate_rate,
+        break_rate=args.break_rate,
+        seed=args.seed
+    )
+    server = MockOpenRouter(options, args.host, args.port, verbose=args.verbose)
+    print(f"🧪 模拟服务已启动: {server.base_url}")
+    print(f"   export OPENROUTER_BASE_URL={server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+载荷图片大小对比
+按不同编码设置渲染同一文档的所有页面，统计每页字节数和编码耗时，与 PNG 对比。
+配合 /api/metrics 中的 payload.* 计数器，可评估上传量、延迟与识别准确率之间的取舍
+
+用法:
+  python -m scripts.benchmarks.payload_sizes input.pdf
+  python -m scripts.benchmarks.payload_sizes input.pdf --dpi 150 --encodings png "jpeg,quality=70,gray" webp
+  python -m scripts.benchmarks.payload_sizes --pages 10   # 不指定文件时使用合成文档
+  python -m scripts.benchmarks.payload_sizes input.pdf --adaptive   # 按页自适应 DPI
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from scripts.benchmarks.synthetic_pdf import generate_pdf
+from scripts.pdf_translator.config import PDF_DPI
+from scripts.pdf_translator.image_encoding import ImageEncoding
+from scripts.pdf_translator.rasterizer import render_pages
+
+DEFAULT_ENCODINGS = ["png", "jpeg,quality=85", "jpeg,quality=75,gray", "webp,quality=85", "webp,quality=80,max_edge=2048"]
+
+
+def measure(pdf_path: str, dpi: int, spec: str, adaptive: bool) -> dict:
+    encoding = ImageEncoding.parse(spec)
+    started = time.perf_counter()
+    sizes = [len(r["data"]) for r in render_pages(pdf_path, dpi, encoding=encoding, adaptive=adaptive)]
+    return {
+        "encoding": repr(encoding),
+        "pages": len(sizes),
+        "bytes": sum(sizes),
+        "max_page_bytes": max(sizes, default=0),
+        "seconds": time.perf_counter() - started
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比不同编码设置下的页面图片大小")
+    parser.add_argument("pdf_path", nargs="?", help="输入 PDF（省略时生成合成文档）")
+    parser.add_argument("--pages", type=int, default=6, help="合成文档页数 (默认: 6)")
+    parser.add_argument("--dpi", type=int, default=PDF_DPI, help=f"渲染 DPI (默认: {PDF_DPI})")
+    parser.add_argument("--adaptive", action="store_true", help="按页自适应 DPI（--dpi 作为没有文字层时的取值）")
+    parser.add_argument("--encodings", nargs="+", default=DEFAULT_ENCODINGS, help="编码设置列表，第一项作为对比基准")
+    args = parser.parse_args()
+
+    pdf_path = args.pdf_path
+    if pdf_path is None:
+        workdir = Path(tempfile.mkdtemp(prefix="pdf_payload_"))
+        pdf_path = generate_pdf(str(workdir / "payload.pdf"), pages=args.pages)
+
+    results = [measure(pdf_path, args.dpi, spec, args.adaptive) for spec in args.encodings]
+    baseline = results[0]["bytes"] or 1
+    print(f"📄 {Path(pdf_path).name} @ {'自适应' if args.adaptive else args.dpi} DPI")
+    for r in results:
+        per_page = r["bytes"] / max(1, r["pages"]) / 1024
+        print(
+            f"   {r['encoding']:<32} {r['bytes'] / 1024:>9.0f} KB  每页 {per_page:>7.0f} KB  "
+            f"x{r['bytes'] / baseline:.2f}  {r['seconds']:.2f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+合成中文技术文档 PDF
+按页数、文本密度、表格数、嵌入图片数和 CMYK 矢量图形数生成确定性的测试文档，
+内容结构接近真实的传感器说明书（标题、参数表、说明段落、警告、接线图）
+"""
+import random
+from pathlib import Path
+
+import fitz  # PyMuPDF
+
+
+# PyMuPDF 内置的简体中文字体
+CJK_FONT = "china-s"
+
+_TERMS = (
+    "电源电压", "输出方式", "检测距离", "响应时间", "工作温度", "防护等级", "外壳材料",
+    "光源", "指示灯", "连接方式", "消耗电流", "抗干扰", "光轴间距", "保护高度", "线缆长度",
+    "继电器输出", "接线说明", "安装支架", "对射型", "反射型", "调节旋钮", "动作模式",
+)
+_VALUES = (
+    "DC 24V ±10%", "NPN/PNP", "0.1~5m", "≤15ms", "-10~55℃", "IP65", "铝合金",
+    "红外 850nm", "红/绿 LED", "M12 接插件", "≤80mA", "20mm", "2m", "常开/常闭",
+)
+_SENTENCES = (
+    "本产品适用于工业自动化生产线的安全防护与物体检测。",
+    "安装前请确认电源电压符合规格要求，并切断设备电源。",
+    "发射器与接收器应安装在同一水平面上，且光轴相互对准。",
+    "请勿在强光直射或粉尘较多的环境中长期使用本产品。",
+    "当指示灯闪烁时，表示光轴未对准或镜面受到污染。",
+    "输出信号可直接连接 PLC 输入端，无需额外的转换模块。",
+    "警告：请勿在通电状态下拆卸或接线，以免损坏设备。",
+    "定期清洁镜面可保证检测距离与响应速度的稳定性。",
+)
+
+# 接近品牌深蓝色的 CMYK 值，配合颜色替换工具的默认源颜色
+SOURCE_CMYK = (0.7804, 0.8667, 0.0, 0.0)
+
+
+def _add_cmyk_content(doc: fitz.Document, page: fitz.Page, rng: random.Random, count: int):
+    """
+    追加一个使用 /CSn cs ... scn 指令的内容流
+    设计软件导出的 PDF 通常以命名色彩空间设置 CMYK 颜色，颜色替换工具按此格式匹配
+    """
+    kind, value = doc.xref_get_key(page.xref, "Resources")
+    if kind == "xref":
+        doc.xref_set_key(int(value.split()[0]), "ColorSpace/CS0", "/DeviceCMYK")
+    else:
+        doc.xref_set_key(page.xref, "Resources/ColorSpace/CS0", "/DeviceCMYK")
+    ops = ["q"]
+    width, height = page.rect.width, page.rect.height
+    for _ in range(count):
+        c, m, y, k = SOURCE_CMYK if rng.random() < 0.6 else (
+            round(rng.random(), 4), round(rng.random(), 4), round(rng.random(), 4), 0.0
+        )
+        x = rng.uniform(20, width - 120)
+        # PDF 内容流坐标原点在左下角
+        y0 = rng.uniform(20, height - 60)
+        w, h = rng.uniform(20, 100), rng.uniform(5, 40)
+        if rng.random() < 0.5:
+            ops.append(f"/CS0 cs {c} {m} {y} {k} scn {x:.2f} {y0:.2f} {w:.2f} {h:.2f} re f")
+        else:
+            ops.append(
+                f"/CS0 CS {c} {m} {y} {k} SCN 1.5 w "
+                f"{x:.2f} {y0:.2f} m {x + w:.2f} {y0 + h:.2f} l S"
+            )
+    ops.append("Q")
+
+    xref = doc.get_new_xref()
+    doc.update_object(xref, "<<>>")
+    doc.update_stream(xref, "\n".join(ops).encode("latin-1"))
+    contents = page.get_contents() + [xref]
+    doc.xref_set_key(page.xref, "Contents", "[" + " ".join(f"{x} 0 R" for x in contents) + "]")
+
+
+def _add_table(page: fitz.Page, rng: random.Random, top: float) -> float:
+    """绘制参数表，返回表格底部的 y 坐标"""
+    rows = rng.randint(4, 8)
+    row_height = 18
+    left, middle, right = 50, 220, page.rect.width - 50
+    for i in range(rows + 1):
+        y = top + i * row_height
+        page.draw_line((left, y), (right, y), color=(0.5, 0.5, 0.5), width=0.5)
+    for x in (left, middle, right):
+        page.draw_line((x, top), (x, top + rows * row_height), color=(0.5, 0.5, 0.5), width=0.5)
+    for i in range(rows):
+        y = top + i * row_height + 13
+        page.insert_text((left + 4, y), rng.choice(_TERMS), fontname=CJK_FONT, fontsize=9)
+        page.insert_text((middle + 4, y), rng.choice(_VALUES), fontname=CJK_FONT, fontsize=9)
+    return top + rows * row_height + 12
+
+
+def _add_image(page: fitz.Page, rng: random.Random, rect: fitz.Rect):
+    """插入一张色块拼成的 RGB 图片（尺寸足够通过嵌入图片提取的过滤条件）"""
+    size = rng.choice((160, 240, 320))
+    pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, size, size), False)
+    step = size // 8
+    for gx in range(8):
+        for gy in range(8):
+            color = (rng.randrange(256), rng.randrange(256), rng.randrange(256))
+            pix.set_rect(fitz.IRect(gx * step, gy * step, (gx + 1) * step, (gy + 1) * step), color)
+    page.insert_image(rect, pixmap=pix)
+
+
+def generate_pdf(
+    output_path: str,
+    pages: int = 4,
+    text_blocks: int = 30,
+    tables: int = 1,
+    images: int = 1,
+    cmyk_shapes: int = 20,
+    seed: int = 0
+) -> str:
+    """
+    生成合成 PDF
+
+    Args:
+        output_path: 输出路径
+        pages: 页数
+        text_blocks: 每页文本行数（标签、数值、段落混合）
+        tables: 每页参数表数量
+        images: 每页嵌入图片数量
+        cmyk_shapes: 每页 CMYK 矢量图形数量
+        seed: 随机种子，相同参数和种子生成相同内容
+    """
+    rng = random.Random(seed)
+    doc = fitz.open()
+
+    for page_num in range(pages):
+        page = doc.new_page(width=595, height=842)  # A4
+        page.insert_text((50, 60), f"光电传感器 产品说明书 第{page_num + 1}页", fontname=CJK_FONT, fontsize=16)
+        y = 90
+
+        for _ in range(tables):
+            if y > 650:
+                break
+            y = _add_table(page, rng, y)
+
+        for i in range(images):
+            x0 = 50 + (i % 3) * 170
+            rect = fitz.Rect(x0, y, x0 + 150, y + 100)
+            _add_image(page, rng, rect)
+            if i % 3 == 2 or i == images - 1:
+                y += 110
+
+        # 剩余空间按行排布文本，行数超出页面时缩小行距
+        line_height = max(8.0, min(16.0, (800 - y) / max(text_blocks, 1)))
+        fontsize = min(10.0, line_height * 0.75)
+        for i in range(text_blocks):
+            kind = rng.random()
+            if kind < 0.4:
+                text = f"{rng.choice(_TERMS)}：{rng.choice(_VALUES)}"
+            elif kind < 0.6:
+                text = rng.choice(_TERMS)
+            else:
+                text = rng.choice(_SENTENCES)
+            page.insert_text((50, y + i * line_height + fontsize), text, fontname=CJK_FONT, fontsize=fontsize)
+
+        # 每次绘制都会新增一个内容流，合并成一个以接近真实文档
+        page.clean_contents()
+        if cmyk_shapes:
+            _add_cmyk_content(doc, page, rng, cmyk_shapes)
+
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    doc.save(str(output_path), garbage=3, deflate=True)
+    doc.close()
+    return str(output_path)
@@ -2,51 +2,646 @@
 AI 处理器
 使用 OpenRouter API 调用 Gemini 进行文档分析和翻译
 """
+import asyncio
 import json
+import threading
+import time
 import httpx
-from typing import Optional
-from .config import OPENROUTER_API_KEY, OPENROUTER_BASE_URL, DEFAULT_MODEL
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Iterable, Optional
+from .config import (
+    OPENROUTER_API_KEY, OPENROUTER_BASE_URL, DEFAULT_MODEL,
+    AI_CONCURRENCY, AI_MAX_CONCURRENCY, AI_MAX_RETRIES, HTTP_TIMEOUT
+)
+from .cancellation import CancelToken, Cancelled, check
+from .image_encoding import record_payload
+from .http_client import get_http_client, create_async_http_client
+from .rate_limiter import get_rate_governor, parse_retry_after
+from .hedging import get_hedge_policy
+from .model_router import ModelRouter, get_model_router
+
+
+# 估算 TPM 时每张图片按固定 token 数计
+IMAGE_TOKEN_ESTIMATE = 1000
+
+# 同步对冲请求使用的线程池
+# 主请求和副本共用，按限流器的并发上限的两倍分配线程，主请求占满上限时副本也不必排队
+_hedge_executor = ThreadPoolExecutor(max_workers=max(1, AI_MAX_CONCURRENCY) * 2, thread_name_prefix="ai-hedge")
 
 
 class AIProcessor:
-    def __init__(self, api_key: str = None, model: str = None):
+    def __init__(self, api_key: str = None, model: str = None, cancel_token: Optional[CancelToken] = None):
         self.api_key = api_key or OPENROUTER_API_KEY
         self.model = model or DEFAULT_MODEL
         self.base_url = OPENROUTER_BASE_URL
+        self.governor = get_rate_governor()
+        self.hedge = get_hedge_policy()
+        # 取消后不再发起新请求，在途请求被中止；请求超时不超过剩余时间
+        self.cancel_token = cancel_token
         
         if not self.api_key:
             raise ValueError("请设置 OPENROUTER_API_KEY 环境变量")
     
-    def _call_api(self, messages: list, max_tokens: int = 8192) -> str:
-        """调用 OpenRouter API"""
-        headers = {
+    def _build_headers(self) -> dict:
+        return {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
             "HTTP-Referer": "https://github.com/pdf-translator",
             "X-Title": "PDF Translator"
         }
-        
+    
+    def _build_payload(
+        self,
+        messages: list,
+        max_tokens: int,
+        stream: bool = False,
+        temperature: float = 0.3,
+        model: str = None
+    ) -> dict:
         payload = {
-            "model": self.model,
+            "model": model or self.model,
             "messages": messages,
             "max_tokens": max_tokens,
-            "temperature": 0.3
+            "temperature": temperature
         }
+        if stream:
+            payload["stream"] = True
+        return payload
+    
+    @staticmethod
+    def _parse_completion(result: dict) -> dict:
+        """提取响应内容、结束原因和用量"""
+        choice = result["choices"][0]
+        return {
+            "content": choice["message"]["content"] or "",
+            "finish_reason": choice.get("finish_reason"),
+            "usage": result.get("usage") or {}
+        }
+    
+    @staticmethod
+    def _estimate_request_tokens(messages: list, max_tokens: int) -> int:
+        """粗略估算一次请求消耗的 token 数（用于 TPM 限流）"""
+        chars = 0
+        images = 0
+        for message in messages:
+            content = message.get("content")
+            if isinstance(content, str):
+                chars += len(content)
+                continue
+            for part in content or []:
+                if part.get("type") == "text":
+                    chars += len(part.get("text", ""))
+                else:
+                    images += 1
+        return chars // 2 + images * IMAGE_TOKEN_ESTIMATE + max_tokens // 4
+    
+    @staticmethod
+    def _classify_failure(error: Exception) -> tuple[str, Optional[float]]:
+        """把异常归类为限流器认识的失败类型"""
+        if isinstance(error, httpx.HTTPStatusError):
+            status = error.response.status_code
+            retry_after = parse_retry_after(error.response.headers.get("Retry-After"))
+            if status == 429:
+                return "throttled", retry_after
+            if status >= 500:
+                return "server_error", retry_after
+            return "other", None
+        if isinstance(error, httpx.TimeoutException):
+            return "timeout", None
+        if isinstance(error, httpx.TransportError):
+            return "server_error", None
+        return "other", None
+    
+    @staticmethod
+    def _capability(messages: list) -> str:
+        """含图片的请求需要视觉模型"""
+        for message in messages:
+            content = message.get("content")
+            if isinstance(content, list) and any(p.get("type") == "image_url" for p in content):
+                return "vision"
+        return "text"
+    
+    def _route(self, messages: list, model: str = None) -> tuple[ModelRouter, list[str]]:
+        """
+        选出该请求所属的模型池及候选顺序
+        单次调用指定的模型优先，其次是构造时指定的模型
+        """
+        router = get_model_router(self._capability(messages))
+        return router, router.candidates(model or self.model)
+    
+    def _retry_delay(
+        self,
+        error: Exception,
+        attempt: int,
+        router: ModelRouter,
+        model: str,
+        candidates: list[str],
+        failed: set
+    ) -> float:
+        """
+        请求失败后返回重试前的等待秒数，不可重试时重新抛出异常
+        可以切换到其他健康模型时立即重试，不再退避
+        """
+        kind, retry_after = self._classify_failure(error)
+        delay = self.governor.on_failure(kind, attempt, retry_after)
+        if kind != "other":
+            router.record_failure(model)
+            failed.add(model)
+        if kind == "other" or attempt >= AI_MAX_RETRIES:
+            raise error
+        
+        next_model = router.choose(candidates, exclude=failed)
+        if next_model != model:
+            print(f"   ⚠️ 模型 {model} 请求失败 ({kind})，切换到 {next_model} ({attempt + 1}/{AI_MAX_RETRIES})")
+            return 0.0 if kind != "throttled" else delay
+        print(f"   ⚠️ API 请求失败 ({kind})，{delay:.1f}s 后重试 ({attempt + 1}/{AI_MAX_RETRIES})")
+        return delay
+    
+    def _timeout(self) -> float:
+        token = self.cancel_token
+        return token.timeout(HTTP_TIMEOUT) if token else HTTP_TIMEOUT
+    
+    def _sleep(self, seconds: float):
+        """重试前等待，取消时立即结束"""
+        if self.cancel_token:
+            self.cancel_token.wait(seconds)
+        else:
+            time.sleep(seconds)
+    
+    def _send(
+        self,
+        payload: dict,
+        on_text: Optional[Callable[[str], None]] = None,
+        abort: Optional[CancelToken] = None
+    ) -> dict:
+        """
+        发送一次请求（不含重试）
+        abort 为单个请求的中止令牌（对冲中落后的一份由它中止），被中止时抛出 _HedgeLost
+        """
+        try:
+            return self._send_once(payload, on_text, abort)
+        except Exception as e:
+            # 取消或超过截止时间导致的连接中断、超时统一报告为 Cancelled
+            check(self.cancel_token)
+            if abort is not None and abort.cancelled and not isinstance(e, _HedgeLost):
+                raise _HedgeLost() from e
+            raise
+    
+    def _send_once(
+        self,
+        payload: dict,
+        on_text: Optional[Callable[[str], None]] = None,
+        abort: Optional[CancelToken] = None
+    ) -> dict:
+        if abort is not None and abort.cancelled:
+            raise _HedgeLost()
+        # 复用进程级连接池，整个文档只需一次握手
+        client = get_http_client(self.base_url)
+        url = f"{self.base_url}/chat/completions"
+        token = self.cancel_token
         
-        with httpx.Client(timeout=120.0) as client:
-            response = client.post(
-                f"{self.base_url}/chat/completions",
-                headers=headers,
-                json=payload
+        # 非流式请求也按流方式发送，以便中途关闭响应、中止仍在生成的请求
+        reader = _StreamReader(on_text)
+        with client.stream(
+            "POST", url, headers=self._build_headers(), json=payload, timeout=self._timeout()
+        ) as response:
+            # 取消或对冲落败时从其他线程关闭响应，正在读取的请求随即中断
+            unregisters = [t.on_cancel(response.close) for t in (token, abort) if t is not None]
+            try:
+                response.raise_for_status()
+                if not payload.get("stream"):
+                    return self._parse_completion(json.loads(response.read()))
+                try:
+                    for line in response.iter_lines():
+                        check(token)
+                        if reader.feed_line(line):
+                            break
+                except httpx.TransportError:
+                    # 已经收到部分内容时不再整体重试，交给调用方按截断处理
+                    if not reader.parts or (abort is not None and abort.cancelled):
+                        raise
+                    check(token)
+                    reader.finish_reason = "interrupted"
+            finally:
+                for unregister in unregisters:
+                    unregister()
+        return reader.result()
+    
+    async def _asend(
+        self,
+        client: httpx.AsyncClient,
+        payload: dict,
+        on_text: Optional[Callable[[str], None]] = None
+    ) -> dict:
+        """
+        发送一次请求（不含重试，异步版本）
+        取消时所在的任务被 cancel，连接随之中止（见 _await_cancellable）
+        """
+        url = f"{self.base_url}/chat/completions"
+        token = self.cancel_token
+        
+        try:
+            if not payload.get("stream"):
+                response = await client.post(
+                    url, headers=self._build_headers(), json=payload, timeout=self._timeout()
+                )
+                response.raise_for_status()
+                return self._parse_completion(response.json())
+            
+            reader = _StreamReader(on_text)
+            async with client.stream(
+                "POST", url, headers=self._build_headers(), json=payload, timeout=self._timeout()
+            ) as response:
+                response.raise_for_status()
+                try:
+                    async for line in response.aiter_lines():
+                        check(token)
+                        if reader.feed_line(line):
+                            break
+                except httpx.TransportError:
+                    if not reader.parts:
+                        raise
+                    check(token)
+                    reader.finish_reason = "interrupted"
+            return reader.result()
+        except Exception:
+            check(token)
+            raise
+    
+    async def _await_cancellable(self, awaitable):
+        """
+        等待 awaitable 完成，令牌被取消或到达截止时间时取消它（中止其中所有在途请求）
+        并抛出 Cancelled
+        """
+        token = self.cancel_token
+        if token is None:
+            return await awaitable
+        
+        loop = asyncio.get_running_loop()
+        future = asyncio.ensure_future(awaitable)
+        unregister = token.on_cancel(lambda: loop.call_soon_threadsafe(future.cancel))
+        try:
+            return await asyncio.wait_for(future, timeout=token.remaining())
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            token.raise_if_cancelled()
+            raise
+        finally:
+            unregister()
+    
+    @staticmethod
+    def _hedge_key(payload: dict) -> str:
+        """对冲延迟统计的分类键"""
+        mode = "stream" if payload.get("stream") else "full"
+        return f"{payload['model']}:{payload['max_tokens']}:{mode}"
+    
+    def _record_hedge_latency(self, payload: dict, started: float, gate: "_HedgeGate"):
+        # 流式请求以首个文本片段到达的时间作为延迟，普通请求以完整响应时间为准
+        if payload.get("stream") and gate.first_delta_at is not None:
+            elapsed = gate.first_delta_at - started
+        else:
+            elapsed = time.monotonic() - started
+        self.hedge.record_latency(self._hedge_key(payload), elapsed)
+    
+    @staticmethod
+    def _loser_tokens(result: Optional[dict], estimated: int) -> int:
+        """被放弃的请求消耗的 token（取消的请求没有用量数据，按估算值计）"""
+        if result and result.get("usage", {}).get("total_tokens"):
+            return result["usage"]["total_tokens"]
+        return estimated
+    
+    def _hedged_send(
+        self,
+        payload: dict,
+        on_text: Optional[Callable[[str], None]],
+        estimated: int
+    ) -> dict:
+        """
+        发送请求，必要时对冲
+        超过近期延迟分位数仍未返回（流式请求：仍未收到首个片段）时，
+        在限流器还有余量的前提下再发一份副本，采用先成功的结果，
+        落后的一份通过其中止令牌关闭连接
+        """
+        gate = _HedgeGate(on_text)
+        started = time.monotonic()
+        threshold = self.hedge.threshold(self._hedge_key(payload))
+        
+        if threshold is None:
+            result = self._send(payload, gate.callback(0))
+            self._record_hedge_latency(payload, started, gate)
+            self.hedge.record_request(hedged=False)
+            return result
+        
+        primary_abort = CancelToken()
+        primary = _hedge_executor.submit(self._send, payload, gate.callback(0), primary_abort)
+        done, _ = wait([primary], timeout=threshold)
+        if done or gate.owner is not None or not self.governor.try_acquire(estimated):
+            result = primary.result()
+            self._record_hedge_latency(payload, started, gate)
+            self.hedge.record_request(hedged=False)
+            return result
+        
+        hedge_abort = CancelToken()
+        hedge = _hedge_executor.submit(self._send, payload, gate.callback(1), hedge_abort)
+        futures = {primary: 0, hedge: 1}
+        aborts = {primary: primary_abort, hedge: hedge_abort}
+        pending = set(futures)
+        winner = None
+        while pending and winner is None:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None and gate.owner in (None, futures[future]):
+                    winner = future
+                    break
+        if winner is None:
+            # 两份都失败，归还副本占用的限流槽位，抛出真正的请求异常交给重试逻辑
+            self.governor.release()
+            raise _first_real_error(primary.exception(), hedge.exception())
+        
+        loser = hedge if winner is primary else primary
+        gate.close(futures[winner])
+        # 中止落后的一份：已收到响应头的立即关闭连接，仍在等待响应头的在响应头到达时关闭。
+        # 它真正结束后才归还副本占用的限流槽位，在途请求数不会超过限流器允许的并发
+        # （胜者的槽位由 _complete 归还）
+        aborts[loser].cancel("对冲请求落后")
+        
+        def finish_loser(f):
+            self.governor.release()
+            self.hedge.record_request(
+                hedged=True,
+                hedge_won=winner is hedge,
+                overhead_tokens=self._loser_tokens(f.result() if not f.exception() else None, estimated)
             )
-            response.raise_for_status()
-            result = response.json()
-            return result["choices"][0]["message"]["content"]
+        
+        loser.add_done_callback(finish_loser)
+        self._record_hedge_latency(payload, started, gate)
+        return winner.result()
     
-    def analyze_pdf_pages(self, page_images: list[dict]) -> dict:
+    async def _ahedged_send(
+        self,
+        client: httpx.AsyncClient,
+        payload: dict,
+        on_text: Optional[Callable[[str], None]],
+        estimated: int
+    ) -> dict:
+        """发送请求，必要时对冲（异步版本，落后的请求会被真正取消）"""
+        gate = _HedgeGate(on_text)
+        started = time.monotonic()
+        threshold = self.hedge.threshold(self._hedge_key(payload))
+        
+        if threshold is None:
+            result = await self._asend(client, payload, gate.callback(0))
+            self._record_hedge_latency(payload, started, gate)
+            self.hedge.record_request(hedged=False)
+            return result
+        
+        primary = asyncio.create_task(self._asend(client, payload, gate.callback(0)))
+        done, _ = await asyncio.wait({primary}, timeout=threshold)
+        if done or gate.owner is not None or not self.governor.try_acquire(estimated):
+            result = await primary
+            self._record_hedge_latency(payload, started, gate)
+            self.hedge.record_request(hedged=False)
+            return result
+        
+        hedge = asyncio.create_task(self._asend(client, payload, gate.callback(1)))
+        tasks = {primary: 0, hedge: 1}
+        try:
+            pending = set(tasks)
+            winner = None
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None and gate.owner in (None, tasks[task]):
+                        winner = task
+                        break
+            if winner is None:
+                # 两份都失败，抛出真正的请求异常交给重试逻辑
+                raise _first_real_error(primary.exception(), hedge.exception())
+            
+            loser = hedge if winner is primary else primary
+            loser_result = None
+            if loser.done() and not loser.exception():
+                loser_result = loser.result()
+            self.hedge.record_request(
+                hedged=True,
+                hedge_won=winner is hedge,
+                overhead_tokens=self._loser_tokens(loser_result, estimated)
+            )
+            self._record_hedge_latency(payload, started, gate)
+            return winner.result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            self.governor.release()
+    
+    def _complete(
+        self,
+        messages: list,
+        max_tokens: int = 8192,
+        stream: bool = False,
+        on_text: Optional[Callable[[str], None]] = None,
+        temperature: float = 0.3,
+        model: str = None
+    ) -> dict:
+        """
+        调用 OpenRouter API，返回完整结果
+        {"content": ..., "finish_reason": ..., "usage": {...}, "model": ..., "latency": ...}
+        model 为本次调用的首选模型（默认为构造时指定的模型）
+        stream=True 时使用 SSE 流式响应，每收到一段文本就调用 on_text(delta)
+        所有请求经过共享限流器，429/5xx/超时按退避策略自动重试，
+        并在模型池内切换到最快的健康模型
+        """
+        router, candidates = self._route(messages, model)
+        estimated = self._estimate_request_tokens(messages, max_tokens)
+        failed = set()
+        attempt = 0
+        
+        while True:
+            check(self.cancel_token)
+            chosen = router.choose(candidates, exclude=failed)
+            payload = self._build_payload(
+                messages, max_tokens, stream=stream, temperature=temperature, model=chosen
+            )
+            self.governor.acquire(estimated)
+            started = time.monotonic()
+            try:
+                result = self._hedged_send(payload, on_text, estimated)
+            except (httpx.HTTPStatusError, httpx.TransportError) as e:
+                self._sleep(self._retry_delay(e, attempt, router, chosen, candidates, failed))
+                attempt += 1
+                continue
+            except BaseException:
+                self.governor.release()
+                raise
+            latency = time.monotonic() - started
+            router.record_success(chosen, latency)
+            self.governor.on_success(estimated, result["usage"].get("total_tokens"))
+            result["model"] = chosen
+            result["latency"] = latency
+            return result
+    
+    def _call_api(self, messages: list, max_tokens: int = 8192) -> str:
+        """调用 OpenRouter API"""
+        return self._complete(messages, max_tokens)["content"]
+    
+    async def _acomplete(
+        self,
+        messages: list,
+        max_tokens: int = 8192,
+        client: httpx.AsyncClient = None,
+        stream: bool = False,
+        on_text: Optional[Callable[[str], None]] = None,
+        temperature: float = 0.3,
+        model: str = None
+    ) -> dict:
+        """调用 OpenRouter API，返回完整结果（异步版本）"""
+        if client is None:
+            async with create_async_http_client() as own_client:
+                return await self._acomplete(
+                    messages, max_tokens, client=own_client,
+                    stream=stream, on_text=on_text, temperature=temperature, model=model
+                )
+        
+        router, candidates = self._route(messages, model)
+        estimated = self._estimate_request_tokens(messages, max_tokens)
+        failed = set()
+        attempt = 0
+        
+        while True:
+            check(self.cancel_token)
+            chosen = router.choose(candidates, exclude=failed)
+            payload = self._build_payload(
+                messages, max_tokens, stream=stream, temperature=temperature, model=chosen
+            )
+            await self.governor.aacquire(estimated)
+            started = time.monotonic()
+            try:
+                result = await self._ahedged_send(client, payload, on_text, estimated)
+            except (httpx.HTTPStatusError, httpx.TransportError) as e:
+                await asyncio.sleep(self._retry_delay(e, attempt, router, chosen, candidates, failed))
+                attempt += 1
+                continue
+            except BaseException:
+                self.governor.release()
+                raise
+            latency = time.monotonic() - started
+            router.record_success(chosen, latency)
+            self.governor.on_success(estimated, result["usage"].get("total_tokens"))
+            result["model"] = chosen
+            result["latency"] = latency
+            return result
+    
+    async def _acall_api(
+        self,
+        messages: list,
+        max_tokens: int = 8192,
+        client: httpx.AsyncClient = None
+    ) -> str:
+        """调用 OpenRouter API（异步版本）"""
+        result = await self._acomplete(messages, max_tokens, client=client)
+        return result["content"]
+    
+    async def _acomplete_many(
+        self,
+        messages_list: list[list],
+        max_tokens: int = 8192,
+        concurrency: int = None,
+        on_result: Optional[Callable[[int, dict], None]] = None,
+        stream: bool = False,
+        on_text: Optional[Callable[[int, str], None]] = None,
+        models: Optional[list[str]] = None,
+        return_exceptions: bool = False
+    ) -> list:
+        """
+        并发调用多个请求，同时在途的请求数不超过 concurrency
+        models 可为每个请求单独指定首选模型
+        return_exceptions=False 时任一请求失败即中止其余请求并抛出异常；
+        为 True 时失败请求的位置返回异常对象，其余请求照常完成（取消仍然抛出）
+        """
+        semaphore = asyncio.Semaphore(max(1, concurrency or AI_CONCURRENCY))
+        
+        async with create_async_http_client() as client:
+            async def run(index: int, messages: list):
+                text_callback = None
+                if on_text:
+                    text_callback = lambda delta: on_text(index, delta)
+                async with semaphore:
+                    try:
+                        result = await self._acomplete(
+                            messages, max_tokens, client=client,
+                            stream=stream, on_text=text_callback,
+                            model=models[index] if models else None
+                        )
+                    except Cancelled:
+                        raise
+                    except Exception as e:
+                        if not return_exceptions:
+                            raise
+                        return e
+                if on_result:
+                    on_result(index, result)
+                return result
+            
+            tasks = [asyncio.ensure_future(run(i, messages)) for i, messages in enumerate(messages_list)]
+            try:
+                return await self._await_cancellable(asyncio.gather(*tasks))
+            finally:
+                # 出错时中止其余在途请求，不让它们在后台继续占用配额
+                pending = [task for task in tasks if not task.done()]
+                for task in pending:
+                    task.cancel()
+                if pending:
+                    await asyncio.wait(pending)
+    
+    def complete_many(
+        self,
+        messages_list: list[list],
+        max_tokens: int = 8192,
+        concurrency: int = None,
+        on_result: Optional[Callable[[int, dict], None]] = None,
+        stream: bool = False,
+        on_text: Optional[Callable[[int, str], None]] = None,
+        models: Optional[list[str]] = None,
+        return_exceptions: bool = False
+    ) -> list:
+        """
+        同步入口：并发执行多个请求，按输入顺序返回完整结果
+        on_result(index, result) 在每个请求完成时回调（完成顺序，失败的请求不回调）
+        stream=True 时 on_text(index, delta) 在收到每段流式文本时回调
+        models 可为每个请求单独指定首选模型
+        return_exceptions=True 时重试耗尽的请求在结果中以异常对象表示，不影响其他请求
+        """
+        if not messages_list:
+            return []
+        return asyncio.run(
+            self._acomplete_many(
+                messages_list, max_tokens, concurrency, on_result,
+                stream=stream, on_text=on_text, models=models,
+                return_exceptions=return_exceptions
+            )
+        )
+    
+    def call_api_many(
+        self,
+        messages_list: list[list],
+        max_tokens: int = 8192,
+        concurrency: int = None,
+        on_result: Optional[Callable[[int, str], None]] = None
+    ) -> list[str]:
+        """
+        同步入口：并发执行多个请求，按输入顺序返回文本内容
+        on_result(index, content) 在每个请求完成时回调（完成顺序）
+        """
+        callback = None
+        if on_result:
+            callback = lambda index, result: on_result(index, result["content"])
+        results = self.complete_many(messages_list, max_tokens, concurrency, callback)
+        return [r["content"] for r in results]
+    
+    def analyze_pdf_pages(self, page_images: Iterable) -> dict:
         """
         分析 PDF 页面内容，提取结构化信息
-        输入: 页面图片列表 (base64)
+        输入: 页面图片（pdf_extractor.PageImageSource，逐页渲染，base64 按需生成）
         输出: 结构化的文档内容
         """
         # 构建多模态消息
@@ -92,13 +687,16 @@ class AIProcessor:
         ]
         
         # 添加所有页面图片
+        image_sizes = []
         for page in page_images:
             content.append({
                 "type": "image_url",
                 "image_url": {
-                    "url": f"data:image/png;base64,{page['image_base64']}"
+                    "url": page.data_url
                 }
             })
+            image_sizes.append(page.size)
+        record_payload("analyze", image_sizes)
         
         messages = [{"role": "user", "content": content}]
         
@@ -252,3 +850,97 @@ class AIProcessor:
             return json.loads(json_str.strip())
         except json.JSONDecodeError:
             return {"raw_response": response}
+
+
+class _HedgeLost(Exception):
+    """对冲中落后的流式请求，收到片段时被中止"""
+
+
+def _first_real_error(*errors: Optional[BaseException]) -> BaseException:
+    """从对冲的两份请求中挑出真正的失败原因（忽略被闸门中止的那一份）"""
+    real = [e for e in errors if e is not None and not isinstance(e, _HedgeLost)]
+    return real[0] if real else errors[0]
+
+
+class _HedgeGate:
+    """
+    对冲请求的输出闸门
+    第一个产出文本的请求独占 on_text 回调，另一份请求再产出文本时直接中止
+    """
+    
+    def __init__(self, on_text: Optional[Callable[[str], None]] = None):
+        self.on_text = on_text
+        self.owner = None
+        self.first_delta_at = None
+        self._lock = threading.Lock()
+    
+    def callback(self, index: int) -> Callable[[str], None]:
+        def forward(delta: str):
+            with self._lock:
+                if self.owner is None:
+                    self.owner = index
+                    self.first_delta_at = time.monotonic()
+            if self.owner != index:
+                raise _HedgeLost()
+            if self.on_text:
+                self.on_text(delta)
+        return forward
+    
+    def close(self, winner: int):
+        """确定胜者，之后另一份请求的输出全部丢弃"""
+        with self._lock:
+            if self.owner is None:
+                self.owner = winner
+
+
+class _StreamReader:
+    """
+    OpenRouter SSE 流解析
+    逐行读取 data: {...}，拼接 delta 文本并记录结束原因和用量
+    """
+    
+    def __init__(self, on_text: Optional[Callable[[str], None]] = None):
+        self.on_text = on_text
+        self.parts = []
+        self.finish_reason = None
+        self.usage = {}
+    
+    def feed_line(self, line: str) -> bool:
+        """处理一行 SSE，收到 [DONE] 时返回 True"""
+        line = line.strip()
+        # 空行是事件分隔符，冒号开头的是注释（OpenRouter 用它保活）
+        if not line or line.startswith(":") or not line.startswith("data:"):
+            return False
+        
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            return True
+        
+        try:
+            event = json.loads(data)
+        except json.JSONDecodeError:
+            return False
+        
+        if "error" in event:
+            raise RuntimeError(f"流式响应错误: {event['error']}")
+        
+        if event.get("usage"):
+            self.usage = event["usage"]
+        
+        for choice in event.get("choices", []):
+            delta = (choice.get("delta") or {}).get("content")
+            if delta:
+                self.parts.append(delta)
+                if self.on_text:
+                    self.on_text(delta)
+            if choice.get("finish_reason"):
+                self.finish_reason = choice["finish_reason"]
+        
+        return False
+    
+    def result(self) -> dict:
+        return {
+            "content": "".join(self.parts),
+            "finish_reason": self.finish_reason,
+            "usage": self.usage
+        }
@@ -0,0 +1,111 @@
+"""
+取消与截止时间
+CancelToken 由调用方创建并沿处理流程传递：提取、每次 API 调用、逐页循环和渲染
+都会检查它。调用 cancel() 或超过截止时间后，下一次检查抛出 Cancelled，
+在途的 HTTP 请求通过 on_cancel 回调中止。
+距截止时间不足 degrade_margin 秒时 should_degrade() 返回 True，
+调用方可以改用更低的 DPI 或更快的模型，尽量在时限内交付结果
+"""
+import threading
+import time
+from typing import Callable, Optional
+
+from .config import DEADLINE_DEGRADE_SECONDS
+
+
+class Cancelled(Exception):
+    """处理已被取消"""
+
+
+class DeadlineExceeded(Cancelled):
+    """超过截止时间"""
+
+
+class CancelToken:
+    """
+    取消令牌
+    deadline 为相对现在的秒数，None 表示不限时
+    """
+
+    def __init__(self, deadline: float = None, degrade_margin: float = DEADLINE_DEGRADE_SECONDS):
+        self.deadline_at = time.monotonic() + deadline if deadline else None
+        self.degrade_margin = degrade_margin
+        self.reason = None
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+
+    def cancel(self, reason: str = "已取消"):
+        """请求取消，并执行所有已登记的中止回调"""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"   警告: 取消回调失败: {e}")
+
+    def remaining(self) -> Optional[float]:
+        """距截止时间的秒数，不限时返回 None"""
+        if self.deadline_at is None:
+            return None
+        return self.deadline_at - time.monotonic()
+
+    @property
+    def cancelled(self) -> bool:
+        if self._event.is_set():
+            return True
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+    def should_degrade(self) -> bool:
+        """是否已接近截止时间，应降级处理"""
+        remaining = self.remaining()
+        return remaining is not None and remaining < self.degrade_margin
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise Cancelled(self.reason)
+        remaining = self.remaining()
+        if remaining is not None and remaining <= 0:
+            raise DeadlineExceeded("超过处理截止时间")
+
+    def timeout(self, default: float) -> float:
+        """单次阻塞操作的超时：不超过 default，也不超过剩余时间"""
+        remaining = self.remaining()
+        if remaining is None:
+            return default
+        return max(0.001, min(default, remaining))
+
+    def wait(self, seconds: float):
+        """可被取消打断的等待，等待结束后若已取消则抛出异常"""
+        if seconds > 0:
+            self._event.wait(self.timeout(seconds))
+        self.raise_if_cancelled()
+
+    def on_cancel(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """
+        登记取消时执行的回调（如关闭在途的连接），返回注销函数
+        已取消时立即执行
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._remove(callback)
+        callback()
+        return lambda: None
+
+    def _remove(self, callback: Callable[[], None]):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+
+def check(token: Optional[CancelToken]):
+    """token 可以为 None 的便捷检查"""
+    if token is not None:
+        token.raise_if_cancelled()
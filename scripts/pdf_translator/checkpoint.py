@@ -0,0 +1,119 @@
+"""
+断点续跑
+长任务把已完成的工作单元（每页的识别结果、每批的译文、各阶段的输出）
+写入工作目录，进程崩溃或任务重试后跳过已完成的部分，从第一个未完成的单元继续。
+工作目录中的 manifest.json 记录输入指纹（文件哈希、目标语言、模型等），
+指纹不一致时旧的检查点全部作废
+"""
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Optional
+
+from .config import CHECKPOINT_DIR
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Checkpoint:
+    """
+    一个工作目录中的检查点
+    resume=False 时忽略已有的检查点，从头开始
+    save/load 保存整体覆盖的值（原子替换写入），append/records 用于逐条追加的记录
+    （每条一行 JSON，写入后 fsync，崩溃时只可能丢失最后一条不完整的行）
+    """
+
+    def __init__(self, workspace: str, fingerprint: dict, resume: bool = True):
+        self.workspace = Path(workspace)
+        self.fingerprint = fingerprint
+        self.workspace.mkdir(parents=True, exist_ok=True)
+        manifest = self.load("manifest")
+        if not resume or manifest != fingerprint:
+            if resume and manifest is not None:
+                print("   检查点与当前输入不一致，重新开始")
+            self._reset()
+            self.save("manifest", fingerprint)
+        else:
+            self._truncate_partial_records()
+
+    @classmethod
+    def for_input(
+        cls,
+        input_path: str,
+        fingerprint: dict,
+        root: Path = CHECKPOINT_DIR,
+        resume: bool = True
+    ) -> "Checkpoint":
+        """按输入文件内容和参数确定工作目录，同一输入、同样参数的再次运行会找到同一目录"""
+        fingerprint = dict(fingerprint, input_sha256=file_sha256(input_path))
+        key = hashlib.sha256(json.dumps(fingerprint, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+        return cls(root / f"{Path(input_path).stem}_{key}", fingerprint, resume=resume)
+
+    def _path(self, name: str, suffix: str) -> Path:
+        return self.workspace / f"{name}{suffix}"
+
+    def _reset(self):
+        for path in self.workspace.iterdir():
+            if path.is_dir():
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                path.unlink(missing_ok=True)
+
+    def _truncate_partial_records(self):
+        """续跑前截掉崩溃时写了一半的最后一行，之后追加的记录才不会接在残行后面"""
+        for path in self.workspace.glob("*.jsonl"):
+            with open(path, "rb+") as f:
+                data = f.read()
+                end = data.rfind(b"\n") + 1
+                if end < len(data):
+                    f.truncate(end)
+
+    def save(self, name: str, value: Any):
+        path = self._path(name, ".json")
+        tmp_path = path.with_suffix(".json.part")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(value, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def load(self, name: str) -> Optional[Any]:
+        path = self._path(name, ".json")
+        if not path.exists():
+            return None
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except ValueError:
+            return None
+
+    def append(self, name: str, record: Any):
+        with open(self._path(name, ".jsonl"), "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def records(self, name: str) -> list:
+        path = self._path(name, ".jsonl")
+        if not path.exists():
+            return []
+        records = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # 崩溃时写了一半的行（续跑时已截掉，这里只是兜底）
+                    continue
+        return records
+
+    def clear(self):
+        """任务完成后删除工作目录"""
+        shutil.rmtree(self.workspace, ignore_errors=True)
@@ -13,6 +13,8 @@ sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
 from scripts.pdf_translator.pipeline import translate_pdf
 from scripts.pdf_translator.config import DEFAULT_MODEL
+from scripts.pdf_translator.cancellation import CancelToken, Cancelled
+from scripts.pdf_translator.checkpoint import Checkpoint
 
 
 def main():
@@ -32,6 +34,9 @@ def main():
   
   # 使用其他模型
   python -m scripts.pdf_translator.cli input.pdf --model google/gemini-2.0-flash-exp
+  
+  # 中断后继续，跳过已完成的分析和生成
+  python -m scripts.pdf_translator.cli input.pdf --resume
         """
     )
     
@@ -60,6 +65,19 @@ def main():
         help="输出格式 (默认: 全部)"
     )
     
+    parser.add_argument(
+        "--deadline",
+        type=float,
+        default=None,
+        help="处理时限（秒），接近时限时自动降级（降低 DPI、改用快速模型），超时则中止"
+    )
+    
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="从上次中断处继续（同一文件、同样参数时复用已保存的检查点）"
+    )
+    
     parser.add_argument(
         "--no-intermediate",
         action="store_true",
@@ -79,19 +97,33 @@ def main():
         print(f"❌ 错误: 文件不存在: {args.pdf_path}")
         sys.exit(1)
     
+    # 每次运行都写检查点，中断后可用 --resume 继续
+    checkpoint = Checkpoint.for_input(
+        args.pdf_path,
+        {"mode": "documents", "model": args.model},
+        resume=args.resume
+    )
+    
     try:
         results = translate_pdf(
             pdf_path=args.pdf_path,
             api_key=args.api_key,
             model=args.model,
-            output_formats=args.format
+            output_formats=args.format,
+            cancel_token=CancelToken(args.deadline) if args.deadline else None,
+            checkpoint=checkpoint
         )
+        checkpoint.clear()
         
         print("\n" + "=" * 50)
         print("📦 生成的文件:")
         for name, path in results.get("files", {}).items():
             print(f"   • {name}: {path}")
         
+    except Cancelled as e:
+        print(f"❌ 处理中止: {e}")
+        print("   可使用 --resume 从中断处继续")
+        sys.exit(1)
     except Exception as e:
         print(f"❌ 处理失败: {e}")
         import traceback
@@ -6,19 +6,108 @@ from pathlib import Path
 
 # OpenRouter API 配置
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY", "")
-OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1").rstrip("/")
 DEFAULT_MODEL = "google/gemini-2.5-flash"
 
+# HTTP 连接池配置（进程内共享，复用 TCP/TLS 连接）
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "120"))
+HTTP_MAX_CONNECTIONS_PER_HOST = int(os.getenv("HTTP_MAX_CONNECTIONS_PER_HOST", "16"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "8"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "90"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "1") == "1"
+
+# AI 并发配置（异步批量调用时同时在途的请求数）
+AI_CONCURRENCY = int(os.getenv("AI_CONCURRENCY", "4"))
+
+# AI 限流配置（进程内所有 AI 调用共享）
+AI_RPM_LIMIT = int(os.getenv("AI_RPM_LIMIT", "0"))  # 每分钟请求数上限，0 表示不限
+AI_TPM_LIMIT = int(os.getenv("AI_TPM_LIMIT", "0"))  # 每分钟 token 数上限，0 表示不限
+AI_MIN_CONCURRENCY = int(os.getenv("AI_MIN_CONCURRENCY", "1"))
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", "16"))
+AI_MAX_RETRIES = int(os.getenv("AI_MAX_RETRIES", "5"))  # 429/5xx/超时的重试次数
+AI_BACKOFF_BASE = float(os.getenv("AI_BACKOFF_BASE", "1.0"))  # 退避基数（秒）
+AI_BACKOFF_MAX = float(os.getenv("AI_BACKOFF_MAX", "60"))  # 单次退避上限（秒）
+
+# 对冲请求配置（请求超过近期延迟分位数仍未返回时发送副本）
+AI_HEDGE_ENABLED = os.getenv("AI_HEDGE_ENABLED", "0") == "1"
+AI_HEDGE_PERCENTILE = float(os.getenv("AI_HEDGE_PERCENTILE", "0.9"))
+AI_HEDGE_MIN_SAMPLES = int(os.getenv("AI_HEDGE_MIN_SAMPLES", "20"))  # 样本不足时不对冲
+AI_HEDGE_WINDOW = int(os.getenv("AI_HEDGE_WINDOW", "200"))  # 每类请求保留的延迟样本数
+AI_HEDGE_MIN_DELAY = float(os.getenv("AI_HEDGE_MIN_DELAY", "1.0"))  # 发送副本前至少等待（秒）
+
+# 多模型故障转移配置（逗号分隔，按优先级排列；纯文本和视觉任务分开维护）
+AI_TEXT_MODELS = [
+    m.strip() for m in os.getenv(
+        "AI_TEXT_MODELS", f"{DEFAULT_MODEL},google/gemini-2.0-flash-001"
+    ).split(",") if m.strip()
+]
+AI_VISION_MODELS = [
+    m.strip() for m in os.getenv(
+        "AI_VISION_MODELS", f"{DEFAULT_MODEL},google/gemini-2.0-flash-001"
+    ).split(",") if m.strip()
+]
+AI_CIRCUIT_FAILURES = int(os.getenv("AI_CIRCUIT_FAILURES", "3"))  # 连续失败多少次后熔断
+AI_CIRCUIT_COOLDOWN = float(os.getenv("AI_CIRCUIT_COOLDOWN", "60"))  # 熔断冷却时间（秒）
+AI_HEALTH_EWMA_ALPHA = float(os.getenv("AI_HEALTH_EWMA_ALPHA", "0.2"))  # 延迟/错误率平滑系数
+
+# 批量翻译配置
+TRANSLATE_MAX_TOKENS = int(os.getenv("TRANSLATE_MAX_TOKENS", "8192"))  # 单次请求的输出上限
+TRANSLATE_BATCH_TOKEN_BUDGET = int(os.getenv("TRANSLATE_BATCH_TOKEN_BUDGET", "12000"))  # 单批输入+输出的估算 token 预算
+TRANSLATE_BATCH_MAX_ITEMS = int(os.getenv("TRANSLATE_BATCH_MAX_ITEMS", "200"))  # 单批最多条数，保证编号解析可靠
+TRANSLATE_RECONCILE_RETRIES = int(os.getenv("TRANSLATE_RECONCILE_RETRIES", "2"))  # 缺失条目的补译轮数上限
+TRANSLATE_STREAM = os.getenv("TRANSLATE_STREAM", "1") == "1"  # 流式接收译文，边收边排版
+
+# 分级翻译配置：短标签和数值类文本交给快速小模型大批量处理，段落仍用主模型
+TRANSLATE_TIERING = os.getenv("TRANSLATE_TIERING", "1") == "1"
+TRANSLATE_FAST_MODEL = os.getenv("TRANSLATE_FAST_MODEL", "google/gemini-2.5-flash-lite")
+TRANSLATE_FAST_BATCH_TOKEN_BUDGET = int(os.getenv("TRANSLATE_FAST_BATCH_TOKEN_BUDGET", "24000"))
+TRANSLATE_FAST_BATCH_MAX_ITEMS = int(os.getenv("TRANSLATE_FAST_BATCH_MAX_ITEMS", "400"))
+TRANSLATE_LABEL_MAX_CHARS = int(os.getenv("TRANSLATE_LABEL_MAX_CHARS", "12"))  # 不超过该中文字数且无句末标点视为标签
+
+# 截止时间配置：剩余时间不足时降级（改用快速模型、降低渲染 DPI），尽量在时限内交付
+DEADLINE_DEGRADE_SECONDS = float(os.getenv("DEADLINE_DEGRADE_SECONDS", "60"))
+DEGRADED_DPI = int(os.getenv("DEGRADED_DPI", "100"))
+
+# 页面渲染配置：多页文档用进程池并行渲染，每个进程各自打开文档
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "0"))  # 渲染进程数，0 表示使用全部 CPU 核心
+RENDER_PARALLEL_MIN_PAGES = int(os.getenv("RENDER_PARALLEL_MIN_PAGES", "4"))  # 页数少于该值时在当前进程渲染
+RENDER_CHUNK_PAGES = int(os.getenv("RENDER_CHUNK_PAGES", "4"))  # 每个子任务渲染的连续页数
+RENDER_MAX_RESIDENT_PAGES = int(os.getenv("RENDER_MAX_RESIDENT_PAGES", "8"))  # 内存中最多保留的已渲染页数（小于渲染进程数时也限制并行度）
+
+# 自适应 DPI：按页面文字层中最小的有效字号选择能看清该字号的最低 DPI，
+# 小字密集的页面提高 DPI，只有大标题的页面降低 DPI；没有文字层的页面（扫描件）保持原设置
+ADAPTIVE_DPI = os.getenv("ADAPTIVE_DPI", "1") == "1"
+ADAPTIVE_DPI_MIN = int(os.getenv("ADAPTIVE_DPI_MIN", "100"))
+ADAPTIVE_DPI_MAX = int(os.getenv("ADAPTIVE_DPI_MAX", "300"))
+ADAPTIVE_DPI_TARGET_PX = float(os.getenv("ADAPTIVE_DPI_TARGET_PX", "22"))  # 最小有效字号渲染后的像素高度
+ADAPTIVE_DPI_SIGNIFICANT_SHARE = float(os.getenv("ADAPTIVE_DPI_SIGNIFICANT_SHARE", "0.05"))  # 字符占比低于该值的更小字号忽略
+
+# 载荷图片编码：发给模型的图片按调用点分别设置格式、质量、灰度和最长边（见 image_encoding）
+# 页面默认用 WebP（文字页面约为 PNG 的一半；JPEG 在纯色文字页面上并不比 PNG 小），
+# WebP 经 Pillow 编码；可用 benchmarks/payload_sizes.py 对比
+ANALYZE_IMAGE_ENCODING = os.getenv("ANALYZE_IMAGE_ENCODING", "webp,quality=80,max_edge=2048")  # 文档分析（整份文档一次请求）
+VISION_IMAGE_ENCODING = os.getenv("VISION_IMAGE_ENCODING", "webp,quality=85")  # Vision 逐页翻译
+
 # 目录配置
 BASE_DIR = Path(__file__).parent.parent.parent
 OUTPUT_DIR = BASE_DIR / "output"
 TEMP_DIR = BASE_DIR / "temp"
 ASSETS_DIR = BASE_DIR / "assets"
+CACHE_DIR = BASE_DIR / "cache"
 
 # 确保目录存在
 OUTPUT_DIR.mkdir(exist_ok=True)
 TEMP_DIR.mkdir(exist_ok=True)
 ASSETS_DIR.mkdir(exist_ok=True)
+CACHE_DIR.mkdir(exist_ok=True)
+
+# 断点续跑：长任务的逐页/逐批检查点保存目录
+CHECKPOINT_DIR = Path(os.getenv("CHECKPOINT_DIR", str(CACHE_DIR / "checkpoints")))
+
+# 翻译记忆配置（跨文档复用已翻译的文本）
+TM_ENABLED = os.getenv("TM_ENABLED", "1") == "1"
+TM_DB_PATH = Path(os.getenv("TM_DB_PATH", str(CACHE_DIR / "translation_memory.db")))
+TM_LRU_SIZE = int(os.getenv("TM_LRU_SIZE", "20000"))
 
 # PDF 转图片配置
 PDF_DPI = 200  # 平衡质量和速度
@@ -0,0 +1,110 @@
+"""
+对冲请求策略
+记录近期请求延迟，请求超过指定分位数仍未返回时再发一份副本，
+取先返回的结果，另一份取消，以此压低长尾延迟
+"""
+import math
+import threading
+from collections import deque
+from typing import Optional
+
+from . import metrics
+from .config import (
+    AI_HEDGE_ENABLED,
+    AI_HEDGE_PERCENTILE,
+    AI_HEDGE_MIN_SAMPLES,
+    AI_HEDGE_WINDOW,
+    AI_HEDGE_MIN_DELAY,
+)
+
+
+class LatencyTracker:
+    """
+    按请求类别记录最近的延迟样本
+    不同类别（模型、输出上限、是否流式）的延迟分布差异很大，分开统计
+    """
+
+    def __init__(self, window: int = AI_HEDGE_WINDOW):
+        self.window = window
+        self._samples: dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def record(self, key: str, seconds: float):
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = deque(maxlen=self.window)
+                self._samples[key] = samples
+            samples.append(seconds)
+
+    def percentile(self, key: str, q: float, min_samples: int = 1) -> Optional[float]:
+        """返回 q 分位数（0~1），样本不足时返回 None"""
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) < max(1, min_samples):
+            return None
+        rank = min(len(samples) - 1, max(0, math.ceil(q * len(samples)) - 1))
+        return samples[rank]
+
+
+class HedgePolicy:
+    """
+    对冲策略：决定何时发送副本，并汇总对冲相关指标
+    """
+
+    def __init__(
+        self,
+        enabled: bool = AI_HEDGE_ENABLED,
+        percentile: float = AI_HEDGE_PERCENTILE,
+        min_samples: int = AI_HEDGE_MIN_SAMPLES,
+        min_delay: float = AI_HEDGE_MIN_DELAY
+    ):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.tracker = LatencyTracker()
+
+    def threshold(self, key: str) -> Optional[float]:
+        """发送副本前的等待时间，None 表示本次不对冲"""
+        if not self.enabled:
+            return None
+        value = self.tracker.percentile(key, self.percentile, self.min_samples)
+        if value is None:
+            return None
+        return max(value, self.min_delay)
+
+    def record_latency(self, key: str, seconds: float):
+        self.tracker.record(key, seconds)
+
+    def record_request(self, hedged: bool, hedge_won: bool = False, overhead_tokens: int = 0):
+        metrics.incr("ai.hedge.requests")
+        if hedged:
+            metrics.incr("ai.hedge.hedged")
+            metrics.incr("ai.hedge.overhead_tokens", overhead_tokens)
+        if hedge_won:
+            metrics.incr("ai.hedge.hedge_won")
+
+    def stats(self) -> dict:
+        requests = metrics.get("ai.hedge.requests")
+        hedged = metrics.get("ai.hedge.hedged")
+        return {
+            "requests": int(requests),
+            "hedged": int(hedged),
+            "hedge_rate": hedged / requests if requests else 0.0,
+            "hedge_won": int(metrics.get("ai.hedge.hedge_won")),
+            "overhead_tokens": int(metrics.get("ai.hedge.overhead_tokens")),
+        }
+
+
+_policy: Optional[HedgePolicy] = None
+_policy_lock = threading.Lock()
+
+
+def get_hedge_policy() -> HedgePolicy:
+    """获取进程内共享的对冲策略"""
+    global _policy
+    with _policy_lock:
+        if _policy is None:
+            _policy = HedgePolicy()
+        return _policy
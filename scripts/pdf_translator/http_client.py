@@ -0,0 +1,100 @@
+"""
+共享 HTTP 连接池
+进程内长期复用 httpx.Client，避免每次请求都重新建立 TCP/TLS 连接
+"""
+import atexit
+import os
+import threading
+from urllib.parse import urlsplit
+
+import httpx
+
+from .config import (
+    HTTP_TIMEOUT,
+    HTTP_MAX_CONNECTIONS_PER_HOST,
+    HTTP_MAX_KEEPALIVE,
+    HTTP_KEEPALIVE_EXPIRY,
+    HTTP2_ENABLED,
+)
+
+try:
+    import h2  # noqa: F401  httpx 的 HTTP/2 支持依赖 h2
+    _HTTP2_AVAILABLE = True
+except ImportError:
+    _HTTP2_AVAILABLE = False
+
+
+_lock = threading.Lock()
+_clients: dict[str, httpx.Client] = {}
+_owner_pid = os.getpid()
+
+
+def _origin(url: str) -> str:
+    """提取 scheme://host:port 作为连接池的分组键"""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def _build_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS_PER_HOST,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+
+
+def http2_enabled() -> bool:
+    """是否启用 HTTP/2（需要安装 h2）"""
+    return HTTP2_ENABLED and _HTTP2_AVAILABLE
+
+
+def get_http_client(base_url: str) -> httpx.Client:
+    """
+    获取指定主机的共享客户端
+    每个主机一个连接池，连接数上限即为该主机的并发连接上限
+    """
+    global _owner_pid
+
+    key = _origin(base_url)
+    with _lock:
+        # fork 出的子进程（如 gunicorn worker）不能复用父进程的 socket
+        if os.getpid() != _owner_pid:
+            _clients.clear()
+            _owner_pid = os.getpid()
+
+        client = _clients.get(key)
+        if client is None or client.is_closed:
+            client = httpx.Client(
+                timeout=HTTP_TIMEOUT,
+                limits=_build_limits(),
+                http2=http2_enabled(),
+            )
+            _clients[key] = client
+        return client
+
+
+def create_async_http_client() -> httpx.AsyncClient:
+    """
+    创建异步客户端
+    AsyncClient 绑定在事件循环上，不能跨 asyncio.run 共享，
+    由调用方在一次批量调用期间持有并负责关闭
+    """
+    return httpx.AsyncClient(
+        timeout=HTTP_TIMEOUT,
+        limits=_build_limits(),
+        http2=http2_enabled(),
+    )
+
+
+def close_http_clients():
+    """关闭所有共享客户端（进程退出时自动调用）"""
+    with _lock:
+        if os.getpid() != _owner_pid:
+            _clients.clear()
+            return
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+
+
+atexit.register(close_http_clients)
@@ -0,0 +1,129 @@
+"""
+载荷图片编码
+发给模型的页面图片按调用点分别配置编码：格式（PNG/JPEG/WebP）、质量、灰度和最长边上限。
+以文字为主的技术文档页面用 JPEG/WebP 编码通常只有 PNG 的几分之一，上传更快、图片 token 更少。
+编码设置写成 "jpeg,quality=80,gray,max_edge=2048" 形式，见 config 中的 *_IMAGE_ENCODING
+"""
+import base64
+import io
+
+import fitz  # PyMuPDF
+
+from . import metrics
+
+MIME_TYPES = {"png": "image/png", "jpeg": "image/jpeg", "webp": "image/webp"}
+
+
+class ImageEncoding:
+    """一个调用点的图片编码设置（可 pickle，渲染进程中直接按此编码）"""
+
+    def __init__(self, format: str = "png", quality: int = 80, grayscale: bool = False, max_edge: int = 0):
+        format = {"jpg": "jpeg"}.get(format, format)
+        if format not in MIME_TYPES:
+            raise ValueError(f"不支持的图片格式: {format}")
+        self.format = format
+        self.quality = quality
+        self.grayscale = grayscale
+        self.max_edge = max_edge  # 最长边像素上限，0 表示不限
+
+    @classmethod
+    def parse(cls, spec: str) -> "ImageEncoding":
+        """解析 "jpeg,quality=80,gray,max_edge=2048"，第一项为格式，其余可省略"""
+        items = [item.strip() for item in spec.split(",") if item.strip()]
+        encoding = cls(items[0].lower() if items else "png")
+        for item in items[1:]:
+            name, _, value = item.partition("=")
+            name = name.strip().lower()
+            if name in ("gray", "grayscale"):
+                encoding.grayscale = value.strip() not in ("0", "false")
+            elif name == "quality":
+                encoding.quality = max(1, min(100, int(value)))
+            elif name == "max_edge":
+                encoding.max_edge = max(0, int(value))
+            else:
+                raise ValueError(f"未知的图片编码参数: {item}")
+        return encoding
+
+    @property
+    def mime(self) -> str:
+        return MIME_TYPES[self.format]
+
+    @property
+    def suffix(self) -> str:
+        return ".jpg" if self.format == "jpeg" else f".{self.format}"
+
+    def scale_for(self, width: float, height: float) -> float:
+        """按最长边上限计算的缩放比例（不放大）"""
+        longest = max(width, height)
+        if not self.max_edge or longest <= self.max_edge:
+            return 1.0
+        return self.max_edge / longest
+
+    def __repr__(self) -> str:
+        parts = [self.format]
+        if self.format != "png":
+            parts.append(f"quality={self.quality}")
+        if self.grayscale:
+            parts.append("gray")
+        if self.max_edge:
+            parts.append(f"max_edge={self.max_edge}")
+        return ",".join(parts)
+
+
+def _encode_pil(image, encoding: ImageEncoding) -> bytes:
+    # CMYK、YCbCr、16 位灰度等模式各格式都不能直接写入，先转为 RGB
+    if image.mode not in ("RGB", "RGBA", "L", "LA", "P"):
+        image = image.convert("RGB")
+    buffer = io.BytesIO()
+    if encoding.format == "png":
+        image.save(buffer, "PNG", optimize=True)
+    else:
+        if encoding.format == "jpeg" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        image.save(buffer, encoding.format.upper(), quality=encoding.quality)
+    return buffer.getvalue()
+
+
+def encode_pixmap(pix: fitz.Pixmap, encoding: ImageEncoding) -> bytes:
+    """按设置编码已渲染的页面（PNG/JPEG 由 PyMuPDF 直接编码，WebP 经 Pillow）"""
+    if encoding.format == "png":
+        return pix.tobytes("png")
+    if encoding.format == "jpeg":
+        return pix.tobytes("jpeg", jpg_quality=encoding.quality)
+    from PIL import Image
+    mode = "L" if pix.n == 1 else "RGB"
+    return _encode_pil(Image.frombytes(mode, (pix.width, pix.height), pix.samples), encoding)
+
+
+def render_page_image(page: fitz.Page, dpi: int, encoding: ImageEncoding) -> dict:
+    """
+    渲染页面并编码，灰度和最长边上限在渲染时直接生效（不必先渲染大图再缩小）
+    返回 {"data", "mime", "width", "height", "dpi"}，dpi 为缩放后的实际值，用于像素坐标换算
+    """
+    zoom = dpi / 72
+    zoom *= encoding.scale_for(page.rect.width * zoom, page.rect.height * zoom)
+    colorspace = fitz.csGRAY if encoding.grayscale else fitz.csRGB
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=colorspace, alpha=False)
+    return {
+        "data": encode_pixmap(pix, encoding),
+        "mime": encoding.mime,
+        "width": pix.width,
+        "height": pix.height,
+        "dpi": zoom * 72
+    }
+
+
+def data_url(data: bytes, mime: str) -> str:
+    return f"data:{mime};base64,{base64.b64encode(data).decode('utf-8')}"
+
+
+def record_payload(site: str, image_sizes: list[int]):
+    """
+    记录一次请求携带的图片字节数
+    计数器 payload.<调用点>.requests / images / bytes，可由 /api/metrics 或基准脚本读取
+    """
+    total = sum(image_sizes)
+    metrics.incr(f"payload.{site}.requests")
+    metrics.incr(f"payload.{site}.images", len(image_sizes))
+    metrics.incr(f"payload.{site}.bytes", total)
+    print(f"   载荷图片: {len(image_sizes)} 张, {total / 1024:.0f} KB")
@@ -0,0 +1,32 @@
+"""
+运行指标
+进程内的简单计数器，各模块累加，Web 服务或基准脚本统一读取
+"""
+import threading
+
+_lock = threading.Lock()
+_counters: dict[str, float] = {}
+
+
+def incr(name: str, value: float = 1):
+    """累加计数器"""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def get(name: str) -> float:
+    with _lock:
+        return _counters.get(name, 0)
+
+
+def snapshot(prefix: str = None) -> dict[str, float]:
+    """返回当前所有计数器（可按前缀过滤）"""
+    with _lock:
+        if prefix is None:
+            return dict(_counters)
+        return {k: v for k, v in _counters.items() if k.startswith(prefix)}
+
+
+def reset():
+    with _lock:
+        _counters.clear()
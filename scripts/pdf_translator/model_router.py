@@ -0,0 +1,149 @@
+"""
+多模型路由与故障转移
+按能力（text / vision）分别维护模型健康状态：
+- EWMA 延迟与错误率
+- 熔断器：连续失败达到阈值后暂停使用该模型，冷却后再试探
+请求发往最快的健康模型，失败时自动切换到候选列表中的下一个
+"""
+import threading
+import time
+from typing import Optional
+
+from .config import (
+    AI_TEXT_MODELS,
+    AI_VISION_MODELS,
+    AI_CIRCUIT_FAILURES,
+    AI_CIRCUIT_COOLDOWN,
+    AI_HEALTH_EWMA_ALPHA,
+)
+
+
+class ModelHealth:
+    """单个模型的健康状态"""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.ewma_latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.requests = 0
+        self.failures = 0
+
+    def is_open(self, now: float) -> bool:
+        """熔断中（冷却期内）"""
+        return now < self.open_until
+
+    def score(self) -> float:
+        """越小越好：延迟按错误率加权"""
+        return (self.ewma_latency or 0.0) * (1 + 2 * self.error_rate)
+
+    def to_dict(self, now: float) -> dict:
+        return {
+            "ewma_latency": round(self.ewma_latency, 3) if self.ewma_latency is not None else None,
+            "error_rate": round(self.error_rate, 3),
+            "consecutive_failures": self.consecutive_failures,
+            "circuit_open": self.is_open(now),
+            "requests": self.requests,
+            "failures": self.failures,
+        }
+
+
+class ModelRouter:
+    """
+    某一能力（text 或 vision）的模型池
+    健康状态在进程内共享，各 AIProcessor 只提供自己的候选顺序
+    """
+
+    def __init__(
+        self,
+        capability: str,
+        models: list[str],
+        failure_threshold: int = AI_CIRCUIT_FAILURES,
+        cooldown: float = AI_CIRCUIT_COOLDOWN,
+        alpha: float = AI_HEALTH_EWMA_ALPHA
+    ):
+        self.capability = capability
+        self.models = list(dict.fromkeys(models))
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.alpha = alpha
+        self._health: dict[str, ModelHealth] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, model: str) -> ModelHealth:
+        health = self._health.get(model)
+        if health is None:
+            health = ModelHealth(model)
+            self._health[model] = health
+        return health
+
+    def candidates(self, preferred: str = None) -> list[str]:
+        """候选顺序：调用方指定的模型优先，其后为池中配置的顺序"""
+        if preferred:
+            return list(dict.fromkeys([preferred] + self.models))
+        return list(self.models)
+
+    def choose(self, candidates: list[str], exclude: set = None) -> str:
+        """
+        选择模型
+        - 只在未熔断的模型中选择，优先排除本次调用刚失败过的模型
+        - 首选模型还没有延迟数据时先用它；否则选已测得延迟中得分最低的
+        - 全部熔断时选最早结束冷却的那个
+        """
+        exclude = exclude or set()
+        with self._lock:
+            now = time.monotonic()
+            healthy = [m for m in candidates if not self._get(m).is_open(now)]
+            preferred = [m for m in healthy if m not in exclude] or healthy
+            if not preferred:
+                return min(candidates, key=lambda m: self._get(m).open_until)
+
+            first = self._get(preferred[0])
+            measured = [m for m in preferred if self._get(m).ewma_latency is not None]
+            if first.ewma_latency is None or not measured:
+                return preferred[0]
+            return min(measured, key=lambda m: self._get(m).score())
+
+    def record_success(self, model: str, latency: float):
+        with self._lock:
+            health = self._get(model)
+            health.requests += 1
+            health.consecutive_failures = 0
+            health.open_until = 0.0
+            health.error_rate *= (1 - self.alpha)
+            if health.ewma_latency is None:
+                health.ewma_latency = latency
+            else:
+                health.ewma_latency = self.alpha * latency + (1 - self.alpha) * health.ewma_latency
+
+    def record_failure(self, model: str):
+        with self._lock:
+            health = self._get(model)
+            health.requests += 1
+            health.failures += 1
+            health.consecutive_failures += 1
+            health.error_rate = self.alpha + (1 - self.alpha) * health.error_rate
+            if health.consecutive_failures >= self.failure_threshold:
+                health.open_until = time.monotonic() + self.cooldown
+                print(f"   ⚠️ 模型 {model} 连续失败 {health.consecutive_failures} 次，熔断 {self.cooldown:.0f}s")
+
+    def stats(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            return {model: health.to_dict(now) for model, health in self._health.items()}
+
+
+_routers: dict[str, ModelRouter] = {}
+_routers_lock = threading.Lock()
+
+
+def get_model_router(capability: str) -> ModelRouter:
+    """获取进程内共享的模型池（capability: "text" 或 "vision"）"""
+    with _routers_lock:
+        router = _routers.get(capability)
+        if router is None:
+            models = AI_VISION_MODELS if capability == "vision" else AI_TEXT_MODELS
+            router = ModelRouter(capability, models)
+            _routers[capability] = router
+        return router
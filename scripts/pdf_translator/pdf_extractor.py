@@ -7,48 +7,135 @@ import base64
 from pathlib import Path
 from PIL import Image
 import io
-from .config import PDF_DPI, TEMP_DIR
+from collections import deque
+from typing import Iterator, Optional
+from .config import PDF_DPI, TEMP_DIR, RENDER_MAX_RESIDENT_PAGES, ADAPTIVE_DPI
+from .cancellation import CancelToken, check
+from .rasterizer import DpiReport, render_pages
+from .image_encoding import ImageEncoding, data_url
 
 
-def pdf_to_images(pdf_path: str, dpi: int = PDF_DPI) -> list[dict]:
+class PageImage:
     """
-    将 PDF 每页转换为图片
-    返回: [{"page": 0, "image_base64": "...", "image_path": "..."}]
+    一页渲染结果
+    图片只编码一次并写入 image_path；内存中的编码数据可被 release() 释放，之后按需从磁盘读取。
+    image_base64 / data_url 每次访问时现算，不常驻内存
     """
-    doc = fitz.open(pdf_path)
-    images = []
     
-    pdf_name = Path(pdf_path).stem
-    output_dir = TEMP_DIR / pdf_name
-    output_dir.mkdir(exist_ok=True)
+    def __init__(self, page: int, image_path: str, width: int, height: int, data: bytes, mime: str = "image/png"):
+        self.page = page  # 从 1 开始
+        self.image_path = image_path
+        self.width = width
+        self.height = height
+        self.mime = mime
+        self.size = len(data)
+        self._data = data
     
-    for page_num in range(len(doc)):
-        page = doc[page_num]
-        # 转换为图片
-        mat = fitz.Matrix(dpi / 72, dpi / 72)
-        pix = page.get_pixmap(matrix=mat)
-        
-        # 保存为 PNG
-        img_path = output_dir / f"page_{page_num + 1}.png"
-        pix.save(str(img_path))
-        
-        # 转换为 base64
-        img_bytes = pix.tobytes("png")
-        img_base64 = base64.b64encode(img_bytes).decode("utf-8")
-        
-        images.append({
-            "page": page_num + 1,
-            "image_path": str(img_path),
-            "image_base64": img_base64,
-            "width": pix.width,
-            "height": pix.height
-        })
+    @property
+    def data(self) -> bytes:
+        if self._data is not None:
+            return self._data
+        return Path(self.image_path).read_bytes()
     
-    doc.close()
-    return images
+    @property
+    def image_base64(self) -> str:
+        return base64.b64encode(self.data).decode("utf-8")
+    
+    @property
+    def data_url(self) -> str:
+        return data_url(self.data, self.mime)
+    
+    @property
+    def resident(self) -> bool:
+        return self._data is not None
+    
+    def release(self):
+        self._data = None
+
+
+class PageImageSource:
+    """
+    惰性的页面图片来源
+    第一次遍历时逐页渲染（见 rasterizer.render_pages）并按 encoding 编码写入磁盘，之后的遍历直接读磁盘；
+    内存中最多保留 max_resident 页的编码数据，更早的页面释放后按需读取；
+    adaptive 时每页按文字层选择 DPI，dpi 为对比基准，结果汇总在 report（rasterizer.DpiReport）
+    """
+    
+    def __init__(
+        self,
+        pdf_path: str,
+        dpi: int = PDF_DPI,
+        cancel_token: Optional[CancelToken] = None,
+        workers: Optional[int] = None,
+        max_resident: int = RENDER_MAX_RESIDENT_PAGES,
+        encoding: Optional[ImageEncoding] = None,
+        adaptive: bool = ADAPTIVE_DPI
+    ):
+        self.pdf_path = pdf_path
+        self.dpi = dpi
+        self.encoding = encoding or ImageEncoding()
+        self.adaptive = adaptive
+        self.report = DpiReport(dpi)
+        self.cancel_token = cancel_token
+        self.workers = workers
+        self.max_resident = max(1, max_resident)
+        self.output_dir = TEMP_DIR / Path(pdf_path).stem
+        with fitz.open(pdf_path) as doc:
+            self.page_count = doc.page_count
+        self._pages = []
+        self._resident = deque()
+    
+    def __len__(self) -> int:
+        return self.page_count
+    
+    def __iter__(self) -> Iterator[PageImage]:
+        yield from list(self._pages)
+        if len(self._pages) < self.page_count:
+            yield from self._render(range(len(self._pages), self.page_count))
+    
+    def _render(self, page_indexes) -> Iterator[PageImage]:
+        self.output_dir.mkdir(exist_ok=True)
+        for rendered in render_pages(
+            self.pdf_path, self.dpi, pages=list(page_indexes), workers=self.workers,
+            encoding=self.encoding, cancel_token=self.cancel_token, max_pending_pages=self.max_resident,
+            adaptive=self.adaptive
+        ):
+            page_num = rendered["page_index"]
+            img_path = self.output_dir / f"page_{page_num + 1}{self.encoding.suffix}"
+            img_path.write_bytes(rendered["data"])
+            image = PageImage(
+                page_num + 1, str(img_path), rendered["width"], rendered["height"],
+                rendered["data"], rendered["mime"]
+            )
+            self._pages.append(image)
+            self._resident.append(image)
+            while len(self._resident) > self.max_resident:
+                self._resident.popleft().release()
+            self.report.add(rendered)
+            yield image
+        if self.adaptive:
+            self.report.print_summary()
+
+
+def pdf_to_images(
+    pdf_path: str,
+    dpi: int = PDF_DPI,
+    cancel_token: Optional[CancelToken] = None,
+    workers: Optional[int] = None,
+    encoding: Optional[ImageEncoding] = None,
+    adaptive: bool = ADAPTIVE_DPI
+) -> PageImageSource:
+    """
+    将 PDF 每页转换为图片（encoding 默认 PNG，adaptive 时按页选择 DPI）
+    返回惰性的 PageImageSource，遍历时才渲染（多页时由进程池并行渲染），
+    每项为 PageImage（page 从 1 开始，image_path、image_base64、data_url、width、height）
+    """
+    return PageImageSource(
+        pdf_path, dpi, cancel_token=cancel_token, workers=workers, encoding=encoding, adaptive=adaptive
+    )
 
 
-def extract_embedded_images(pdf_path: str) -> list[dict]:
+def extract_embedded_images(pdf_path: str, cancel_token: Optional[CancelToken] = None) -> list[dict]:
     """
     提取 PDF 中嵌入的图片（产品图、接线图等）
     """
@@ -61,6 +148,7 @@ def extract_embedded_images(pdf_path: str) -> list[dict]:
     
     img_count = 0
     for page_num in range(len(doc)):
+        check(cancel_token)
         page = doc[page_num]
         image_list = page.get_images()
         
@@ -97,7 +185,7 @@ def extract_embedded_images(pdf_path: str) -> list[dict]:
     return images
 
 
-def extract_text_blocks(pdf_path: str) -> list[dict]:
+def extract_text_blocks(pdf_path: str, cancel_token: Optional[CancelToken] = None) -> list[dict]:
     """
     提取 PDF 文本块（保留位置信息）
     """
@@ -105,6 +193,7 @@ def extract_text_blocks(pdf_path: str) -> list[dict]:
     blocks = []
     
     for page_num in range(len(doc)):
+        check(cancel_token)
         page = doc[page_num]
         text_dict = page.get_text("dict")
         
@@ -5,10 +5,102 @@ PDF 原位翻译器
 import fitz  # PyMuPDF
 import json
 import re
+from collections import Counter
 from pathlib import Path
-from typing import Optional
-from .config import OUTPUT_DIR, DEFAULT_MODEL
+from typing import Callable, Optional
+from .config import (
+    OUTPUT_DIR, DEFAULT_MODEL, TM_ENABLED,
+    TRANSLATE_MAX_TOKENS, TRANSLATE_BATCH_TOKEN_BUDGET, TRANSLATE_BATCH_MAX_ITEMS,
+    TRANSLATE_RECONCILE_RETRIES, TRANSLATE_STREAM,
+    TRANSLATE_TIERING, TRANSLATE_FAST_MODEL, TRANSLATE_FAST_BATCH_TOKEN_BUDGET,
+    TRANSLATE_FAST_BATCH_MAX_ITEMS, TRANSLATE_LABEL_MAX_CHARS
+)
 from .ai_processor import AIProcessor
+from .cancellation import CancelToken, check
+from .checkpoint import Checkpoint
+from .progress import ProgressCallback, ProgressTracker
+from .translation_memory import get_translation_memory
+
+
+# 翻译提示词版本，修改 _build_batch_messages 的提示词时需要递增，
+# 以免翻译记忆返回旧提示词生成的结果
+PROMPT_VERSION = "inplace-v1"
+
+# 提示词固定部分（规则说明）的估算 token 数
+PROMPT_OVERHEAD_TOKENS = 120
+
+# 响应不完整的结束原因：length 为输出达到上限，interrupted 为流式连接中途断开
+TRUNCATED_REASONS = ("length", "interrupted")
+
+_CHINESE_RE = re.compile(r'[\u4e00-\u9fff]')
+
+
+def _parse_translation_line(line: str, texts: list[str], target_language: str = None):
+    """
+    解析一行 NUMBER|||TRANSLATION
+    成功返回 (原文, 译文)，格式错误返回 None
+    译为英文时仍含中文的结果视为格式错误
+    """
+    if "|||" not in line:
+        return None
+    parts = line.split("|||", 1)
+    try:
+        idx = int(parts[0].strip()) - 1
+    except ValueError:
+        return None
+    if not 0 <= idx < len(texts):
+        return None
+    # 清理翻译结果
+    translation = parts[1].strip().split("|||")[0].strip()
+    if not translation:
+        return None
+    if target_language == "English" and _CHINESE_RE.search(translation):
+        return None
+    return texts[idx], translation
+
+
+class BatchLineParser:
+    """
+    流式响应的增量解析器
+    每收到完整的一行 NUMBER|||TRANSLATION 就立即回调，不等整个响应结束
+    """
+    
+    def __init__(
+        self,
+        texts: list[str],
+        target_language: str = None,
+        on_translation: Optional[Callable[[str, str], None]] = None
+    ):
+        self.texts = texts
+        self.target_language = target_language
+        self.on_translation = on_translation
+        self.result = {}
+        self._buffer = ""
+    
+    def feed(self, chunk: str):
+        self._buffer += chunk
+        while "\n" in self._buffer:
+            line, self._buffer = self._buffer.split("\n", 1)
+            self._handle(line)
+    
+    def close(self, truncated: bool = False) -> dict[str, str]:
+        """
+        结束解析，返回 {原文: 译文}
+        truncated=True 时最后一行没有换行符、可能只输出了一半，丢弃不用
+        """
+        if self._buffer and not truncated:
+            self._handle(self._buffer)
+        self._buffer = ""
+        return self.result
+    
+    def _handle(self, line: str):
+        parsed = _parse_translation_line(line, self.texts, self.target_language)
+        if parsed is None:
+            return
+        text, translation = parsed
+        self.result[text] = translation
+        if self.on_translation:
+            self.on_translation(text, translation)
 
 
 class PDFInplaceTranslator:
@@ -16,8 +108,36 @@ class PDFInplaceTranslator:
     保留 PDF 原始布局，直接翻译文字
     """
     
-    def __init__(self, api_key: str = None, model: str = None):
-        self.ai = AIProcessor(api_key=api_key, model=model)
+    def __init__(
+        self,
+        api_key: str = None,
+        model: str = None,
+        use_memory: bool = TM_ENABLED,
+        on_progress: Optional[ProgressCallback] = None,
+        cancel_token: Optional[CancelToken] = None,
+        checkpoint: Optional[Checkpoint] = None
+    ):
+        self.ai = AIProcessor(api_key=api_key, model=model, cancel_token=cancel_token)
+        self.memory = get_translation_memory() if use_memory else None
+        self.last_stats = {}
+        self.progress = ProgressTracker(on_progress)
+        self.cancel_token = cancel_token
+        # 检查点：提取结果和每批译文完成即落盘，重跑时跳过已完成的部分
+        self.checkpoint = checkpoint
+        
+        # 分级路由：fast 处理标签/数值类短文本，strong 处理段落
+        self.tiers = {
+            "fast": {
+                "model": TRANSLATE_FAST_MODEL,
+                "token_budget": TRANSLATE_FAST_BATCH_TOKEN_BUDGET,
+                "max_items": TRANSLATE_FAST_BATCH_MAX_ITEMS
+            },
+            "strong": {
+                "model": self.ai.model,
+                "token_budget": TRANSLATE_BATCH_TOKEN_BUDGET,
+                "max_items": TRANSLATE_BATCH_MAX_ITEMS
+            }
+        }
     
     def extract_text_blocks(self, pdf_path: str) -> list[dict]:
         """
@@ -28,6 +148,7 @@ class PDFInplaceTranslator:
         all_blocks = []
         
         for page_num in range(len(doc)):
+            check(self.cancel_token)
             page = doc[page_num]
             blocks = page.get_text("dict", flags=fitz.TEXT_PRESERVE_WHITESPACE)["blocks"]
             
@@ -93,28 +214,361 @@ class PDFInplaceTranslator:
         
         return result
     
-    def batch_translate(self, texts: list[str], target_language: str = "English") -> dict[str, str]:
-        """批量翻译文本"""
+    def batch_translate(
+        self,
+        texts: list[str],
+        target_language: str = "English",
+        on_translation: Optional[Callable[[str, str], None]] = None
+    ) -> dict[str, str]:
+        """
+        批量翻译文本（各批次并发请求）
+        on_translation(原文, 译文) 在每条译文可用时立即回调，
+        流式模式下不必等整批响应结束
+        """
         if not texts:
             return {}
         
-        # 去重
-        unique_texts = list(set(texts))
+        # 去重（保持原始顺序，分批结果可复现）
+        unique_texts = list(dict.fromkeys(texts))
         
-        # 分批处理（每批最多 50 条）
-        batch_size = 50
+        # 按文本类型分级；接近截止时间时全部交给快速模型
+        degraded = self.cancel_token is not None and self.cancel_token.should_degrade()
+        if degraded:
+            print(f"   ⚠️ 距截止时间不足 {self.cancel_token.degrade_margin:.0f}s，全部使用快速模型 {TRANSLATE_FAST_MODEL}")
+        texts_by_tier = {}
+        kind_counts = Counter()
+        for text in unique_texts:
+            kind = self._classify_segment(text)
+            kind_counts[kind] += 1
+            tier = "fast" if degraded else self._segment_tier(kind)
+            texts_by_tier.setdefault(tier, []).append(text)
+        
+        # 上次中断前已完成的批次直接复用（记录每条译文实际由哪个模型产生）
+        resumed = {}
+        resumed_models = {}
+        if self.checkpoint:
+            for record in self.checkpoint.records("translations"):
+                batch = record.get("translations", {})
+                resumed.update(batch)
+                resumed_models.update(dict.fromkeys(batch, record.get("model")))
+        
+        # 再查翻译记忆，只把未命中的文本发给 API
         translations = {}
+        pending_by_tier = {}
+        resumed_count = 0
+        for tier, tier_texts in texts_by_tier.items():
+            done = {t: resumed[t] for t in tier_texts if t in resumed}
+            resumed_count += len(done)
+            translations.update(done)
+            tier_texts = [t for t in tier_texts if t not in done]
+            hits = {}
+            if self.memory:
+                hits = self.memory.lookup(
+                    tier_texts, target_language, self.tiers[tier]["model"], PROMPT_VERSION
+                )
+                # 中断前这些译文还没写入翻译记忆，按产生它们的模型写入
+                done_by_model = {}
+                for text, translation in done.items():
+                    done_by_model.setdefault(resumed_models[text], {})[text] = translation
+                for model, entries in done_by_model.items():
+                    if model:
+                        self.memory.store(entries, target_language, model, PROMPT_VERSION)
+            translations.update(hits)
+            pending_by_tier[tier] = [t for t in tier_texts if t not in hits]
+        
+        pending_count = sum(len(t) for t in pending_by_tier.values())
+        if resumed_count:
+            print(f"   检查点: 恢复 {resumed_count} 条已完成的译文")
+        self.last_stats = {
+            "resumed": resumed_count,
+            "memory_hits": len(translations) - resumed_count,
+            "memory_misses": pending_count,
+            "degraded": degraded,
+            "segment_kinds": dict(kind_counts),
+            "tiers": {
+                tier: {
+                    "model": self.tiers[tier]["model"],
+                    "segments": len(tier_texts),
+                    "requests": 0,
+                    "latency_s": 0.0,
+                    "max_latency_s": 0.0,
+                    "prompt_tokens": 0,
+                    "completion_tokens": 0
+                }
+                for tier, tier_texts in texts_by_tier.items()
+            }
+        }
+        if self.memory:
+            print(f"   翻译记忆: 命中 {self.last_stats['memory_hits']} 条, 未命中 {pending_count} 条")
         
-        for i in range(0, len(unique_texts), batch_size):
-            batch = unique_texts[i:i + batch_size]
-            batch_translations = self._translate_batch(batch, target_language)
-            translations.update(batch_translations)
-            print(f"   翻译进度: {min(i + batch_size, len(unique_texts))}/{len(unique_texts)}")
+        if on_translation:
+            for text, translation in translations.items():
+                on_translation(text, translation)
         
+        if pending_count:
+            new_translations, models = self._translate_pending(pending_by_tier, target_language, on_translation)
+            
+            if self.memory:
+                # 按实际作答的模型写入（限流或故障时路由器可能换用了其他模型）
+                by_model = {}
+                for text, translation in new_translations.items():
+                    by_model.setdefault(models[text], {})[text] = translation
+                for model, entries in by_model.items():
+                    self.memory.store(entries, target_language, model, PROMPT_VERSION)
+            translations.update(new_translations)
+        
+        self._print_tier_report()
         return translations
     
-    def _translate_batch(self, texts: list[str], target_language: str) -> dict[str, str]:
-        """翻译一批文本 - 生成准确专业的翻译"""
+    def _classify_segment(self, text: str) -> str:
+        """
+        按长度和内容判断文本类型
+        - numeric: 数字、单位、型号等非中文字符占一半以上
+        - label: 短文本且没有句末标点（表头、参数名、线色等）
+        - paragraph: 其余（说明文字、警告语句）
+        """
+        compact = re.sub(r'\s', '', text)
+        if not compact:
+            return "label"
+        cjk = len(_CHINESE_RE.findall(compact))
+        if (len(compact) - cjk) / len(compact) >= 0.5:
+            return "numeric"
+        if cjk <= TRANSLATE_LABEL_MAX_CHARS and not re.search(r'[。；！？;!?]', compact):
+            return "label"
+        return "paragraph"
+    
+    def _segment_tier(self, kind: str) -> str:
+        if not TRANSLATE_TIERING or kind == "paragraph":
+            return "strong"
+        return "fast"
+    
+    def _print_tier_report(self):
+        """输出各级别的条数、请求数、延迟和 token 用量"""
+        for tier, stats in self.last_stats.get("tiers", {}).items():
+            if not stats["segments"]:
+                continue
+            print(
+                f"   [{tier}] {stats['model']}: {stats['segments']} 条, "
+                f"{stats['requests']} 次请求, 累计 {stats['latency_s']:.1f}s "
+                f"(最长 {stats['max_latency_s']:.1f}s), "
+                f"tokens {stats['prompt_tokens']}+{stats['completion_tokens']}"
+            )
+    
+    def _estimate_tokens(self, text: str) -> int:
+        """粗略估算 token 数：中日韩字符约 1 token/字，其余约 4 字符/token"""
+        cjk = len(re.findall(r'[\u3000-\u9fff\uac00-\ud7af\uff00-\uffef]', text))
+        return cjk + (len(text) - cjk + 3) // 4
+    
+    def _estimate_item_tokens(self, text: str, target_language: str) -> tuple[int, int]:
+        """
+        估算单条文本的 (输入, 输出) token 数
+        输入行格式为 N|||原文|||MAX:n，输出行格式为 N|||译文
+        """
+        input_tokens = self._estimate_tokens(text) + 8
+        if target_language == "English":
+            # 英文译文约为中文字数的 2~3 倍字符，按 4 字符/token 计
+            output_tokens = int(len(text) * 0.8) + 4
+        else:
+            output_tokens = int(len(text) * 1.5) + 4
+        return input_tokens, output_tokens
+    
+    def _pack_batches(
+        self,
+        texts: list[str],
+        target_language: str,
+        tier: str = "strong"
+    ) -> list[list[str]]:
+        """
+        按 token 预算装箱
+        每批的输入+输出估算值接近该级别的 token 预算，
+        输出估算值不超过 max_tokens 的 80%，避免被截断
+        """
+        token_budget = self.tiers[tier]["token_budget"]
+        max_items = self.tiers[tier]["max_items"]
+        output_limit = int(TRANSLATE_MAX_TOKENS * 0.8)
+        batches = []
+        current, current_total, current_output = [], PROMPT_OVERHEAD_TOKENS, 0
+        
+        for text in texts:
+            input_tokens, output_tokens = self._estimate_item_tokens(text, target_language)
+            over_budget = (
+                current_total + input_tokens + output_tokens > token_budget
+                or current_output + output_tokens > output_limit
+                or len(current) >= max_items
+            )
+            if current and over_budget:
+                batches.append(current)
+                current, current_total, current_output = [], PROMPT_OVERHEAD_TOKENS, 0
+            current.append(text)
+            current_total += input_tokens + output_tokens
+            current_output += output_tokens
+        
+        if current:
+            batches.append(current)
+        return batches
+    
+    def _translate_pending(
+        self,
+        texts_by_tier: dict[str, list[str]],
+        target_language: str,
+        on_translation: Optional[Callable[[str, str], None]] = None
+    ) -> tuple[dict[str, str], dict[str, str]]:
+        """
+        翻译未命中缓存的文本，各级别的批次一起并发发送
+        所有批次完成后，把模型遗漏或格式错误的条目汇总成一个紧凑的补译请求，
+        最多重试 TRANSLATE_RECONCILE_RETRIES 轮。
+        返回 (译文, 每条译文实际由哪个模型产生)
+        """
+        batches = self._pack_tiers(texts_by_tier, target_language)
+        total = sum(len(t) for t in texts_by_tier.values())
+        print(f"   分批: {total} 条 → {len(batches)} 批")
+        self.progress.start("translating", total=len(batches), unit="batches")
+        models = {}
+        translations = self._run_batches(batches, target_language, models, on_translation)
+        
+        for attempt in range(1, TRANSLATE_RECONCILE_RETRIES + 1):
+            missing = {
+                tier: [t for t in tier_texts if t not in translations]
+                for tier, tier_texts in texts_by_tier.items()
+            }
+            missing_count = sum(len(t) for t in missing.values())
+            if not missing_count:
+                break
+            print(f"   补译第 {attempt} 轮: {missing_count} 条缺失")
+            reconcile_batches = self._pack_tiers(missing, target_language)
+            self.progress.total += len(reconcile_batches)
+            translations.update(
+                self._run_batches(reconcile_batches, target_language, models, on_translation)
+            )
+        
+        missing_count = sum(
+            1 for tier_texts in texts_by_tier.values() for t in tier_texts if t not in translations
+        )
+        self.last_stats["untranslated"] = missing_count
+        if missing_count:
+            print(f"   警告: {missing_count} 条文本补译后仍未翻译")
+        
+        return translations, models
+    
+    def _pack_tiers(
+        self,
+        texts_by_tier: dict[str, list[str]],
+        target_language: str
+    ) -> list[tuple[str, list[str]]]:
+        """逐级装箱，返回 [(级别, 批次文本)]"""
+        return [
+            (tier, batch)
+            for tier, tier_texts in texts_by_tier.items()
+            for batch in self._pack_batches(tier_texts, target_language, tier)
+        ]
+    
+    def _run_batches(
+        self,
+        batches: list[tuple[str, list[str]]],
+        target_language: str,
+        models: dict[str, str],
+        on_translation: Optional[Callable[[str, str], None]] = None
+    ) -> dict[str, str]:
+        """
+        并发发送一组批次，每批使用所属级别的模型
+        每批完成即解析，并把译文追加到检查点；每条译文实际作答的模型记入 models
+        响应因 finish_reason=length 被截断时，把未返回的条目对半拆分后重新发送
+        """
+        translations = {}
+        round_num = 0
+        
+        while batches:
+            round_num += 1
+            messages_list = [
+                self._build_batch_messages(batch, target_language)
+                for _, batch in batches
+            ]
+            parsers = [
+                BatchLineParser(batch, target_language, on_translation)
+                for _, batch in batches
+            ]
+            parsed_by_index = {}
+            
+            def on_text(index: int, delta: str):
+                parsers[index].feed(delta)
+            
+            def on_result(index: int, result: dict):
+                batch = batches[index][1]
+                truncated = result["finish_reason"] in TRUNCATED_REASONS
+                if TRANSLATE_STREAM:
+                    parsed = parsers[index].close(truncated=truncated)
+                else:
+                    parsed = self._parse_batch_response(
+                        result["content"], batch,
+                        truncated=truncated, target_language=target_language
+                    )
+                    if on_translation:
+                        for text, translation in parsed.items():
+                            on_translation(text, translation)
+                parsed_by_index[index] = parsed
+                if self.checkpoint and parsed:
+                    self.checkpoint.append("translations", {"model": result["model"], "translations": parsed})
+                print(f"   翻译进度: 第 {round_num} 轮 {index + 1}/{len(batches)} 批完成")
+                self.progress.advance()
+            
+            results = self.ai.complete_many(
+                messages_list,
+                max_tokens=TRANSLATE_MAX_TOKENS,
+                on_result=on_result,
+                stream=TRANSLATE_STREAM,
+                on_text=on_text if TRANSLATE_STREAM else None,
+                models=[self.tiers[tier]["model"] for tier, _ in batches],
+                return_exceptions=True
+            )
+            
+            # 部分批次重试耗尽时按未翻译处理（由补译轮次再试），全部失败（如 API 密钥无效）时直接报错
+            errors = [r for r in results if isinstance(r, Exception)]
+            if errors and len(errors) == len(results):
+                raise errors[0]
+            
+            next_batches = []
+            for index, ((tier, batch), result) in enumerate(zip(batches, results)):
+                if isinstance(result, Exception):
+                    print(f"   警告: 第 {round_num} 轮 {index + 1}/{len(batches)} 批失败，{len(batch)} 条暂未翻译: {result}")
+                    self.progress.advance()
+                    continue
+                self._record_tier_usage(tier, result)
+                parsed = parsed_by_index[index]
+                translations.update(parsed)
+                models.update(dict.fromkeys(parsed, result["model"]))
+                
+                if result["finish_reason"] not in TRUNCATED_REASONS:
+                    continue
+                
+                unanswered = [t for t in batch if t not in parsed]
+                if len(unanswered) > 1:
+                    half = len(unanswered) // 2
+                    next_batches.extend([(tier, unanswered[:half]), (tier, unanswered[half:])])
+                elif unanswered:
+                    print(f"   警告: 单条文本译文超出长度上限 '{unanswered[0][:20]}...'")
+            
+            if next_batches:
+                resend = sum(len(b) for _, b in next_batches)
+                print(f"   响应被截断，拆分为 {len(next_batches)} 批重发 {resend} 条")
+                self.progress.total += len(next_batches)
+            batches = next_batches
+        
+        return translations
+    
+    def _record_tier_usage(self, tier: str, result: dict):
+        stats = self.last_stats.get("tiers", {}).get(tier)
+        if stats is None:
+            return
+        usage = result.get("usage") or {}
+        latency = result.get("latency", 0.0)
+        stats["requests"] += 1
+        stats["latency_s"] += latency
+        stats["max_latency_s"] = max(stats["max_latency_s"], latency)
+        stats["prompt_tokens"] += usage.get("prompt_tokens", 0)
+        stats["completion_tokens"] += usage.get("completion_tokens", 0)
+    
+    def _build_batch_messages(self, texts: list[str], target_language: str) -> list:
+        """构建一批文本的翻译请求"""
         # 构建翻译列表，包含字符数限制
         text_with_limits = []
         for i, t in enumerate(texts):
@@ -140,32 +594,36 @@ Input:
 
 Output (NUMBER|||TRANSLATION):"""
         
-        messages = [{"role": "user", "content": prompt}]
-        response = self.ai._call_api(messages, max_tokens=8192)
-        
-        # 解析响应
+        return [{"role": "user", "content": prompt}]
+    
+    def _parse_batch_response(
+        self,
+        response: str,
+        texts: list[str],
+        truncated: bool = False,
+        target_language: str = None
+    ) -> dict[str, str]:
+        """
+        解析 NUMBER|||TRANSLATION 格式的响应
+        truncated=True 时最后一行可能只输出了一半，丢弃不用
+        译为英文时仍含中文的结果视为格式错误，留给补译
+        """
         result = {}
-        lines = response.strip().split("\n")
-        
-        for line in lines:
-            if "|||" in line:
-                parts = line.split("|||", 1)
-                if len(parts) == 2:
-                    try:
-                        idx = int(parts[0].strip()) - 1
-                        if 0 <= idx < len(texts):
-                            translation = parts[1].strip()
-                            # 清理翻译结果
-                            translation = translation.split("|||")[0].strip()
-                            if translation:
-                                result[texts[idx]] = translation
-                    except ValueError:
-                        continue
+        last_text = None
+        
+        for line in response.strip().split("\n"):
+            parsed = _parse_translation_line(line, texts, target_language)
+            if parsed:
+                text, translation = parsed
+                result[text] = translation
+                last_text = text
+        
+        if truncated and last_text is not None:
+            result.pop(last_text, None)
         
         return result
     
 
-
     def translate_pdf(
         self, 
         input_path: str, 
@@ -195,7 +653,14 @@ Output (NUMBER|||TRANSLATION):"""
         
         # Step 1: 提取中文文本
         print("\n🔍 Step 1: 提取中文文本...")
-        text_blocks = self.extract_text_blocks(str(input_path))
+        self.progress.start("extracting")
+        text_blocks = self.checkpoint.load("text_blocks") if self.checkpoint else None
+        if text_blocks is None:
+            text_blocks = self.extract_text_blocks(str(input_path))
+            if self.checkpoint:
+                self.checkpoint.save("text_blocks", text_blocks)
+        else:
+            print("   ⏭️ 从检查点恢复提取结果")
         chinese_texts = [b["text"] for b in text_blocks]
         print(f"   找到 {len(chinese_texts)} 个中文文本块")
         
@@ -205,53 +670,62 @@ Output (NUMBER|||TRANSLATION):"""
             shutil.copy(input_path, output_path)
             return str(output_path)
         
-        # Step 2: 批量翻译
-        print(f"\n🤖 Step 2: AI 翻译 ({target_language})...")
-        translations = self.batch_translate(chinese_texts, target_language=target_language)
-        print(f"   翻译完成: {len(translations)} 条")
-        
-        # Step 3: 替换文本
-        print("\n✏️  Step 3: 替换文本...")
-        doc = fitz.open(str(input_path))
-        
         # 获取字体用于精确测量
         font = fitz.Font("helv")
         
         # === 第一阶段：按字体大小分组，计算每组的缩放比例 ===
+        # 译文一到就立即测量（流式模式下与翻译并行进行）
         # 将字体大小四舍五入到整数作为分组依据
         size_groups = {}  # {rounded_size: [items]}
-        
+        blocks_by_text = {}
         for block in text_blocks:
-            original = block["text"]
-            translated = translations.get(original)
+            blocks_by_text.setdefault(block["text"], []).append(block)
+        measured = set()
+        
+        def measure(original: str, translated: str):
+            if original in measured or translated == original:
+                return
+            measured.add(original)
             
-            if translated and translated != original:
+            for block in blocks_by_text.get(original, []):
                 bbox = block.get("bbox")
-                if bbox:
-                    rect = fitz.Rect(bbox)
-                    max_width = rect.width
-                    original_size = block.get("size", 10)
-                    rounded_size = round(original_size)
-                    
-                    # 用原始字体大小测量英文宽度
-                    text_width = font.text_length(translated, fontsize=original_size)
-                    
-                    # 计算需要的缩放比例
-                    if text_width > max_width:
-                        ratio = max_width / text_width
-                    else:
-                        ratio = 1.0
-                    
-                    item = {
-                        "block": block,
-                        "translated": translated,
-                        "ratio": ratio,
-                        "original_size": original_size
-                    }
-                    
-                    if rounded_size not in size_groups:
-                        size_groups[rounded_size] = []
-                    size_groups[rounded_size].append(item)
+                if not bbox:
+                    continue
+                rect = fitz.Rect(bbox)
+                max_width = rect.width
+                original_size = block.get("size", 10)
+                rounded_size = round(original_size)
+                
+                # 用原始字体大小测量英文宽度
+                text_width = font.text_length(translated, fontsize=original_size)
+                
+                # 计算需要的缩放比例
+                if text_width > max_width:
+                    ratio = max_width / text_width
+                else:
+                    ratio = 1.0
+                
+                item = {
+                    "block": block,
+                    "translated": translated,
+                    "ratio": ratio,
+                    "original_size": original_size
+                }
+                
+                if rounded_size not in size_groups:
+                    size_groups[rounded_size] = []
+                size_groups[rounded_size].append(item)
+        
+        # Step 2: 批量翻译
+        print(f"\n🤖 Step 2: AI 翻译 ({target_language})...")
+        translations = self.batch_translate(
+            chinese_texts, target_language=target_language, on_translation=measure
+        )
+        print(f"   翻译完成: {len(translations)} 条")
+        
+        # Step 3: 替换文本
+        print("\n✏️  Step 3: 替换文本...")
+        doc = fitz.open(str(input_path))
         
         # === 第二阶段：计算每个字体大小组的统一缩放比例 ===
         group_ratios = {}
@@ -260,6 +734,7 @@ Output (NUMBER|||TRANSLATION):"""
             # 使用该组最小缩放比例，但不低于 0.6
             group_ratios[size] = max(min(ratios), 0.6)
         
+        self.progress.start("replacing", total=sum(len(items) for items in size_groups.values()), unit="blocks")
         print(f"   字体分组: {len(size_groups)} 组")
         for size in sorted(size_groups.keys()):
             print(f"      {size}pt: {len(size_groups[size])} 个文本块, 缩放比例 {group_ratios[size]:.2f}")
@@ -270,6 +745,7 @@ Output (NUMBER|||TRANSLATION):"""
             group_ratio = group_ratios[rounded_size]
             
             for item in items:
+                check(self.cancel_token)
                 block = item["block"]
                 translated = item["translated"]
                 
@@ -309,11 +785,14 @@ Output (NUMBER|||TRANSLATION):"""
                     replaced_count += 1
                 except Exception as e:
                     print(f"   警告: 替换失败 '{block['text'][:20]}...': {e}")
+                self.progress.advance()
         
         print(f"   替换了 {replaced_count} 处文本")
         
         # Step 4: 保存
         print("\n💾 Step 4: 保存文件...")
+        check(self.cancel_token)
+        self.progress.start("saving")
         doc.save(str(output_path))
         doc.close()
         
@@ -326,10 +805,18 @@ def translate_pdf_inplace(
     api_key: str = None,
     model: str = None,
     output_path: str = None,
-    target_language: str = "English"
+    target_language: str = "English",
+    on_progress: Optional[ProgressCallback] = None,
+    cancel_token: Optional[CancelToken] = None,
+    checkpoint: Optional[Checkpoint] = None
 ) -> str:
     """
     便捷函数：原位翻译 PDF
+    cancel_token 被取消或到达截止时间时抛出 Cancelled，不写出文件
+    传入 checkpoint 时，中断后用同一检查点重跑会跳过已完成的提取和批次
     """
-    translator = PDFInplaceTranslator(api_key=api_key, model=model)
+    translator = PDFInplaceTranslator(
+        api_key=api_key, model=model, on_progress=on_progress,
+        cancel_token=cancel_token, checkpoint=checkpoint
+    )
     return translator.translate_pdf(pdf_path, output_path, target_language=target_language)
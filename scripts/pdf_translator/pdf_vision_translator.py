@@ -4,12 +4,19 @@ PDF Vision 翻译器
 """
 import fitz  # PyMuPDF
 import json
-import base64
 import re
-import httpx
 from pathlib import Path
 from typing import Optional
-from .config import OUTPUT_DIR, DEFAULT_MODEL, OPENROUTER_API_KEY, OPENROUTER_BASE_URL
+from .config import (
+    OUTPUT_DIR, DEFAULT_MODEL, OPENROUTER_API_KEY, OPENROUTER_BASE_URL, DEGRADED_DPI, VISION_IMAGE_ENCODING,
+    ADAPTIVE_DPI
+)
+from .ai_processor import AIProcessor
+from .cancellation import CancelToken, check
+from .checkpoint import Checkpoint
+from .rasterizer import DpiReport, render_pages
+from .image_encoding import ImageEncoding, data_url, record_payload, render_page_image
+from .progress import ProgressCallback, ProgressTracker
 
 
 class PDFVisionTranslator:
@@ -20,22 +27,32 @@ class PDFVisionTranslator:
     - 翻译后精准替换回原位置
     """
     
-    def __init__(self, api_key: str = None, model: str = None):
+    def __init__(
+        self,
+        api_key: str = None,
+        model: str = None,
+        on_progress: Optional[ProgressCallback] = None,
+        cancel_token: Optional[CancelToken] = None,
+        checkpoint: Optional[Checkpoint] = None,
+        image_encoding: Optional[ImageEncoding] = None
+    ):
         self.api_key = api_key or OPENROUTER_API_KEY
         self.model = model or "google/gemini-2.5-flash"  # Vision 模型
         self.base_url = OPENROUTER_BASE_URL
+        # 通过 AIProcessor 调用，与其他 AI 请求共用连接池和限流器
+        self.ai = AIProcessor(api_key=self.api_key, model=self.model, cancel_token=cancel_token)
+        self.progress = ProgressTracker(on_progress)
+        self.cancel_token = cancel_token
+        # 检查点：每页识别结果识别后立即保存，重跑时已识别的页不再调用 API
+        self.checkpoint = checkpoint
+        # 发给模型的页面图片编码（格式、质量、灰度、最长边）
+        self.image_encoding = image_encoding or ImageEncoding.parse(VISION_IMAGE_ENCODING)
     
-    def _pdf_page_to_image(self, page: fitz.Page, dpi: int = 150) -> bytes:
-        """将 PDF 页面转换为 PNG 图片"""
-        mat = fitz.Matrix(dpi / 72, dpi / 72)
-        pix = page.get_pixmap(matrix=mat)
-        return pix.tobytes("png")
+    def _pdf_page_to_image(self, page: fitz.Page, dpi: int = 150) -> dict:
+        """将 PDF 页面按 image_encoding 渲染为图片，返回值见 image_encoding.render_page_image"""
+        return render_page_image(page, dpi, self.image_encoding)
     
-    def _image_to_base64(self, image_bytes: bytes) -> str:
-        """图片转 base64"""
-        return base64.b64encode(image_bytes).decode("utf-8")
-    
-    def _call_vision_api(self, image_base64: str, page_width: float, page_height: float) -> dict:
+    def _call_vision_api(self, image_url: str, page_width: float, page_height: float) -> dict:
         """
         调用 Vision API 识别并翻译页面
         返回文本块列表，每个包含：原文、译文、边界框
@@ -73,45 +90,27 @@ Return JSON array:
 
 Only return the JSON array, no other text."""
 
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-        
-        payload = {
-            "model": self.model,
-            "messages": [
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/png;base64,{image_base64}"
-                            }
-                        },
-                        {
-                            "type": "text",
-                            "text": prompt
+        messages = [
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "image_url",
+                        "image_url": {
+                            "url": image_url
                         }
-                    ]
-                }
-            ],
-            "max_tokens": 8192,
-            "temperature": 0.1
-        }
+                    },
+                    {
+                        "type": "text",
+                        "text": prompt
+                    }
+                ]
+            }
+        ]
         
-        with httpx.Client(timeout=120.0) as client:
-            response = client.post(
-                f"{self.base_url}/chat/completions",
-                headers=headers,
-                json=payload
-            )
-            response.raise_for_status()
-            result = response.json()
+        result = self.ai._complete(messages, max_tokens=8192, temperature=0.1)
         
-        content = result["choices"][0]["message"]["content"]
-        return self._parse_vision_response(content)
+        return self._parse_vision_response(result["content"])
     
     def _parse_vision_response(self, content: str) -> list[dict]:
         """解析 Vision API 返回的 JSON"""
@@ -218,7 +217,8 @@ Only return the JSON array, no other text."""
         Args:
             input_path: 输入 PDF 路径
             output_path: 输出 PDF 路径
-            dpi: 图片 DPI（越高越精确，但更慢）
+            dpi: 图片 DPI（越高越精确，但更慢）；开启 ADAPTIVE_DPI 时按页自适应，
+                 dpi 用于没有文字层的页面和节省量的对比基准
             pages: 要翻译的页码列表（从0开始），None 表示全部
         
         Returns:
@@ -230,7 +230,7 @@ Only return the JSON array, no other text."""
         
         print(f"📄 开始 Vision 翻译: {input_path.name}")
         print(f"   使用模型: {self.model}")
-        print(f"   DPI: {dpi}")
+        print(f"   DPI: {dpi}{'（按页自适应）' if ADAPTIVE_DPI else ''}, 图片编码: {self.image_encoding}")
         
         doc = fitz.open(str(input_path))
         total_pages = len(doc)
@@ -239,39 +239,84 @@ Only return the JSON array, no other text."""
             pages = list(range(total_pages))
         
         print(f"   总页数: {total_pages}, 翻译页数: {len(pages)}")
+        pages = [p for p in pages if p < total_pages]
+        self.progress.start("translating", total=len(pages), unit="pages")
+        
+        saved_pages = {}
+        if self.checkpoint:
+            for page_num in pages:
+                saved = self.checkpoint.load(f"page_{page_num}")
+                if saved is not None:
+                    saved_pages[page_num] = saved
         
+        # 需要识别的页面由进程池提前并行渲染，与 API 调用重叠进行
+        self.dpi_report = DpiReport(dpi)
+        rendered_pages = render_pages(
+            str(input_path), dpi,
+            pages=[p for p in pages if p not in saved_pages],
+            encoding=self.image_encoding,
+            cancel_token=self.cancel_token
+        )
+        try:
+            self._translate_pages(doc, pages, dpi, saved_pages, rendered_pages)
+        finally:
+            rendered_pages.close()
+        self.dpi_report.print_summary()
+        
+        # 保存
+        print(f"\n💾 保存文件...")
+        check(self.cancel_token)
+        self.progress.start("saving")
+        doc.save(str(output_path))
+        doc.close()
+        
+        print(f"✅ 完成! 输出: {output_path}")
+        return str(output_path)
+    
+    def _translate_pages(self, doc: fitz.Document, pages: list[int], dpi: int, saved_pages: dict, rendered_pages):
+        """逐页识别并替换；rendered_pages 按顺序产出 saved_pages 以外各页的渲染结果"""
+        total_pages = len(doc)
         for page_num in pages:
-            if page_num >= total_pages:
-                continue
-                
+            check(self.cancel_token)
             page = doc[page_num]
             print(f"\n📖 处理第 {page_num + 1}/{total_pages} 页...")
             
-            # 转换为图片
-            image_bytes = self._pdf_page_to_image(page, dpi=dpi)
-            image_base64 = self._image_to_base64(image_bytes)
+            saved = saved_pages.get(page_num)
+            if saved is not None:
+                # 已识别过的页直接套用保存的结果（按当时的 DPI 换算坐标）
+                print(f"   ⏭️ 从检查点恢复 {len(saved['blocks'])} 个文本块")
+                if saved["blocks"]:
+                    self._apply_translations(page, saved["blocks"], dpi=saved["dpi"])
+                self.progress.advance()
+                continue
+            
+            # 转换为图片；接近截止时间时降低 DPI 重新渲染，减小图片和识别耗时
+            image = next(rendered_pages)
+            if self.cancel_token and self.cancel_token.should_degrade() and image["dpi"] > DEGRADED_DPI:
+                print(f"   ⚠️ 接近截止时间，DPI 降为 {DEGRADED_DPI}")
+                image = {"page_index": page_num, **self._pdf_page_to_image(page, dpi=DEGRADED_DPI)}
+            # 自适应 DPI 或按最长边缩小时，像素坐标按本页实际 DPI 换算
+            page_dpi = image["dpi"]
+            print(f"   DPI: {page_dpi:.0f}")
+            self.dpi_report.add(image)
+            record_payload("vision", [len(image["data"])])
             
             # 调用 Vision API
             print(f"   🤖 AI 识别中...")
             blocks = self._call_vision_api(
-                image_base64, 
+                data_url(image["data"], image["mime"]), 
                 page.rect.width, 
                 page.rect.height
             )
             print(f"   找到 {len(blocks)} 个文本块")
+            if self.checkpoint:
+                self.checkpoint.save(f"page_{page_num}", {"dpi": page_dpi, "blocks": blocks})
             
             # 应用翻译
             if blocks:
-                self._apply_translations(page, blocks, dpi=dpi)
+                self._apply_translations(page, blocks, dpi=page_dpi)
                 print(f"   ✅ 翻译完成")
-        
-        # 保存
-        print(f"\n💾 保存文件...")
-        doc.save(str(output_path))
-        doc.close()
-        
-        print(f"✅ 完成! 输出: {output_path}")
-        return str(output_path)
+            self.progress.advance()
 
 
 def translate_pdf_vision(
@@ -280,10 +325,17 @@ def translate_pdf_vision(
     model: str = None,
     output_path: str = None,
     dpi: int = 150,
-    pages: list[int] = None
+    pages: list[int] = None,
+    on_progress: Optional[ProgressCallback] = None,
+    cancel_token: Optional[CancelToken] = None,
+    checkpoint: Optional[Checkpoint] = None,
+    image_encoding: Optional[ImageEncoding] = None
 ) -> str:
     """
     便捷函数：使用 Vision AI 翻译 PDF
     """
-    translator = PDFVisionTranslator(api_key=api_key, model=model)
+    translator = PDFVisionTranslator(
+        api_key=api_key, model=model, on_progress=on_progress,
+        cancel_token=cancel_token, checkpoint=checkpoint, image_encoding=image_encoding
+    )
     return translator.translate_pdf(pdf_path, output_path, dpi=dpi, pages=pages)
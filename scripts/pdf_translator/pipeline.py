@@ -5,9 +5,16 @@ PDF → 分析 → 翻译 → 生成 Datasheet/Manual
 import json
 from pathlib import Path
 from datetime import datetime
-from .config import OUTPUT_DIR, TEMP_DIR, LOGO_PATH
+from typing import Optional
+from .config import (
+    OUTPUT_DIR, TEMP_DIR, LOGO_PATH, PDF_DPI, DEGRADED_DPI, TRANSLATE_FAST_MODEL, ANALYZE_IMAGE_ENCODING,
+    ADAPTIVE_DPI
+)
 from .pdf_extractor import pdf_to_images, extract_embedded_images
 from .ai_processor import AIProcessor
+from .cancellation import CancelToken, check
+from .checkpoint import Checkpoint
+from .image_encoding import ImageEncoding
 from .pdf_renderer import (
     render_datasheet_pdf, 
     render_manual_pdf, 
@@ -16,10 +23,40 @@ from .pdf_renderer import (
 
 
 class TranslationPipeline:
-    def __init__(self, api_key: str = None, model: str = None):
-        self.ai = AIProcessor(api_key=api_key, model=model)
+    def __init__(
+        self,
+        api_key: str = None,
+        model: str = None,
+        cancel_token: Optional[CancelToken] = None,
+        checkpoint: Optional[Checkpoint] = None
+    ):
+        self.ai = AIProcessor(api_key=api_key, model=model, cancel_token=cancel_token)
+        self.cancel_token = cancel_token
+        # 检查点：分析结果和生成的 Markdown 完成即保存，重跑时跳过已完成的阶段
+        self.checkpoint = checkpoint
         self.results = {}
     
+    def _stage(self, name: str, compute):
+        """有检查点时先读取已保存的阶段输出，没有再计算并保存"""
+        if self.checkpoint:
+            value = self.checkpoint.load(name)
+            if value is not None:
+                print(f"   ⏭️ 从检查点恢复 {name}")
+                return value
+        value = compute()
+        if self.checkpoint:
+            self.checkpoint.save(name, value)
+        return value
+    
+    def _should_degrade(self) -> bool:
+        return self.cancel_token is not None and self.cancel_token.should_degrade()
+    
+    def _degrade_model(self):
+        """接近截止时间时后续生成改用快速模型"""
+        if self._should_degrade() and self.ai.model != TRANSLATE_FAST_MODEL:
+            print(f"   ⚠️ 接近截止时间，改用快速模型 {TRANSLATE_FAST_MODEL}")
+            self.ai.model = TRANSLATE_FAST_MODEL
+    
     def _insert_images(self, md_content: str, embedded_images: list, images_dir: Path, doc_info: dict = None) -> str:
         """将图片占位符替换为实际图片引用，并添加图例表"""
         if not embedded_images:
@@ -134,14 +171,26 @@ class TranslationPipeline:
         print(f"📄 开始处理: {pdf_path.name}")
         print(f"📁 输出目录: {output_subdir}")
         
-        # Step 1: 提取 PDF 页面为图片
+        # Step 1: 提取 PDF 页面为图片（页面图片只用于分析，分析结果已在检查点中时跳过）
         print("\n🔍 Step 1: 提取 PDF 页面...")
-        page_images = pdf_to_images(str(pdf_path))
-        print(f"   提取了 {len(page_images)} 页")
+        doc_info = self.checkpoint.load("doc_info") if self.checkpoint else None
+        if doc_info is None:
+            # 接近截止时间时固定用较低的 DPI，减小图片和分析耗时；否则按页自适应
+            degraded = self._should_degrade()
+            dpi = DEGRADED_DPI if degraded else PDF_DPI
+            # 惰性来源：分析时才逐页渲染
+            page_images = pdf_to_images(
+                str(pdf_path), dpi=dpi, cancel_token=self.cancel_token,
+                encoding=ImageEncoding.parse(ANALYZE_IMAGE_ENCODING),
+                adaptive=ADAPTIVE_DPI and not degraded
+            )
+            print(f"   共 {len(page_images)} 页")
+        else:
+            print("   ⏭️ 分析结果已在检查点中，跳过")
         
         # Step 2: 提取嵌入图片
         print("\n🖼️  Step 2: 提取嵌入图片...")
-        embedded_images = extract_embedded_images(str(pdf_path))
+        embedded_images = extract_embedded_images(str(pdf_path), cancel_token=self.cancel_token)
         print(f"   提取了 {len(embedded_images)} 张图片")
         
         # 复制图片到输出目录
@@ -156,7 +205,10 @@ class TranslationPipeline:
         
         # Step 3: AI 分析文档内容
         print("\n🤖 Step 3: AI 分析文档内容...")
-        doc_info = self.ai.analyze_pdf_pages(page_images)
+        if doc_info is None:
+            doc_info = self.ai.analyze_pdf_pages(page_images)
+            if self.checkpoint:
+                self.checkpoint.save("doc_info", doc_info)
         
         if save_intermediate:
             info_path = output_subdir / "doc_info.json"
@@ -182,7 +234,10 @@ class TranslationPipeline:
         # Step 4: 生成 Datasheet
         if "datasheet" in output_formats:
             print("\n📋 Step 4: 生成 Datasheet...")
-            datasheet_md = self.ai.generate_datasheet(doc_info, embedded_images)
+            self._degrade_model()
+            datasheet_md = self._stage(
+                "datasheet_md", lambda: self.ai.generate_datasheet(doc_info, embedded_images)
+            )
             
             # 替换图片占位符为实际图片
             datasheet_md = self._insert_images(datasheet_md, embedded_images, images_dir, doc_info)
@@ -196,6 +251,7 @@ class TranslationPipeline:
             
             # 渲染 PDF
             pdf_output = output_subdir / f"{pdf_name}_Datasheet_EN.pdf"
+            check(self.cancel_token)
             render_datasheet_pdf(
                 datasheet_md,
                 str(pdf_output),
@@ -209,7 +265,10 @@ class TranslationPipeline:
         # Step 5: 生成 User Manual
         if "manual" in output_formats:
             print("\n📖 Step 5: 生成 User Manual...")
-            manual_md = self.ai.generate_user_manual(doc_info, embedded_images)
+            self._degrade_model()
+            manual_md = self._stage(
+                "manual_md", lambda: self.ai.generate_user_manual(doc_info, embedded_images)
+            )
             
             # 替换图片占位符为实际图片
             manual_md = self._insert_images(manual_md, embedded_images, images_dir, doc_info)
@@ -223,6 +282,7 @@ class TranslationPipeline:
             
             # 渲染 PDF
             pdf_output = output_subdir / f"{pdf_name}_UserManual_EN.pdf"
+            check(self.cancel_token)
             render_manual_pdf(
                 manual_md,
                 str(pdf_output),
@@ -244,7 +304,9 @@ def translate_pdf(
     pdf_path: str,
     api_key: str = None,
     model: str = None,
-    output_formats: list = None
+    output_formats: list = None,
+    cancel_token: Optional[CancelToken] = None,
+    checkpoint: Optional[Checkpoint] = None
 ) -> dict:
     """
     便捷函数：翻译 PDF 文档
@@ -254,9 +316,13 @@ def translate_pdf(
         api_key: OpenRouter API Key
         model: 模型名称 (默认 gemini-2.5-flash)
         output_formats: 输出格式 ["datasheet", "manual", "markdown"]
+        cancel_token: 取消令牌（可带截止时间），取消后抛出 Cancelled
+        checkpoint: 检查点，中断后用同一检查点重跑会跳过已完成的阶段
     
     Returns:
         处理结果
     """
-    pipeline = TranslationPipeline(api_key=api_key, model=model)
+    pipeline = TranslationPipeline(
+        api_key=api_key, model=model, cancel_token=cancel_token, checkpoint=checkpoint
+    )
     return pipeline.process(pdf_path, output_formats=output_formats)
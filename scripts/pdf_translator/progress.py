@@ -0,0 +1,62 @@
+"""
+进度事件
+长时间运行的操作通过回调上报进度，事件格式:
+  {"stage": "translating", "done": 3, "total": 10, "unit": "batches",
+   "elapsed": 12.5, "eta": 29.1}
+eta 按当前阶段的平均速度估算，尚无完成项时为 None
+"""
+import time
+from typing import Callable, Optional
+
+ProgressCallback = Callable[[dict], None]
+
+
+class ProgressTracker:
+    """记录当前阶段的进度并转发给回调，未设置回调时什么也不做"""
+
+    def __init__(self, callback: Optional[ProgressCallback] = None):
+        self.callback = callback
+        self.stage = None
+        self.unit = None
+        self.done = 0
+        self.total = 0
+        self.started = time.monotonic()
+
+    def start(self, stage: str, total: int = 0, unit: str = None):
+        """进入新阶段"""
+        self.stage = stage
+        self.unit = unit
+        self.done = 0
+        self.total = total
+        self.started = time.monotonic()
+        self._emit()
+
+    def advance(self, count: int = 1, total: int = None):
+        """完成 count 个单位；total 不为 None 时同时更新总数（如截断重发增加了批次）"""
+        self.done += count
+        if total is not None:
+            self.total = total
+        self._emit()
+
+    def event(self) -> dict:
+        elapsed = time.monotonic() - self.started
+        eta = None
+        if self.done and self.total:
+            eta = max(0.0, elapsed / self.done * (self.total - self.done))
+        return {
+            "stage": self.stage,
+            "done": self.done,
+            "total": self.total,
+            "unit": self.unit,
+            "elapsed": round(elapsed, 2),
+            "eta": round(eta, 1) if eta is not None else None,
+        }
+
+    def _emit(self):
+        if not self.callback:
+            return
+        try:
+            self.callback(self.event())
+        except Exception as e:
+            # 进度上报失败不影响处理本身
+            print(f"   警告: 进度回调失败: {e}")
@@ -0,0 +1,228 @@
+"""
+页面渲染
+把 PDF 页面渲染为图片。渲染是纯 CPU 工作，多页文档交给进程池并行处理：
+每个子任务在工作进程中自行打开文档，渲染一段连续页并编码，结果按页码顺序返回。
+进程池在进程内共享（fork 出的子进程会重新创建），使用 spawn 启动，
+避免从多线程的 Web 进程 fork 带来的锁问题。
+开启自适应 DPI 时，每页按文字层中最小的有效字号选择 DPI（见 choose_dpi）
+"""
+import math
+import multiprocessing
+import os
+import threading
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Iterator, Optional
+
+import fitz  # PyMuPDF
+
+from .config import (
+    RENDER_WORKERS, RENDER_PARALLEL_MIN_PAGES, RENDER_CHUNK_PAGES, RENDER_MAX_RESIDENT_PAGES,
+    ADAPTIVE_DPI, ADAPTIVE_DPI_MIN, ADAPTIVE_DPI_MAX, ADAPTIVE_DPI_TARGET_PX, ADAPTIVE_DPI_SIGNIFICANT_SHARE
+)
+from .cancellation import CancelToken, check
+from .image_encoding import ImageEncoding, render_page_image
+from . import metrics
+
+# 等待子任务时检查取消的间隔（秒）
+CANCEL_POLL_INTERVAL = 0.5
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def render_workers() -> int:
+    """配置的渲染进程数"""
+    return RENDER_WORKERS if RENDER_WORKERS > 0 else (os.cpu_count() or 1)
+
+
+def get_render_pool() -> ProcessPoolExecutor:
+    """获取进程内共享的渲染进程池"""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ProcessPoolExecutor(
+                max_workers=render_workers(),
+                mp_context=multiprocessing.get_context("spawn")
+            )
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def smallest_text_size(page: fitz.Page) -> Optional[float]:
+    """
+    页面文字层中最小的有效字号（pt）
+    按字符数从小字号往上累计，达到 ADAPTIVE_DPI_SIGNIFICANT_SHARE 时的字号即为结果，
+    零星的更小字符（角标、隐藏文字）不影响结果；没有文字层时返回 None
+    """
+    chars_by_size = Counter()
+    for block in page.get_text("dict", flags=0)["blocks"]:
+        for line in block.get("lines", []):
+            for span in line.get("spans", []):
+                count = len(span.get("text", "").strip())
+                if count and span.get("size", 0) > 0:
+                    chars_by_size[round(span["size"], 1)] += count
+    total = sum(chars_by_size.values())
+    if not total:
+        return None
+    threshold = total * ADAPTIVE_DPI_SIGNIFICANT_SHARE
+    seen = 0
+    for size in sorted(chars_by_size):
+        seen += chars_by_size[size]
+        if seen >= threshold:
+            return size
+    return max(chars_by_size)
+
+
+def choose_dpi(page: fitz.Page, default_dpi: int) -> int:
+    """能让最小有效字号达到 ADAPTIVE_DPI_TARGET_PX 像素的最低 DPI（取整到 10），没有文字层时用 default_dpi"""
+    size = smallest_text_size(page)
+    if size is None:
+        return default_dpi
+    dpi = math.ceil(ADAPTIVE_DPI_TARGET_PX * 72 / size / 10) * 10
+    return max(ADAPTIVE_DPI_MIN, min(ADAPTIVE_DPI_MAX, dpi))
+
+
+def render_page(doc: fitz.Document, page_index: int, dpi: int, encoding: ImageEncoding, adaptive: bool = False) -> dict:
+    """
+    渲染单页并编码
+    返回 {"page_index", "data", "mime", "width", "height", "dpi", "fixed_bytes"}：
+    dpi 为实际使用的 DPI（见 image_encoding.render_page_image），
+    fixed_bytes 为按固定 dpi 渲染时的估算字节数（按像素数等比换算）
+    """
+    page = doc[page_index]
+    rendered = render_page_image(page, choose_dpi(page, dpi) if adaptive else dpi, encoding)
+    zoom = dpi / 72
+    fixed_dpi = dpi * encoding.scale_for(page.rect.width * zoom, page.rect.height * zoom)
+    rendered["fixed_bytes"] = round(len(rendered["data"]) * (fixed_dpi / rendered["dpi"]) ** 2)
+    return {"page_index": page_index, **rendered}
+
+
+def _render_range(pdf_path: str, page_indexes: list[int], dpi: int, encoding: ImageEncoding,
+                  adaptive: bool) -> list[dict]:
+    """工作进程中执行：打开文档，渲染一段页面"""
+    with fitz.open(pdf_path) as doc:
+        return [render_page(doc, i, dpi, encoding, adaptive) for i in page_indexes]
+
+
+def _render_serial(pdf_path: str, page_indexes: list[int], dpi: int, encoding: ImageEncoding,
+                   adaptive: bool, cancel_token: Optional[CancelToken]) -> Iterator[dict]:
+    with fitz.open(pdf_path) as doc:
+        for i in page_indexes:
+            check(cancel_token)
+            yield render_page(doc, i, dpi, encoding, adaptive)
+
+
+class DpiReport:
+    """
+    汇总自适应 DPI 的效果：每页实际 DPI，以及与固定 DPI 相比节省的字节数（估算）
+    """
+
+    def __init__(self, default_dpi: int):
+        self.default_dpi = default_dpi
+        self.pages = []  # [{"page", "dpi", "bytes", "fixed_bytes"}]
+
+    def add(self, rendered: dict):
+        """rendered 为 render_page 的结果；没有 fixed_bytes 时（如降级后重新渲染）按实际大小计"""
+        size = len(rendered["data"])
+        fixed_bytes = rendered.get("fixed_bytes", size)
+        self.pages.append({
+            "page": rendered["page_index"] + 1,
+            "dpi": round(rendered["dpi"]),
+            "bytes": size,
+            "fixed_bytes": fixed_bytes
+        })
+        metrics.incr("render.pages")
+        metrics.incr("render.bytes", size)
+        metrics.incr("render.fixed_bytes", fixed_bytes)
+
+    def summary(self) -> dict:
+        total = sum(p["bytes"] for p in self.pages)
+        fixed = sum(p["fixed_bytes"] for p in self.pages)
+        return {
+            "default_dpi": self.default_dpi,
+            "dpi_counts": dict(sorted(Counter(p["dpi"] for p in self.pages).items())),
+            "bytes": total,
+            "fixed_bytes": fixed,
+            "saved_bytes": fixed - total
+        }
+
+    def print_summary(self):
+        if not self.pages:
+            return
+        summary = self.summary()
+        counts = ", ".join(f"{dpi} DPI × {n} 页" for dpi, n in summary["dpi_counts"].items())
+        saved = summary["saved_bytes"]
+        ratio = saved / summary["fixed_bytes"] if summary["fixed_bytes"] else 0
+        print(f"   页面 DPI: {counts}（固定设置 {self.default_dpi} DPI）")
+        print(
+            f"   图片共 {summary['bytes'] / 1024:.0f} KB，"
+            f"比固定 DPI {'节省' if saved >= 0 else '增加'}约 {abs(saved) / 1024:.0f} KB ({abs(ratio):.0%})"
+        )
+
+
+def render_pages(
+    pdf_path: str,
+    dpi: int,
+    pages: Optional[list[int]] = None,
+    workers: Optional[int] = None,
+    encoding: Optional[ImageEncoding] = None,
+    cancel_token: Optional[CancelToken] = None,
+    max_pending_pages: int = RENDER_MAX_RESIDENT_PAGES,
+    adaptive: bool = ADAPTIVE_DPI
+) -> Iterator[dict]:
+    """
+    按页码顺序逐页产出渲染结果（见 render_page）
+    pages 为从 0 开始的页码列表，None 表示全部；encoding 默认 PNG；
+    adaptive 时每页按文字层选择 DPI，dpi 作为没有文字层时的取值和节省量的对比基准；workers 为同时执行的子任务数上限，
+    默认 RENDER_WORKERS；页数较少或只有一个进程时直接在当前进程渲染。
+    已渲染但尚未被取走的页数不超过 max_pending_pages：子任务页数随之缩小，使 workers 个进程都能同时渲染；
+    max_pending_pages 小于 workers 时每个子任务一页，并行度降为 max_pending_pages（至少为 1）
+    """
+    if pages is None:
+        with fitz.open(pdf_path) as doc:
+            pages = list(range(doc.page_count))
+    encoding = encoding or ImageEncoding()
+    workers = workers or render_workers()
+    if workers <= 1 or len(pages) < RENDER_PARALLEL_MIN_PAGES:
+        yield from _render_serial(pdf_path, pages, dpi, encoding, adaptive, cancel_token)
+        return
+
+    # 子任务大小按驻留上限缩小，保证至少 workers 个子任务能同时在途
+    chunk_size = max(1, min(RENDER_CHUNK_PAGES, max_pending_pages // workers, math.ceil(len(pages) / workers)))
+    chunks = deque(pages[i:i + chunk_size] for i in range(0, len(pages), chunk_size))
+    pool = get_render_pool()
+    # 在途子任务数不超过 2 倍进程数，也不超过 max_pending_pages，渲染结果不会远远领先于使用方
+    max_in_flight = max(1, min(workers * 2, max_pending_pages // chunk_size))
+    in_flight = deque()
+    try:
+        while chunks or in_flight:
+            while chunks and len(in_flight) < max_in_flight:
+                chunk = chunks.popleft()
+                in_flight.append((chunk, pool.submit(_render_range, pdf_path, chunk, dpi, encoding, adaptive)))
+            chunk, future = in_flight[0]
+            while not wait([future], timeout=CANCEL_POLL_INTERVAL).done:
+                check(cancel_token)
+            check(cancel_token)
+            rendered = future.result()
+            in_flight.popleft()
+            yield from rendered
+    except BrokenProcessPool:
+        # 工作进程异常退出（如内存不足被杀），剩余页面在当前进程渲染
+        print("   警告: 渲染进程池异常，改为单进程渲染")
+        _reset_pool()
+        remaining = [i for chunk, _ in in_flight for i in chunk] + [i for chunk in chunks for i in chunk]
+        yield from _render_serial(pdf_path, remaining, dpi, encoding, adaptive, cancel_token)
+    finally:
+        for _, future in in_flight:
+            future.cancel()
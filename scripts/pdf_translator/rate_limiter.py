@@ -0,0 +1,214 @@
+"""
+自适应限流器
+- 令牌桶：按每分钟请求数 (RPM) 和每分钟 token 数 (TPM) 限速
+- AIMD 并发控制：成功时并发上限加性增长，遇到 429/超时减半
+- 429 时按 Retry-After 暂停所有请求
+进程内所有 AI 调用共享同一个限流器
+"""
+import asyncio
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+from .config import (
+    AI_RPM_LIMIT,
+    AI_TPM_LIMIT,
+    AI_CONCURRENCY,
+    AI_MIN_CONCURRENCY,
+    AI_MAX_CONCURRENCY,
+    AI_BACKOFF_BASE,
+    AI_BACKOFF_MAX,
+)
+
+
+class TokenBucket:
+    """令牌桶，capacity 为每分钟配额，0 表示不限"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """还需等待多久才有 amount 个令牌"""
+        if self.capacity <= 0:
+            return 0.0
+        self._refill(now)
+        # 单次请求超过整桶容量时按整桶计，避免永远等不到
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        if self.capacity > 0:
+            self.tokens -= min(amount, self.capacity)
+
+    def refund(self, amount: float):
+        if self.capacity > 0:
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After 头（秒数或 HTTP 日期）"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RateGovernor:
+    """
+    共享限流器
+    acquire/aacquire 取得一个请求配额，请求结束后必须调用
+    on_success 或 on_failure 归还
+    """
+
+    # 没有可用并发槽位时的轮询间隔
+    POLL_INTERVAL = 0.05
+
+    def __init__(
+        self,
+        rpm: int = AI_RPM_LIMIT,
+        tpm: int = AI_TPM_LIMIT,
+        initial_concurrency: int = AI_CONCURRENCY,
+        min_concurrency: int = AI_MIN_CONCURRENCY,
+        max_concurrency: int = AI_MAX_CONCURRENCY
+    ):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.min_concurrency = max(1, min_concurrency)
+        self.max_concurrency = max(self.min_concurrency, max_concurrency)
+        self.limit = float(min(max(initial_concurrency, self.min_concurrency), self.max_concurrency))
+        self.in_flight = 0
+        self.paused_until = 0.0
+
+        self.successes = 0
+        self.throttled = 0
+        self.timeouts = 0
+        self.server_errors = 0
+
+        self._lock = threading.Lock()
+
+    def _try_acquire(self, estimated_tokens: int) -> float:
+        """尝试取得配额，成功返回 0，否则返回建议等待的秒数"""
+        with self._lock:
+            now = time.monotonic()
+            if now < self.paused_until:
+                return self.paused_until - now
+            if self.in_flight >= int(self.limit):
+                return self.POLL_INTERVAL
+            wait = max(
+                self.requests.wait_time(1, now),
+                self.tokens.wait_time(estimated_tokens, now)
+            )
+            if wait > 0:
+                return wait
+            self.requests.take(1)
+            self.tokens.take(estimated_tokens)
+            self.in_flight += 1
+            return 0.0
+
+    def try_acquire(self, estimated_tokens: int = 0) -> bool:
+        """不等待，能立即取得配额时返回 True"""
+        return self._try_acquire(estimated_tokens) <= 0
+
+    def acquire(self, estimated_tokens: int = 0):
+        """阻塞直到取得配额（同步调用）"""
+        while True:
+            wait = self._try_acquire(estimated_tokens)
+            if wait <= 0:
+                return
+            time.sleep(min(wait, 1.0))
+
+    async def aacquire(self, estimated_tokens: int = 0):
+        """等待直到取得配额（异步调用）"""
+        while True:
+            wait = self._try_acquire(estimated_tokens)
+            if wait <= 0:
+                return
+            await asyncio.sleep(min(wait, 1.0))
+
+    def on_success(self, estimated_tokens: int = 0, used_tokens: int = None):
+        """请求成功：归还槽位，并发上限加性增长，按实际用量修正 TPM"""
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+            self.successes += 1
+            # 每完成约一个"窗口"的请求，上限 +1
+            self.limit = min(self.max_concurrency, self.limit + 1.0 / max(self.limit, 1.0))
+            if used_tokens is not None:
+                diff = estimated_tokens - used_tokens
+                if diff > 0:
+                    self.tokens.refund(diff)
+                else:
+                    self.tokens.take(-diff)
+
+    def release(self):
+        """请求被取消等非服务端原因结束时，只归还槽位"""
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+
+    def on_failure(self, kind: str, attempt: int, retry_after: float = None) -> float:
+        """
+        请求失败：归还槽位并返回重试前应等待的秒数
+        kind: "throttled" (429) / "timeout" / "server_error" (5xx) / "other"
+        """
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+            if kind in ("throttled", "timeout"):
+                # 乘性减小
+                self.limit = max(self.min_concurrency, self.limit / 2)
+            if kind == "throttled":
+                self.throttled += 1
+            elif kind == "timeout":
+                self.timeouts += 1
+            elif kind == "server_error":
+                self.server_errors += 1
+
+            # 指数退避 + 抖动；服务端给出 Retry-After 时以其为准
+            delay = min(AI_BACKOFF_MAX, AI_BACKOFF_BASE * (2 ** attempt))
+            delay = delay / 2 + random.uniform(0, delay / 2)
+            if retry_after is not None:
+                delay = max(retry_after, 0.0)
+            if kind == "throttled":
+                # 429 是全局信号，所有请求一起暂停
+                self.paused_until = max(self.paused_until, time.monotonic() + delay)
+            return delay
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "concurrency_limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "successes": self.successes,
+                "throttled": self.throttled,
+                "timeouts": self.timeouts,
+                "server_errors": self.server_errors,
+            }
+
+
+_governor: Optional[RateGovernor] = None
+_governor_lock = threading.Lock()
+
+
+def get_rate_governor() -> RateGovernor:
+    """获取进程内共享的限流器"""
+    global _governor
+    with _governor_lock:
+        if _governor is None:
+            _governor = RateGovernor()
+        return _governor
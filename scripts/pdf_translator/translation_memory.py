@@ -0,0 +1,177 @@
+"""
+翻译记忆
+按 (原文, 目标语言, 模型, 提示词版本) 做内容寻址缓存，
+SQLite (WAL 模式) 持久化，多个 gunicorn worker 可同时读写；
+进程内再加一层 LRU，热门词条无需访问磁盘
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from .config import TM_DB_PATH, TM_LRU_SIZE
+
+
+class TranslationMemory:
+    """
+    持久化翻译记忆
+    """
+
+    def __init__(self, db_path: str = None, lru_size: int = TM_LRU_SIZE):
+        self.db_path = Path(db_path or TM_DB_PATH)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.lru_size = lru_size
+        self.hits = 0
+        self.misses = 0
+
+        self._lru: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._conn_pid = None
+
+    @staticmethod
+    def make_key(source: str, target_language: str, model: str, prompt_version: str) -> str:
+        """内容寻址键"""
+        raw = json.dumps(
+            [source, target_language, model, prompt_version],
+            ensure_ascii=False
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _connection(self) -> sqlite3.Connection:
+        # fork 后的子进程必须重新打开连接
+        if self._conn is None or self._conn_pid != os.getpid():
+            conn = sqlite3.connect(
+                str(self.db_path),
+                timeout=30,
+                check_same_thread=False,
+                isolation_level=None
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS translations (
+                    key TEXT PRIMARY KEY,
+                    source TEXT NOT NULL,
+                    target_language TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    prompt_version TEXT NOT NULL,
+                    translation TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )"""
+            )
+            self._conn = conn
+            self._conn_pid = os.getpid()
+        return self._conn
+
+    def _remember(self, key: str, translation: str):
+        self._lru[key] = translation
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def lookup(
+        self,
+        texts: list[str],
+        target_language: str,
+        model: str,
+        prompt_version: str
+    ) -> dict[str, str]:
+        """
+        查询一批原文
+        返回已命中的 {原文: 译文}，未出现在结果中的即为未命中
+        """
+        keys = {
+            self.make_key(t, target_language, model, prompt_version): t
+            for t in texts
+        }
+        found = {}
+
+        with self._lock:
+            pending = []
+            for key, text in keys.items():
+                if key in self._lru:
+                    self._lru.move_to_end(key)
+                    found[text] = self._lru[key]
+                else:
+                    pending.append(key)
+
+            conn = self._connection()
+            # SQLite 单条语句的参数个数有限，分段查询
+            for i in range(0, len(pending), 500):
+                chunk = pending[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = conn.execute(
+                    f"SELECT key, translation FROM translations WHERE key IN ({placeholders})",
+                    chunk
+                ).fetchall()
+                for key, translation in rows:
+                    found[keys[key]] = translation
+                    self._remember(key, translation)
+
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+
+        return found
+
+    def store(
+        self,
+        translations: dict[str, str],
+        target_language: str,
+        model: str,
+        prompt_version: str
+    ):
+        """写入新翻译"""
+        if not translations:
+            return
+
+        now = time.time()
+        rows = []
+        for source, translation in translations.items():
+            key = self.make_key(source, target_language, model, prompt_version)
+            rows.append((key, source, target_language, model, prompt_version, translation, now))
+
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            for row in rows:
+                self._remember(row[0], row[5])
+
+    def stats(self) -> dict:
+        """进程内累计的命中统计"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "lru_entries": len(self._lru)
+        }
+
+
+_shared: dict[str, TranslationMemory] = {}
+_shared_lock = threading.Lock()
+
+
+def get_translation_memory(db_path: str = None) -> TranslationMemory:
+    """获取进程内共享的翻译记忆实例"""
+    path = str(db_path or TM_DB_PATH)
+    with _shared_lock:
+        memory = _shared.get(path)
+        if memory is None:
+            memory = TranslationMemory(path)
+            _shared[path] = memory
+        return memory
@@ -6,6 +6,7 @@
 import pikepdf
 import re
 import sys
+import time
 import fitz
 from pathlib import Path
 from collections import Counter
@@ -133,7 +134,7 @@ def color_distance(cmyk1, cmyk2):
 
 def replace_color_with_device_rgb(input_pdf: str, output_pdf: str, 
                                   source_cmyk: tuple, target_hex: str,
-                                  tolerance: float = 120.0):
+                                  tolerance: float = 120.0, on_progress=None, cancel_token=None):
     """
     将源CMYK颜色及其相似颜色替换为目标RGB颜色
     
@@ -143,6 +144,8 @@ def replace_color_with_device_rgb(input_pdf: str, output_pdf: str,
         source_cmyk: 源颜色的CMYK值 (c, m, y, k)，范围0-1
         target_hex: 目标颜色的十六进制值，如 "#01beb0"
         tolerance: 颜色容差（RGB 空间距离），默认 120，相似颜色都会被替换
+        on_progress: 进度回调，每处理完一页调用一次，参数格式同 pdf_translator.progress
+        cancel_token: 取消令牌（pdf_translator.cancellation.CancelToken），每页开始前和保存前检查
     """
     print(f"打开PDF: {input_pdf}")
     pdf = pikepdf.open(input_pdf)
@@ -187,7 +190,26 @@ def replace_color_with_device_rgb(input_pdf: str, output_pdf: str,
         else:
             return match.group(0)  # 保持原样
     
+    total_pages = len(pdf.pages)
+    started = time.monotonic()
+    
+    def report(stage, done):
+        if not on_progress:
+            return
+        elapsed = time.monotonic() - started
+        eta = elapsed / done * (total_pages - done) if done else None
+        try:
+            on_progress({
+                "stage": stage, "done": done, "total": total_pages, "unit": "pages",
+                "elapsed": round(elapsed, 2), "eta": round(eta, 1) if eta is not None else None
+            })
+        except Exception as e:
+            print(f"  警告: 进度回调失败: {e}")
+    
+    report("recoloring", 0)
     for page_num, page in enumerate(pdf.pages, 1):
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
         print(f"处理第 {page_num} 页...")
         
         if "/Contents" in page:
@@ -222,6 +244,7 @@ def replace_color_with_device_rgb(input_pdf: str, output_pdf: str,
                     print(f"  ✓ 内容流已更新")
                 else:
                     print(f"  - 内容流无变化")
+        report("recoloring", page_num)
     
     print()
     if colors_replaced:
@@ -229,6 +252,9 @@ def replace_color_with_device_rgb(input_pdf: str, output_pdf: str,
         for cmyk in colors_replaced:
             print(f"  - CMYK{cmyk}")
     print(f"保存到: {output_pdf}")
+    if cancel_token is not None:
+        cancel_token.raise_if_cancelled()
+    report("saving", total_pages)
     pdf.save(output_pdf)
     pdf.close()
     print(f"完成！共更新 {replaced_count} 个内容流")